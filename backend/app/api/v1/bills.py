@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime, date, timedelta
+import csv
+import io
+import json
 
 from app.db.database import get_db
-from app.models import User, Bill
-from app.schemas.bill import BillResponse, BillUpdate
+from app.models import User, Bill, BillType
+from app.schemas.bill import BillResponse, BillUpdate, BillPageResponse, BillBatchRequest, StatementImportResult
 from app.schemas.base import BaseResponse
 from app.core.security.auth import get_current_user
 from app.crud.bill import (
-    get_bills_no_pagination, get_bill,
-    update_bill, delete_bill
+    get_bills_no_pagination, get_bills_lite_json, get_bills_page, iter_bill_chunks, iter_bill_export_rows, BILL_EXPORT_COLUMNS,
+    get_bills_count, get_ledger_stats, get_ledger_calendar, get_bill, update_bill, delete_bill, apply_bill_batch, bulk_import_bills
 )
-from app.crud.ledger import check_user_ledger_access
-from app.utils.response import success_response, error_response
+from app.crud.ledger import check_user_ledger_access, get_ledger_version, get_ledger
+from app.services.statement import parse_statement
+from app.utils.response import success_response, error_response, raw_success_response
+from app.utils.etag import make_etag, not_modified
 
 router = APIRouter()
 
@@ -48,13 +54,27 @@ def get_date_range_from_filter(time_filter: str) -> tuple[Optional[datetime], Op
 @router.get("/", response_model=BaseResponse)
 def get_ledger_bills(
     ledger_id: int,
+    request: Request,
+    response: Response,
     time_filter: Optional[str] = Query(None, description="时间过滤器: today, month, year, all"),
     start_date: Optional[datetime] = Query(None, description="开始日期（优先级高于time_filter）"),
     end_date: Optional[datetime] = Query(None, description="结束日期（优先级高于time_filter）"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页返回的next_cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页数量，提供时按游标分页返回"),
+    stream: bool = Query(False, description="以NDJSON分块流式返回全部账单"),
+    lite: bool = Query(False, description="轻量模式：跳过ORM与模型校验直接序列化，返回内容不变"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取账本账单列表"""
+    """获取账本账单列表
+
+    - 默认：返回时间范围内的全部账单（兼容旧客户端）
+    - 提供 limit 或 cursor：按 (date, id) 游标分页，返回 next_cursor
+    - stream=true：按块流式输出 NDJSON，每行一条账单
+    - lite=true：不分页时以 Core 查询直接序列化为 JSON，适合大账本
+
+    非流式响应带 ETag，账本数据未变化时对 If-None-Match 返回 304。
+    """
     # 检查用户是否有账本访问权限
     # if not check_user_ledger_access(db, current_user.id, ledger_id):
     #     raise HTTPException(
@@ -67,6 +87,51 @@ def get_ledger_bills(
         start_date, end_date = get_date_range_from_filter(time_filter)
     user_id = current_user.id
     
+    if stream:
+        def generate_ndjson():
+            try:
+                for chunk in iter_bill_chunks(db, user_id, ledger_id, start_date, end_date):
+                    yield "".join(
+                        BillResponse.model_validate(bill).model_dump_json() + "\n" for bill in chunk
+                    )
+            finally:
+                db.close()
+        
+        return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
+    
+    # 账本数据未变化时直接返回 304，不查询账单表
+    etag = make_etag(get_ledger_version(db, ledger_id), "bills", user_id, start_date, end_date, cursor, limit, lite)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    
+    if limit or cursor:
+        try:
+            bills, next_cursor = get_bills_page(
+                db, user_id, ledger_id, start_date, end_date, cursor, limit or 100
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        return success_response(
+            data=BillPageResponse(
+                items=[BillResponse.model_validate(bill) for bill in bills],
+                next_cursor=next_cursor
+            ),
+            message="获取账单列表成功"
+        )
+    
+    if lite:
+        lite_response = raw_success_response(
+            get_bills_lite_json(db, user_id, ledger_id, start_date, end_date),
+            message="获取账单列表成功"
+        )
+        lite_response.headers["ETag"] = etag
+        return lite_response
+    
     bills = get_bills_no_pagination(db, user_id, ledger_id, start_date, end_date)
     
     # 使用Pydantic模型自动序列化
@@ -80,6 +145,8 @@ def get_ledger_bills(
 @router.get("/count", response_model=BaseResponse)
 def get_ledger_bills_count(
     ledger_id: int,
+    request: Request,
+    response: Response,
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     current_user: User = Depends(get_current_user),
@@ -93,12 +160,229 @@ def get_ledger_bills_count(
             detail="无权限访问此账本"
         )
     
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "count", start_date, end_date))
+    if cached:
+        return cached
+    
     count = get_bills_count(db, ledger_id, start_date, end_date)
     return success_response(
         data={"count": count},
         message="获取账单总数成功"
     )
 
+@router.get("/stats", response_model=BaseResponse)
+def get_ledger_bill_stats(
+    ledger_id: int,
+    request: Request,
+    response: Response,
+    time_filter: Optional[str] = Query(None, description="时间过滤器: today, month, year, all"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（优先级高于time_filter）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（优先级高于time_filter）"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取账本收支统计（总收入、总支出、分类统计）"""
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此账本"
+        )
+    
+    if start_date and end_date:
+        time_filter = "custom"
+    elif time_filter:
+        start_date, end_date = get_date_range_from_filter(time_filter)
+    else:
+        time_filter = "all"
+    
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "stats", time_filter, start_date, end_date))
+    if cached:
+        return cached
+    
+    stats = get_ledger_stats(db, ledger_id, start_date, end_date, time_filter)
+    return success_response(
+        data=stats,
+        message="获取账本统计成功"
+    )
+
+@router.get("/calendar", response_model=BaseResponse)
+def get_ledger_bill_calendar(
+    ledger_id: int,
+    request: Request,
+    response: Response,
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="月份，如 2024-03"),
+    year: Optional[int] = Query(None, ge=1970, le=9999, description="年份，如 2024"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取账本日历：按账本时区统计每天的收入、支出金额与笔数（month 与 year 二选一）"""
+    if (month is None) == (year is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请提供 month 或 year 其中之一"
+        )
+    
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此账本"
+        )
+    
+    if month:
+        year_value, month_value = map(int, month.split("-"))
+        if not 1 <= month_value <= 12:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的月份"
+            )
+        start_day = date(year_value, month_value, 1)
+        next_month = date(year_value + month_value // 12, month_value % 12 + 1, 1)
+        end_day = next_month - timedelta(days=1)
+    else:
+        start_day, end_day = date(year, 1, 1), date(year, 12, 31)
+    
+    ledger = get_ledger(db, ledger_id)
+    cached = not_modified(request, response, make_etag(ledger.version, "calendar", start_day, end_day, ledger.timezone))
+    if cached:
+        return cached
+    
+    calendar = get_ledger_calendar(db, ledger_id, ledger.timezone, start_day, end_day)
+    return success_response(
+        data=calendar,
+        message="获取账本日历成功"
+    )
+
+def _export_value(value):
+    """将导出的原始列值转换为可序列化的值"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, BillType):
+        return value.value
+    return value
+
+def _csv_chunks(row_chunks):
+    """逐块生成 CSV 文本，首块带 BOM 与表头，便于 Excel 正确识别中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(BILL_EXPORT_COLUMNS)
+    for rows in row_chunks:
+        writer.writerows([_export_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _ndjson_chunks(row_chunks):
+    """逐块生成 NDJSON 文本，每行一条账单"""
+    for rows in row_chunks:
+        yield "".join(
+            json.dumps(
+                {name: _export_value(value) for name, value in zip(BILL_EXPORT_COLUMNS, row)},
+                ensure_ascii=False
+            ) + "\n"
+            for row in rows
+        )
+
+EXPORT_FORMATS = {
+    "csv": (_csv_chunks, "text/csv; charset=utf-8"),
+    "ndjson": (_ndjson_chunks, "application/x-ndjson"),
+}
+
+@router.get("/export")
+def export_ledger_bills(
+    ledger_id: int,
+    format: str = Query("csv", description="导出格式: csv, ndjson"),
+    time_filter: Optional[str] = Query(None, description="时间过滤器: today, month, year, all"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（优先级高于time_filter）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（优先级高于time_filter）"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """流式导出账本账单（CSV 或 NDJSON），内存占用与账本大小无关"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的导出格式"
+        )
+    
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此账本"
+        )
+    
+    if not start_date and not end_date and time_filter:
+        start_date, end_date = get_date_range_from_filter(time_filter)
+    
+    render, media_type = EXPORT_FORMATS[format]
+    
+    def generate():
+        try:
+            yield from render(iter_bill_export_rows(db, ledger_id, start_date, end_date))
+        finally:
+            db.close()
+    
+    filename = f"ledger_{ledger_id}_bills.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/batch", response_model=BaseResponse)
+def batch_bills(
+    batch: BillBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量新增/修改/删除账单（修改和删除仅限账单创建者），返回每项的执行结果"""
+    results = apply_bill_batch(db, batch.operations, current_user.id, batch.atomic)
+    succeeded = sum(1 for result in results if result.success)
+    
+    return success_response(
+        data=results,
+        message=f"批量操作完成，成功 {succeeded} 项，失败 {len(results) - succeeded} 项"
+    )
+
+@router.post("/import", response_model=BaseResponse)
+def import_statement(
+    ledger_id: int = Form(...),
+    file: UploadFile = File(..., description="支付宝、微信支付或银行导出的 CSV 账单"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """导入支付宝、微信支付或银行导出的 CSV 账单，流式解析并分块写入"""
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此账本"
+        )
+    
+    try:
+        parser = parse_statement(file.file, ledger_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    imported = bulk_import_bills(db, parser, current_user.id)
+    return success_response(
+        data=StatementImportResult(
+            source=parser.source,
+            imported=imported,
+            skipped=parser.skipped,
+            errors=parser.errors
+        ),
+        message=f"导入完成，共导入 {imported} 条账单"
+    )
+
 @router.get("/{bill_id}", response_model=BaseResponse)
 def get_bill_info(
     bill_id: int,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -9,11 +9,13 @@ from app.schemas.budget import (
     BudgetCreate, BudgetUpdate, BudgetResponse, BudgetListResponse,
     BudgetStats, BudgetProgress, BudgetAlertResponse, BudgetSummary
 )
+from app.services.budget import forecast_budget, forecast_budgets
 from app.schemas.base import BaseResponse
-from app.core.security.auth import get_current_user
+from app.core.security.auth import get_current_user, require_admin_token
 from app.crud import budget as budget_crud
-from app.crud.ledger import check_user_ledger_access
+from app.crud.ledger import check_user_ledger_access, get_ledger_version
 from app.utils.response import success_response, error_response
+from app.utils.etag import make_etag, not_modified
 from app.models.enums import BudgetStatus, BudgetPeriodType
 
 router = APIRouter()
@@ -49,6 +51,8 @@ def create_budget(
 @router.get("/", response_model=BaseResponse)
 def get_budgets(
     ledger_id: int,
+    request: Request,
+    response: Response,
     status: Optional[BudgetStatus] = Query(None, description="预算状态过滤"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(100, ge=1, le=100, description="限制数量"),
@@ -63,6 +67,11 @@ def get_budgets(
             detail="无权限访问此账本"
         )
     
+    # 预算统计依赖当天日期，一并计入 ETag
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "budgets", status, skip, limit, datetime.utcnow().date()))
+    if cached:
+        return cached
+    
     budgets = budget_crud.get_budgets_by_ledger(db, ledger_id, status, skip, limit)
     stats = budget_crud.get_budget_stats(db, ledger_id)
     
@@ -215,6 +224,86 @@ def get_budget_progress(
     
     return success_response(data=progress_data, message="获取预算进度成功")
 
+@router.get("/ledger/{ledger_id}/forecast", response_model=BaseResponse)
+def get_ledger_budget_forecasts(
+    ledger_id: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量预测账本所有活跃预算的期末支出"""
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此账本"
+        )
+    
+    # 预测依赖当天日期，一并计入 ETag
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "budget_forecast", datetime.utcnow().date()))
+    if cached:
+        return cached
+    
+    budgets = budget_crud.get_active_budgets(db, ledger_id)
+    forecasts = forecast_budgets(budgets, budget_crud.get_budget_daily_expenses(db, budgets))
+    return success_response(data=forecasts, message="获取预算预测成功")
+
+@router.get("/{budget_id}/forecast", response_model=BaseResponse)
+def get_budget_forecast(
+    budget_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """预测预算的期末支出与超支日期"""
+    budget = budget_crud.get_budget(db, budget_id)
+    if not budget:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="预算不存在"
+        )
+    
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, budget.ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此预算"
+        )
+    
+    daily_totals = {day: total for _, day, total in budget_crud.get_budget_daily_expenses(db, [budget])}
+    return success_response(data=forecast_budget(budget, daily_totals), message="获取预算预测成功")
+
+@router.get("/{budget_id}/history", response_model=BaseResponse)
+def get_budget_history(
+    budget_id: int,
+    granularity: str = Query("day", description="时间粒度: day, week"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取预算的累计支出曲线"""
+    if granularity not in budget_crud.CURVE_GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的时间粒度"
+        )
+    
+    budget = budget_crud.get_budget(db, budget_id)
+    if not budget:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="预算不存在"
+        )
+    
+    # 检查用户是否有账本访问权限
+    if not check_user_ledger_access(db, current_user.id, budget.ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此预算"
+        )
+    
+    curve = budget_crud.get_budget_spend_curve(db, budget, granularity)
+    return success_response(data=curve, message="获取预算支出曲线成功")
+
 @router.get("/{budget_id}/recalculate", response_model=BaseResponse)
 def recalculate_budget(
     budget_id: int,
@@ -244,9 +333,20 @@ def recalculate_budget(
     except Exception as e:
         return error_response(f"重新计算预算失败: {str(e)}")
 
+@router.post("/admin/reconcile", response_model=BaseResponse, dependencies=[Depends(require_admin_token)])
+def reconcile_budgets(
+    dry_run: bool = Query(False, description="只报告偏差不修正"),
+    db: Session = Depends(get_db)
+):
+    """核对并修正所有活跃预算的支出（管理接口）"""
+    result = budget_crud.reconcile_budgets(db, fix=not dry_run)
+    return success_response(data=result, message="预算核对完成")
+
 @router.get("/ledger/{ledger_id}/stats", response_model=BaseResponse)
 def get_ledger_budget_stats(
     ledger_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -258,12 +358,19 @@ def get_ledger_budget_stats(
             detail="无权限访问此账本"
         )
     
+    # 预算统计依赖当天日期，一并计入 ETag
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "budget_stats", datetime.utcnow().date()))
+    if cached:
+        return cached
+    
     stats = budget_crud.get_budget_stats(db, ledger_id)
     return success_response(data=stats, message="获取预算统计成功")
 
 @router.get("/ledger/{ledger_id}/alerts", response_model=BaseResponse)
 def get_budget_alerts(
     ledger_id: int,
+    request: Request,
+    response: Response,
     unread_only: bool = Query(False, description="只获取未读提醒"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -276,6 +383,10 @@ def get_budget_alerts(
             detail="无权限访问此账本"
         )
     
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "budget_alerts", unread_only))
+    if cached:
+        return cached
+    
     alerts = budget_crud.get_budget_alerts(db, ledger_id, unread_only)
     alerts_data = [BudgetAlertResponse.model_validate(alert) for alert in alerts]
     
@@ -302,6 +413,8 @@ def mark_alert_sent(
 @router.get("/ledger/{ledger_id}/summary", response_model=BaseResponse)
 def get_budget_summary(
     ledger_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -313,19 +426,22 @@ def get_budget_summary(
             detail="无权限访问此账本"
         )
     
-    # 获取不同类型的预算
-    monthly_budgets = budget_crud.get_budgets_by_ledger(db, ledger_id, BudgetStatus.ACTIVE)
-    monthly_budgets = [b for b in monthly_budgets if b.period_type == BudgetPeriodType.MONTHLY]
-    
-    yearly_budgets = budget_crud.get_budgets_by_ledger(db, ledger_id, BudgetStatus.ACTIVE)
-    yearly_budgets = [b for b in yearly_budgets if b.period_type == BudgetPeriodType.YEARLY]
+    # 预算统计依赖当天日期，一并计入 ETag
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "budget_summary", datetime.utcnow().date()))
+    if cached:
+        return cached
     
-    custom_budgets = budget_crud.get_budgets_by_ledger(db, ledger_id, BudgetStatus.ACTIVE)
-    custom_budgets = [b for b in custom_budgets if b.period_type == BudgetPeriodType.CUSTOM]
+    # 活跃预算与统计一次查询取出，再按周期类型分组
+    budgets, stats = budget_crud.get_budget_summary_data(db, ledger_id)
+    budgets_by_period = {period_type: [] for period_type in BudgetPeriodType}
+    for budget in budgets:
+        budgets_by_period[budget.period_type].append(budget)
+    monthly_budgets = budgets_by_period[BudgetPeriodType.MONTHLY]
+    yearly_budgets = budgets_by_period[BudgetPeriodType.YEARLY]
+    custom_budgets = budgets_by_period[BudgetPeriodType.CUSTOM]
     
-    # 获取提醒和统计
+    # 获取未读提醒
     alerts = budget_crud.get_budget_alerts(db, ledger_id, unread_only=True)
-    stats = budget_crud.get_budget_stats(db, ledger_id)
     
     summary_data = BudgetSummary(
         monthly_budgets=[BudgetResponse.model_validate(b) for b in monthly_budgets],
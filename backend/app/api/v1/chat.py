@@ -1,21 +1,63 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime, date
 
 from app.db.database import get_db
-from app.models import User
+from app.models import User, Bill
 from app.schemas.chat import ChatRequest, ChatResponse, ChatMessageCreate
 from app.schemas.bill import BillCreate, BillResponse
 from app.models.enums import BillType
-from app.core.security.auth import get_current_user
+from app.core.security.auth import get_current_user, require_admin_token
 from app.services.ai.service import ai_service
+from app.services.ai.metrics import ai_metrics
 from app.crud import chat as chat_crud
 from app.crud import bill as bill_crud
-from app.utils.response import BaseResponse, paginated_response, success_response, error_response
+from app.crud.ledger import check_user_ledger_access
+from app.utils.response import BaseResponse, paginated_response, success_response, error_response, sse_event
 
 router = APIRouter()
 
+def _create_bill_from_ai(db: Session, bill_data: dict, ledger_id: int, user_id: int) -> Optional[Bill]:
+    """根据 AI 识别出的账单信息创建账单，数据不合法时返回 None"""
+    try:
+        # 处理日期信息
+        bill_date = datetime.now()
+        if "date" in bill_data and bill_data["date"]:
+            try:
+                # 尝试解析AI返回的日期字符串
+                if isinstance(bill_data["date"], str):
+                    bill_date = datetime.strptime(bill_data["date"], "%Y-%m-%d")
+                elif isinstance(bill_data["date"], date):
+                    bill_date = datetime.combine(bill_data["date"], datetime.min.time())
+            except (ValueError, TypeError):
+                # 如果日期解析失败，使用当前日期
+                bill_date = datetime.now()
+
+        # 创建账单
+        bill_create = BillCreate(
+            amount=bill_data["amount"],
+            type=BillType(bill_data["type"]),
+            description=bill_data.get("description", ""),
+            category=bill_data.get("category", "其他"),
+            date=bill_date,
+            ledger_id=ledger_id
+        )
+        return bill_crud.create_bill(db, bill_create, user_id)
+    except Exception as e:
+        print(f"创建账单失败: {e}")
+        db.rollback()
+        return None
+
+async def _iter_result(result: dict):
+    """把非流式的 AI 结果转换成与 chat_stream 相同的事件序列"""
+    for bill in result.get("bills") or []:
+        yield {"type": "bill", "bill": bill}
+    if result.get("message"):
+        yield {"type": "token", "text": result["message"]}
+    yield {"type": "result", **result}
+
 @router.post("/", response_model=BaseResponse)
 async def chat_with_ai(
     chat_request: ChatRequest,
@@ -50,13 +92,13 @@ async def chat_with_ai(
         if chat_request.audio:
             print("处理音频数据...")
             # 处理音频输入
-            voice_result = ai_service.recognize_voice(chat_request.audio)
+            voice_result = await ai_service.recognize_voice(chat_request.audio)
             print("音频识别返回值 ", voice_result)
             if voice_result.get("success"):
                 # 语音识别成功，分析识别出的文本
                 recognized_text = voice_result["text"]
                 # ai_response = ai_service.analyze_text(recognized_text)
-                ai_response = ai_service.chat(recognized_text)
+                ai_response = await ai_service.chat(recognized_text)
                 
                 # 更新用户消息内容为识别出的文本
                 user_msg_db.content = f"[语音识别] {recognized_text}"
@@ -71,47 +113,19 @@ async def chat_with_ai(
         
         elif chat_request.image:
             # 处理图片输入
-            ai_response = ai_service.analyze_image(chat_request.image)
+            ai_response = await ai_service.analyze_image(chat_request.image)
             user_msg_db.input_type = "image"
             db.commit()
         
         else:
             # 处理文本输入
-            ai_response = ai_service.chat(chat_request.message)
+            ai_response = await ai_service.chat(chat_request.message)
         # 如果AI识别出账单信息，创建账单
-        if ai_response.get("bills"):
-            for bill_data in ai_response["bills"]:
-                try:
-                    # 处理日期信息
-                    bill_date = datetime.now()
-                    if "date" in bill_data and bill_data["date"]:
-                        try:
-                            # 尝试解析AI返回的日期字符串
-                            if isinstance(bill_data["date"], str):
-                                bill_date = datetime.strptime(bill_data["date"], "%Y-%m-%d")
-                            elif isinstance(bill_data["date"], date):
-                                bill_date = datetime.combine(bill_data["date"], datetime.min.time())
-                        except (ValueError, TypeError):
-                            # 如果日期解析失败，使用当前日期
-                            bill_date = datetime.now()
-
-                    # 创建账单
-                    bill_create = BillCreate(
-                        amount=bill_data["amount"],
-                        type=BillType(bill_data["type"]),
-                        description=bill_data.get("description", ""),
-                        category=bill_data.get("category", "其他"),
-                        date=bill_date,
-                        ledger_id=chat_request.ledger_id
-                    )
-
-                    bill_db = bill_crud.create_bill(db, bill_create, current_user.id)
-                    bills_created.append(bill_db)
-                    bill_ids.append(bill_db.id)
-
-                except Exception as e:
-                    print(f"创建账单失败: {e}")
-                    continue
+        for bill_data in ai_response.get("bills") or []:
+            bill_db = _create_bill_from_ai(db, bill_data, chat_request.ledger_id, current_user.id)
+            if bill_db is not None:
+                bills_created.append(bill_db)
+                bill_ids.append(bill_db.id)
 
         # 保存AI回复到数据库
         ai_message = ChatMessageCreate(
@@ -147,23 +161,145 @@ async def chat_with_ai(
         }
         return error_response(f"AI服务错误: {str(e)}", data=ChatResponse(**error_response_data))
 
+@router.post("/stream")
+async def chat_with_ai_stream(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """与AI聊天（Server-Sent Events 流式返回）
+
+    事件依次为：
+    - start：用户消息已保存，立即返回，不等待 AI
+    - asr：语音识别出的文本（仅语音输入）
+    - token：AI 回复的文字片段
+    - bill：一笔账单已创建，data 为账单详情
+    - final：完整回复，字段同 POST /chat/
+    - error：处理失败
+    """
+    if not chat_request.ledger_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请选择一个账本"
+        )
+    if not check_user_ledger_access(db, current_user.id, chat_request.ledger_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此账本"
+        )
+    
+    user_id = current_user.id
+    ledger_id = chat_request.ledger_id
+    
+    async def generate():
+        try:
+            user_msg_db = chat_crud.create_chat_message(db, ChatMessageCreate(
+                content=chat_request.message,
+                message_type="user",
+                input_type="text",
+                ledger_id=ledger_id
+            ), user_id)
+            yield sse_event("start", {"message_id": user_msg_db.id})
+            
+            if chat_request.audio:
+                voice_result = await ai_service.recognize_voice(chat_request.audio)
+                if not voice_result.get("success"):
+                    events = _iter_result({"message": "抱歉，语音识别失败，请重试。", "bills": []})
+                else:
+                    recognized_text = voice_result["text"]
+                    user_msg_db.content = f"[语音识别] {recognized_text}"
+                    user_msg_db.input_type = "voice"
+                    user_msg_db.ai_confidence = voice_result.get("confidence", 0.9)
+                    db.commit()
+                    yield sse_event("asr", {"text": recognized_text, "confidence": user_msg_db.ai_confidence})
+                    events = ai_service.chat_stream(recognized_text)
+            elif chat_request.image:
+                user_msg_db.input_type = "image"
+                db.commit()
+                events = _iter_result(await ai_service.analyze_image(chat_request.image))
+            else:
+                events = ai_service.chat_stream(chat_request.message)
+            
+            bills_created = []
+            result = {}
+            async for event in events:
+                if event["type"] == "token":
+                    yield sse_event("token", {"text": event["text"]})
+                elif event["type"] == "bill":
+                    # 每解析出一笔就立即入库并推送，不等待完整回复
+                    bill_db = _create_bill_from_ai(db, event["bill"], ledger_id, user_id)
+                    if bill_db is not None:
+                        bills_created.append(bill_db)
+                        yield sse_event("bill", BillResponse.model_validate(bill_db))
+                else:
+                    result = event
+            
+            reply = result.get("message") or "抱歉，我无法理解您的输入。"
+            ai_message_db = chat_crud.create_chat_message(db, ChatMessageCreate(
+                content=reply,
+                message_type="assistant",
+                input_type="text",
+                ledger_id=ledger_id
+            ), user_id)
+            if bills_created:
+                chat_crud.create_message_bills_associations(
+                    db, ai_message_db.id, [bill.id for bill in bills_created], result.get("confidence")
+                )
+            yield sse_event("final", ChatResponse(
+                message=reply,
+                user_id=user_id,
+                bills=[BillResponse.model_validate(bill) for bill in bills_created] or None,
+                confidence=result.get("confidence")
+            ))
+        except Exception as e:
+            yield sse_event("error", {"message": f"AI服务错误: {str(e)}"})
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/metrics", response_model=BaseResponse, dependencies=[Depends(require_admin_token)])
+async def get_ai_metrics():
+    """获取本 worker 的 AI 调用指标（管理接口）"""
+    return success_response(ai_metrics.snapshot(), message="获取AI指标成功")
+
 @router.get("/history/{ledger_id}")
 async def get_chat_history(
     ledger_id: int,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取聊天历史"""
+    """获取聊天历史
+
+    - 按 (timestamp, id) 游标从新到旧分页，响应中的 next_cursor 传入 cursor 获取下一页
+    - 未提供 cursor 时兼容按 skip 偏移读取
+    - include_total=false 时跳过计数查询，total 返回 null
+    """
     try:
-        messages = chat_crud.get_recent_chat_messages(db, ledger_id, current_user.id, skip, limit)
-        total = chat_crud.get_chat_messages_count(db, current_user.id, ledger_id)
+        messages, next_cursor = chat_crud.get_chat_history_page(
+            db, ledger_id, current_user.id, cursor, limit, skip
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    try:
+        total = chat_crud.get_chat_messages_count(db, current_user.id, ledger_id) if include_total else None
 
-        # 构建响应数据，包含账单详情
+        # 构建响应数据，关联账单已随消息预加载
         response_data = []
         for msg in messages:
-            message_data = {
+            response_data.append({
                 "id": msg.id,
                 "content": msg.content,
                 "message_type": msg.message_type,
@@ -171,17 +307,13 @@ async def get_chat_history(
                 "input_type": msg.input_type,
                 "ai_confidence": msg.ai_confidence,
                 "is_processed": msg.is_processed,
-                "bills": []  # 初始化账单列表
-            }
-
-            # 获取消息关联的所有账单
-            bills = chat_crud.get_message_bills(db, msg.id)
-            if bills:
-                message_data["bills"] = [BillResponse.model_validate(bill) for bill in bills]
-
-            response_data.append(message_data)
+                "bills": [
+                    BillResponse.model_validate(message_bill.bill)
+                    for message_bill in sorted(msg.message_bills, key=lambda message_bill: message_bill.id)
+                    if message_bill.bill is not None
+                ]
+            })
 
-        # return success_response(response_data)
-        return paginated_response(response_data, total, skip, limit)
+        return paginated_response(response_data, total, skip, limit, next_cursor=next_cursor)
     except Exception as e:
-        return error_response(f"获取聊天历史失败: {str(e)}")
\ No newline at end of file
+        return error_response(f"获取聊天历史失败: {str(e)}")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 import re
@@ -13,9 +13,10 @@ from app.crud.invitation import (
     get_user_pending_invitations, accept_invitation, reject_invitation,
     cancel_invitation
 )
-from app.crud.ledger import check_user_ledger_admin, check_user_ledger_access
+from app.crud.ledger import check_user_ledger_admin, check_user_ledger_access, get_ledger_version
 from app.crud.user import get_user_by_email
 from app.utils.response import success_response, error_response
+from app.utils.etag import make_etag, not_modified
 
 router = APIRouter()
 
@@ -85,6 +86,8 @@ def create_new_invitation(
 @router.get("/ledger/{ledger_id}", response_model=BaseResponse)
 def get_ledger_invitations_list(
     ledger_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -96,6 +99,10 @@ def get_ledger_invitations_list(
             detail="权限不足"
         )
     
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "invitations"))
+    if cached:
+        return cached
+    
     invitations = get_ledger_invitations(db, ledger_id)
     
     # 为每个邀请添加邀请人信息
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -10,9 +10,11 @@ from app.core.security.auth import get_current_user
 from app.crud.ledger import (
     create_ledger, get_user_ledgers, get_ledger, get_ledger_members,
     remove_ledger_member, check_user_ledger_access, check_user_ledger_admin, 
-    check_user_ledger_owner, transfer_ledger_ownership, delete_ledger, restore_ledger, permanently_delete_ledger
+    check_user_ledger_owner, transfer_ledger_ownership, delete_ledger, restore_ledger, permanently_delete_ledger,
+    bump_ledger_version, get_ledger_version, get_user_ledger_versions
 )
 from app.crud.user import get_user_by_email
+from app.utils.etag import make_etag, not_modified
 
 router = APIRouter()
 
@@ -32,10 +34,18 @@ def create_new_ledger(
 
 @router.get("/my", response_model=BaseResponse[List[dict]])
 def get_my_ledgers(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取我的账本列表"""
+    # 账本集合及各账本版本号都未变化时返回 304
+    versions = get_user_ledger_versions(db, current_user.id)
+    cached = not_modified(request, response, make_etag(sum(version for _, version in versions), "my_ledgers", current_user.id, tuple(map(tuple, versions))))
+    if cached:
+        return cached
+    
     user_ledgers = get_user_ledgers(db, current_user.id)
     
     # 返回包含用户账本关系的完整信息
@@ -121,6 +131,8 @@ def set_current_ledger(
 @router.get("/{ledger_id}", response_model=BaseResponse[LedgerResponse])
 def get_ledger_info(
     ledger_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -132,6 +144,10 @@ def get_ledger_info(
             detail="无权限访问此账本"
         )
     
+    cached = not_modified(request, response, make_etag(get_ledger_version(db, ledger_id), "ledger"))
+    if cached:
+        return cached
+    
     ledger = get_ledger(db, ledger_id)
     if not ledger:
         raise HTTPException(
@@ -159,6 +175,7 @@ def get_ledger_members_endpoint(
             detail="无权限访问此账本"
         )
     
+    # 不使用 ETag：成员列表包含用户名和邮箱，用户资料变化不会递增账本版本号
     members = get_ledger_members(db, ledger_id)
     is_owner = check_user_ledger_owner(db, current_user.id, ledger_id)
     
@@ -211,6 +228,7 @@ def update_ledger(
     # 更新账本信息
     for key, value in ledger_update.model_dump(exclude_unset=True).items():
         setattr(ledger, key, value)
+    bump_ledger_version(db, ledger_id)
     
     db.commit()
     db.refresh(ledger)
@@ -33,9 +33,17 @@ class Settings(BaseSettings):
     # 回收站配置
     recycle_bin_expire_days: int = 90
     
+    # 管理接口令牌，未配置时管理接口不可用
+    admin_token: Optional[str] = Field(default=None, env="ADMIN_TOKEN")
+    
     # AI服务配置
     dashscope_api_key: Optional[str] = Field(default=None, env="DASHSCOPE_API_KEY")
     openai_api_key: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
+    ai_max_concurrency: int = Field(default=64, env="AI_MAX_CONCURRENCY")  # 每个 worker 同时进行的 AI 调用上限
+    ai_timeout_seconds: float = Field(default=30.0, env="AI_TIMEOUT_SECONDS")  # 单次 AI 调用超时（含排队）
+    ai_cache_size: int = Field(default=10000, env="AI_CACHE_SIZE")  # 进程内文本分析缓存条目上限，0 表示关闭
+    ai_cache_ttl_seconds: float = Field(default=86400.0, env="AI_CACHE_TTL_SECONDS")
+    ai_cache_redis_url: Optional[str] = Field(default=None, env="AI_CACHE_REDIS_URL")  # 配置后各 worker 共享缓存（需安装 redis）
 
     # 阿里云NLS语音识别配置
     aliyun_nls_app_key: Optional[str] = Field(default=None, env="ALIYUN_NLS_APP_KEY")
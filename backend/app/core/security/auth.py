@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+import secrets
+from fastapi import Depends, HTTPException, Header, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
@@ -52,4 +53,12 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
-    return user 
\ No newline at end of file
+    return user 
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """校验管理接口令牌（请求头 X-Admin-Token）"""
+    if not settings.admin_token or not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无管理员权限"
+        )
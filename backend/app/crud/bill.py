@@ -1,9 +1,18 @@
 from sqlalchemy.orm import Session
-from typing import Optional
-from datetime import datetime
-from app.models import Bill
-from app.schemas.bill import BillCreate
-from app.crud.budget import update_budget_spent, recalculate_budget_spent, get_active_budgets_by_category
+from sqlalchemy import and_, or_, func, select, insert
+from sqlalchemy.engine import Row
+from typing import Optional, List, Tuple, Iterator, Iterable, Sequence, Dict, Set, Callable
+from datetime import datetime, date, time, timedelta, timezone
+import json
+from app.models import Bill, BillDailyRollup, MessageBill
+from app.models.enums import BillType
+from app.schemas.bill import BillCreate, BillBatchOperation, BillBatchResult, BillResponse, CalendarDay, LedgerCalendar
+from app.schemas.base import LedgerStats
+from app.crud.budget import accumulate_budget_delta, apply_budget_deltas
+from app.crud.ledger import check_user_ledger_access, bump_ledger_version
+from app.crud.rollup import accumulate_rollup_delta, apply_rollup_deltas
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.db.dialect import local_date, resolve_timezone
 
 def get_bills(db: Session, ledger_id: int, skip: int = 0, limit: int = 100, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
     """获取账本账单，支持时间筛选和分页"""
@@ -15,16 +24,133 @@ def get_bills(db: Session, ledger_id: int, skip: int = 0, limit: int = 100, star
     
     return query.order_by(Bill.date.desc()).offset(skip).limit(limit).all()
 
-def get_bills_no_pagination(db: Session, user_id: int, ledger_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
-    """获取账本账单，支持时间筛选，不分页"""
+def _user_ledger_bills_query(db: Session, user_id: int, ledger_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    """构建用户在账本中的账单查询，支持时间筛选"""
     query = db.query(Bill).filter(Bill.ledger_id == ledger_id, Bill.owner_id == user_id)
     
     # 添加时间筛选
     if start_date and end_date:
         query = query.filter(Bill.date >= start_date, Bill.date <= end_date)
     
+    return query
+
+def get_bills_no_pagination(db: Session, user_id: int, ledger_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    """获取账本账单，支持时间筛选，不分页"""
+    query = _user_ledger_bills_query(db, user_id, ledger_id, start_date, end_date)
     return query.order_by(Bill.date.desc()).all()
 
+def get_bills_page(
+    db: Session,
+    user_id: int,
+    ledger_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List[Bill], Optional[str]]:
+    """按 (date, id) 游标分页获取账本账单，返回 (账单列表, 下一页游标)"""
+    query = _user_ledger_bills_query(db, user_id, ledger_id, start_date, end_date)
+    
+    # 从上一页最后一条记录之后继续读取，避免 OFFSET 扫描
+    position = decode_cursor(cursor)
+    if position:
+        last_date, last_id = position
+        query = query.filter(or_(
+            Bill.date < last_date,
+            and_(Bill.date == last_date, Bill.id < last_id)
+        ))
+    
+    # 多取一条用于判断是否还有下一页
+    bills = query.order_by(Bill.date.desc(), Bill.id.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(bills) > limit:
+        bills = bills[:limit]
+        next_cursor = encode_cursor(bills[-1].date, bills[-1].id)
+    
+    return bills, next_cursor
+
+# 轻量读取的列，顺序与 BillResponse 序列化后的字段顺序一致
+BILL_RESPONSE_COLUMNS = ("amount", "type", "category", "description", "date", "id", "owner_id", "ledger_id")
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+def get_bills_lite_json(
+    db: Session,
+    user_id: int,
+    ledger_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> bytes:
+    """轻量读取账本账单，直接返回 JSON 数组字节
+
+    只用 Core 查询所需列，跳过 ORM 对象与 BillResponse 实例化，输出与 BillResponse 列表序列化结果一致。
+    """
+    stmt = select(*(getattr(Bill, name) for name in BILL_RESPONSE_COLUMNS)).where(
+        Bill.ledger_id == ledger_id, Bill.owner_id == user_id
+    )
+    
+    # 添加时间筛选
+    if start_date and end_date:
+        stmt = stmt.where(Bill.date >= start_date, Bill.date <= end_date)
+    
+    # 直接在连接上执行，绕过 ORM 结果加载层
+    rows = db.connection().execute(stmt.order_by(Bill.date.desc())).all()
+    return json.dumps(
+        [dict(zip(BILL_RESPONSE_COLUMNS, row)) for row in rows],
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=_json_default
+    ).encode("utf-8")
+
+def iter_bill_chunks(
+    db: Session,
+    user_id: int,
+    ledger_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    chunk_size: int = 500
+) -> Iterator[List[Bill]]:
+    """按游标分块迭代账本账单，内存占用与账本大小无关"""
+    cursor = None
+    while True:
+        bills, cursor = get_bills_page(db, user_id, ledger_id, start_date, end_date, cursor, chunk_size)
+        if bills:
+            yield bills
+            # 释放已输出的对象，避免身份映射随账本增长
+            for bill in bills:
+                db.expunge(bill)
+        if not cursor:
+            break
+
+# 导出列（顺序即输出顺序）
+BILL_EXPORT_COLUMNS = ("id", "date", "type", "category", "amount", "description", "owner_id", "ledger_id")
+
+def iter_bill_export_rows(
+    db: Session,
+    ledger_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    chunk_size: int = 1000
+) -> Iterator[Sequence[Row]]:
+    """以服务端游标分批读取账本账单的原始列，按时间正序输出，不构造 ORM 对象"""
+    stmt = select(*(getattr(Bill, name) for name in BILL_EXPORT_COLUMNS)).where(Bill.ledger_id == ledger_id)
+    
+    # 添加时间筛选
+    if start_date and end_date:
+        stmt = stmt.where(Bill.date >= start_date, Bill.date <= end_date)
+    
+    stmt = stmt.order_by(Bill.date, Bill.id).execution_options(stream_results=True, yield_per=chunk_size)
+    result = db.execute(stmt)
+    try:
+        for rows in result.partitions():
+            yield rows
+    finally:
+        result.close()
+
 def get_bills_count(db: Session, ledger_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
     """获取账本账单总数，支持时间筛选"""
     query = db.query(Bill).filter(Bill.ledger_id == ledger_id)
@@ -35,17 +161,135 @@ def get_bills_count(db: Session, ledger_id: int, start_date: Optional[datetime]
     
     return query.count()
 
+def _whole_day_span(start_date: Optional[datetime], end_date: Optional[datetime]):
+    """判断时间范围是否按整天对齐
+
+    返回 () 表示不限时间，返回 (开始日, 结束日) 表示整天范围，返回 None 表示需要精确到时间。
+    """
+    if not (start_date and end_date):
+        return ()
+    
+    starts_at_midnight = start_date.time() == time.min
+    ends_at_day_end = end_date.time().replace(microsecond=0) == time(23, 59, 59) and end_date.microsecond in (0, 999999)
+    if starts_at_midnight and ends_at_day_end:
+        return start_date.date(), end_date.date()
+    return None
+
+def get_ledger_stats(
+    db: Session,
+    ledger_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    time_filter: str = "all"
+) -> LedgerStats:
+    """按 (类型, 分类) 分组聚合账本收支统计，只需一次查询
+
+    时间范围按整天对齐（或不限时间）时读取按日汇总表，否则直接聚合账单表。
+    """
+    day_span = _whole_day_span(start_date, end_date)
+    if day_span is not None:
+        query = db.query(
+            BillDailyRollup.type,
+            BillDailyRollup.category,
+            func.sum(BillDailyRollup.total_amount).label("total_amount"),
+            func.sum(BillDailyRollup.bill_count).label("bill_count")
+        ).filter(BillDailyRollup.ledger_id == ledger_id)
+        
+        if day_span:
+            query = query.filter(BillDailyRollup.day >= day_span[0], BillDailyRollup.day <= day_span[1])
+        
+        rows = query.group_by(BillDailyRollup.type, BillDailyRollup.category).all()
+    else:
+        query = db.query(
+            Bill.type,
+            Bill.category,
+            func.sum(Bill.amount).label("total_amount"),
+            func.count(Bill.id).label("bill_count")
+        ).filter(Bill.ledger_id == ledger_id)
+        
+        # 添加时间筛选
+        query = query.filter(Bill.date >= start_date, Bill.date <= end_date)
+        
+        rows = query.group_by(Bill.type, Bill.category).all()
+    
+    totals = {BillType.INCOME: 0.0, BillType.EXPENSE: 0.0}
+    category_stats = {BillType.INCOME.value: {}, BillType.EXPENSE.value: {}}
+    bill_count = 0
+    for bill_type, category, total_amount, count in rows:
+        total_amount = total_amount or 0.0
+        totals[bill_type] += total_amount
+        bill_count += count
+        
+        # 未分类账单归入"其他"
+        stats = category_stats[bill_type.value].setdefault(category or "其他", {"amount": 0.0, "count": 0})
+        stats["amount"] += total_amount
+        stats["count"] += count
+    
+    return LedgerStats(
+        total_income=totals[BillType.INCOME],
+        total_expense=totals[BillType.EXPENSE],
+        net_amount=totals[BillType.INCOME] - totals[BillType.EXPENSE],
+        bill_count=bill_count,
+        category_stats=category_stats,
+        time_filter=time_filter
+    )
+
+def get_ledger_calendar(db: Session, ledger_id: int, tz_name: str, start_day: date, end_day: date) -> LedgerCalendar:
+    """按账本时区统计 [start_day, end_day] 内每天的收支金额与笔数，一次 GROUP BY 查询
+
+    账单时间按 UTC 存储，先把本地日期范围换算为 UTC 以便走索引，再在 SQL 中换算为本地日期分组。
+    """
+    tz = resolve_timezone(tz_name)
+    start_utc = datetime.combine(start_day, time.min, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+    end_utc = datetime.combine(end_day + timedelta(days=1), time.min, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+    
+    day = local_date(db, Bill.date, tz.key, start_utc, end_utc).label("day")
+    rows = db.query(
+        day,
+        Bill.type,
+        func.sum(Bill.amount),
+        func.count(Bill.id)
+    ).filter(
+        Bill.ledger_id == ledger_id,
+        Bill.date >= start_utc,
+        Bill.date < end_utc
+    ).group_by(day, Bill.type).all()
+    
+    days = {}
+    for bucket, bill_type, total_amount, count in rows:
+        # SQLite 返回字符串，PostgreSQL 返回 date
+        bucket = bucket if isinstance(bucket, date) else date.fromisoformat(bucket)
+        entry = days.setdefault(bucket, CalendarDay(date=bucket))
+        if bill_type == BillType.INCOME:
+            entry.income, entry.income_count = total_amount or 0.0, count
+        else:
+            entry.expense, entry.expense_count = total_amount or 0.0, count
+    
+    return LedgerCalendar(
+        timezone=tz.key,
+        start_date=start_day,
+        end_date=end_day,
+        days=[days[key] for key in sorted(days)]
+    )
+
 def create_bill(db: Session, bill: BillCreate, user_id: int):
     bill_data = bill.model_dump()
     bill_data['owner_id'] = user_id
     db_bill = Bill(**bill_data)
     db.add(db_bill)
+    db.flush()
+    
+    # 在同一事务中更新按日汇总与预算进度
+    deltas = {}
+    accumulate_rollup_delta(deltas, db_bill.ledger_id, db_bill.date, db_bill.type, db_bill.category, db_bill.amount, 1)
+    apply_rollup_deltas(db, deltas)
+    budget_changes = {}
+    accumulate_budget_delta(budget_changes, db_bill.ledger_id, db_bill.date, db_bill.type, db_bill.category, db_bill.amount)
+    apply_budget_deltas(db, budget_changes)
+    bump_ledger_version(db, db_bill.ledger_id)
     db.commit()
     db.refresh(db_bill)
     
-    # 更新预算进度
-    update_budget_spent(db, db_bill.ledger_id, db_bill.amount, db_bill.type, db_bill.date)
-    
     return db_bill
 
 def get_bill(db: Session, bill_id: int):
@@ -56,35 +300,191 @@ def update_bill(db: Session, bill_id: int, user_id: int, **kwargs):
     """更新账单"""
     bill = db.query(Bill).filter(Bill.id == bill_id, Bill.owner_id == user_id).first()
     if bill:
-        # 保存原始值以便重新计算预算
-        old_category = bill.category
+        # 先移出原始值对汇总和预算的影响
+        deltas = {}
+        budget_changes = {}
+        accumulate_rollup_delta(deltas, bill.ledger_id, bill.date, bill.type, bill.category, -bill.amount, -1)
+        accumulate_budget_delta(budget_changes, bill.ledger_id, bill.date, bill.type, bill.category, -bill.amount)
         
         for key, value in kwargs.items():
             if hasattr(bill, key):
                 setattr(bill, key, value)
+        db.flush()
+        
+        # 再计入新的金额/日期/类型/分类
+        accumulate_rollup_delta(deltas, bill.ledger_id, bill.date, bill.type, bill.category, bill.amount, 1)
+        accumulate_budget_delta(budget_changes, bill.ledger_id, bill.date, bill.type, bill.category, bill.amount)
+        apply_rollup_deltas(db, deltas)
+        apply_budget_deltas(db, budget_changes)
+        bump_ledger_version(db, bill.ledger_id)
         db.commit()
         db.refresh(bill)
         
-        # 重新计算该区间内的预算开销
-        old_budgets = get_active_budgets_by_category(db, bill.ledger_id, bill.date)
-        for budget in old_budgets:
-            recalculate_budget_spent(db, budget.id)
-        
         return bill
     return None
 
 def delete_bill(db: Session, bill_id: int, user_id: int):
     bill = db.query(Bill).filter(Bill.id == bill_id, Bill.owner_id == user_id).first()
     if bill:
-        # 保存账单信息用于重新计算预算
+        # 移出该账单对汇总和预算的影响
         ledger_id = bill.ledger_id
+        deltas = {}
+        budget_changes = {}
+        accumulate_rollup_delta(deltas, bill.ledger_id, bill.date, bill.type, bill.category, -bill.amount, -1)
+        accumulate_budget_delta(budget_changes, bill.ledger_id, bill.date, bill.type, bill.category, -bill.amount)
         
         db.delete(bill)
+        apply_rollup_deltas(db, deltas)
+        apply_budget_deltas(db, budget_changes)
+        bump_ledger_version(db, ledger_id)
         db.commit()
         
-        budgets = get_active_budgets_by_category(db, ledger_id, bill.date)
-        for budget in budgets:
-            recalculate_budget_spent(db, budget.id)
-        
         return True
-    return False 
\ No newline at end of file
+    return False 
+
+def apply_bill_batch(db: Session, operations: List[BillBatchOperation], user_id: int, atomic: bool = False) -> List[BillBatchResult]:
+    """在一个事务中执行批量新增/修改/删除账单
+
+    账单按批写入，按日汇总与预算增量合并后各写入一次。
+    atomic 为 True 时任一项失败则回滚全部操作。
+    """
+    results: List[Optional[BillBatchResult]] = [None] * len(operations)
+    deltas = {}
+    budget_changes = {}
+    
+    def touch(bill: Bill, sign: int):
+        accumulate_rollup_delta(deltas, bill.ledger_id, bill.date, bill.type, bill.category, sign * bill.amount, sign)
+        accumulate_budget_delta(budget_changes, bill.ledger_id, bill.date, bill.type, bill.category, sign * bill.amount)
+    
+    def fail(index: int, operation: BillBatchOperation, error: str):
+        results[index] = BillBatchResult(index=index, action=operation.action, success=False, bill_id=operation.bill_id, error=error)
+    
+    # 一次查出所有待修改/删除且属于当前用户的账单
+    target_ids = {op.bill_id for op in operations if op.action != "create" and op.bill_id is not None}
+    owned = {
+        bill.id: bill
+        for bill in db.query(Bill).filter(Bill.id.in_(target_ids), Bill.owner_id == user_id).all()
+    } if target_ids else {}
+    
+    ledger_access: Dict[int, bool] = {}
+    created: List[Tuple[int, Bill]] = []
+    updated: List[Tuple[int, Bill]] = []
+    deleted_ids: Set[int] = set()
+    
+    for index, operation in enumerate(operations):
+        if operation.action == "create":
+            if operation.bill is None:
+                fail(index, operation, "缺少账单数据")
+                continue
+            ledger_id = operation.bill.ledger_id
+            if ledger_id not in ledger_access:
+                ledger_access[ledger_id] = bool(check_user_ledger_access(db, user_id, ledger_id))
+            if not ledger_access[ledger_id]:
+                fail(index, operation, "无权限访问此账本")
+                continue
+            bill = Bill(**operation.bill.model_dump(), owner_id=user_id)
+            if bill.date is None:
+                bill.date = datetime.utcnow()
+            created.append((index, bill))
+            continue
+        
+        bill = owned.get(operation.bill_id)
+        if bill is None or bill.id in deleted_ids:
+            fail(index, operation, "账单不存在或无权限操作")
+            continue
+        
+        if operation.action == "update":
+            if operation.changes is None:
+                fail(index, operation, "缺少修改内容")
+                continue
+            touch(bill, -1)
+            for key, value in operation.changes.model_dump(exclude_unset=True).items():
+                setattr(bill, key, value)
+            touch(bill, 1)
+            updated.append((index, bill))
+        else:
+            touch(bill, -1)
+            deleted_ids.add(bill.id)
+            results[index] = BillBatchResult(index=index, action=operation.action, success=True, bill_id=bill.id)
+    
+    if atomic and any(result is not None and not result.success for result in results):
+        db.rollback()
+        return [
+            result if result is not None else BillBatchResult(
+                index=index, action=operations[index].action, success=False,
+                bill_id=operations[index].bill_id, error="批量操作已回滚"
+            )
+            for index, result in enumerate(results)
+        ]
+    
+    # 新增与修改在一次 flush 中按批写入
+    db.add_all([bill for _, bill in created])
+    db.flush()
+    for _, bill in created:
+        touch(bill, 1)
+    
+    if deleted_ids:
+        db.query(MessageBill).filter(MessageBill.bill_id.in_(deleted_ids)).delete(synchronize_session=False)
+        db.query(Bill).filter(Bill.id.in_(deleted_ids)).delete(synchronize_session=False)
+        for bill_id in deleted_ids:
+            db.expunge(owned[bill_id])
+    
+    apply_rollup_deltas(db, deltas)
+    apply_budget_deltas(db, budget_changes)
+    bump_ledger_version(db, *{ledger_id for ledger_id, *_ in deltas})
+    
+    # 提交前序列化，避免提交后逐条刷新对象
+    for index, bill in created + updated:
+        results[index] = BillBatchResult(
+            index=index, action=operations[index].action, success=True,
+            bill_id=bill.id, bill=BillResponse.model_validate(bill)
+        )
+    db.commit()
+    return results
+
+
+def bulk_import_bills(
+    db: Session,
+    bills: Iterable[BillCreate],
+    user_id: int,
+    chunk_size: int = 5000,
+    progress: Optional[Callable[[int], None]] = None
+) -> int:
+    """分块批量导入账单，整个导入在一个事务中完成，返回导入条数
+
+    每块用一条 executemany INSERT 写入；按日汇总与预算增量在内存中合并后各写入一次。
+    progress 在每块写入后以已导入条数回调。
+    """
+    deltas = {}
+    budget_changes = {}
+    imported = 0
+    chunk = []
+    
+    def flush_chunk():
+        nonlocal imported
+        db.execute(insert(Bill), chunk)
+        imported += len(chunk)
+        chunk.clear()
+        if progress:
+            progress(imported)
+    
+    for bill in bills:
+        row = bill.model_dump()
+        row["owner_id"] = user_id
+        if row["date"] is None:
+            row["date"] = datetime.utcnow()
+        chunk.append(row)
+        
+        accumulate_rollup_delta(deltas, row["ledger_id"], row["date"], row["type"], row["category"], row["amount"], 1)
+        accumulate_budget_delta(budget_changes, row["ledger_id"], row["date"], row["type"], row["category"], row["amount"])
+        
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+    if chunk:
+        flush_chunk()
+    
+    apply_rollup_deltas(db, deltas)
+    apply_budget_deltas(db, budget_changes)
+    bump_ledger_version(db, *{ledger_id for ledger_id, *_ in deltas})
+    db.commit()
+    return imported
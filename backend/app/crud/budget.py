@@ -1,38 +1,38 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from typing import List, Optional
+from sqlalchemy import and_, or_, func, update, bindparam, Date
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from itertools import accumulate
 
 from app.models import Budget, BudgetAlert, Bill
-from app.schemas.budget import BudgetCreate, BudgetUpdate, BudgetStats
-from app.models.enums import BudgetStatus, BillType, AlertType
+from app.schemas.budget import (
+    BudgetCreate, BudgetUpdate, BudgetStats, BudgetDrift, BudgetReconcileResult, BudgetSpendCurve
+)
+from app.models.enums import BudgetStatus, BudgetPeriodType, BillType, AlertType
+from app.crud.ledger import bump_ledger_version, bump_budget_version
+from app.crud.budget_index import get_budget_index, get_budget_indexes
+from app.db.dialect import dialect_insert, week_start
+
+# 修改后需要重新计算支出的预算字段
+BUDGET_SCOPE_FIELDS = {"category", "start_date", "end_date", "status"}
 
 # 预算CRUD操作
 def create_budget(db: Session, budget: BudgetCreate, user_id: int) -> Budget:
     """创建预算"""
-
-    # 计算该预算时间范围内的已有支出
-    total_spend = db.query(func.sum(Bill.amount)).filter(
-        and_(
-            Bill.ledger_id == budget.ledger_id,
-            Bill.owner_id == user_id,
-            Bill.type == BillType.EXPENSE,
-            Bill.date >= budget.start_date,
-            Bill.date <= budget.end_date
-        )
-    ).scalar() or 0.0
-    budget.spent = total_spend
-
     db_budget = Budget(
         **budget.model_dump(),
         created_by=user_id
     )
+    # 计算该预算时间范围内账本中匹配分类的已有支出
+    db_budget.spent = _budget_spent_total(db, db_budget)
+    
     db.add(db_budget)
+    bump_budget_version(db, budget.ledger_id)
     db.commit()
     db.refresh(db_budget)
 
-    print(db_budget)
-
     return db_budget
 
 def get_budget(db: Session, budget_id: int) -> Optional[Budget]:
@@ -54,20 +54,25 @@ def get_budgets_by_ledger(
     
     return query.offset(skip).limit(limit).all()
 
+def get_active_budgets(db: Session, ledger_id: int) -> List[Budget]:
+    """获取账本的全部活跃预算（不分页，供批量预测与总览使用）"""
+    return db.query(Budget).filter(
+        Budget.ledger_id == ledger_id,
+        Budget.status == BudgetStatus.ACTIVE
+    ).all()
+
 def get_active_budgets_by_category(
     db: Session, 
     ledger_id: int, 
-    current_date: datetime
+    current_date: datetime,
+    category: Optional[str] = None
 ) -> List[Budget]:
-    """获取指定分类的活跃预算"""
-    return db.query(Budget).filter(
-        and_(
-            Budget.ledger_id == ledger_id,
-            Budget.status == BudgetStatus.ACTIVE,
-            Budget.start_date <= current_date,
-            Budget.end_date >= current_date
-        )
-    ).all()
+    """获取某日期下匹配指定分类的活跃预算（含覆盖整个账本的预算），通过进程内区间索引定位"""
+    index = get_budget_index(db, ledger_id)
+    budget_ids = index.covering(current_date, category) if index else []
+    if not budget_ids:
+        return []
+    return db.query(Budget).filter(Budget.id.in_(budget_ids)).order_by(Budget.id).all()
 
 def update_budget(db: Session, budget_id: int, budget_update: BudgetUpdate) -> Optional[Budget]:
     """更新预算"""
@@ -79,7 +84,14 @@ def update_budget(db: Session, budget_id: int, budget_update: BudgetUpdate) -> O
     for field, value in update_data.items():
         setattr(db_budget, field, value)
     
+    # 分类、时间范围或状态变化后，增量维护的支出不再适用，需重新计算
+    if BUDGET_SCOPE_FIELDS & update_data.keys():
+        db_budget.spent = _budget_spent_total(db, db_budget)
+    # 金额或阈值阶梯变化后可能越过新的阈值
+    check_and_create_alerts(db, db_budget)
+    
     db_budget.updated_at = datetime.utcnow()
+    bump_budget_version(db, db_budget.ledger_id)
     db.commit()
     db.refresh(db_budget)
     return db_budget
@@ -91,134 +103,436 @@ def delete_budget(db: Session, budget_id: int) -> bool:
         return False
     
     db.delete(db_budget)
+    bump_budget_version(db, db_budget.ledger_id)
     db.commit()
     return True
 
-def update_budget_spent(db: Session, ledger_id: int, amount: float, bill_type: BillType, billDate: datetime):
-    """更新预算支出金额"""
-    if bill_type != BillType.EXPENSE:
+# 账本ID -> {账单分类: {账单时间: 支出增量}}
+BudgetDeltas = Dict[int, Dict[Optional[str], Dict[datetime, float]]]
+
+def accumulate_budget_delta(
+    changes: BudgetDeltas,
+    ledger_id: int,
+    bill_date: Optional[datetime],
+    bill_type: BillType,
+    category: Optional[str],
+    amount: float
+):
+    """累加一笔账单对预算支出的影响（移出时传入负金额），非支出账单不影响预算"""
+    if bill_type != BillType.EXPENSE or bill_date is None or not amount:
         return
+    date_deltas = changes.setdefault(ledger_id, {}).setdefault(category, {})
+    date_deltas[bill_date] = date_deltas.get(bill_date, 0.0) + amount
+
+class _DateSeries:
+    """按时间排序的增量序列，支持区间求和"""
+
+    def __init__(self, date_deltas: Dict[datetime, float]):
+        self.dates = sorted(date_deltas)
+        self.prefix = [0.0] + list(accumulate(date_deltas[d] for d in self.dates))
+
+    def total(self, start: datetime, end: datetime) -> float:
+        return self.prefix[bisect_right(self.dates, end)] - self.prefix[bisect_left(self.dates, start)]
+
+def apply_budget_deltas(db: Session, changes: BudgetDeltas) -> List[Budget]:
+    """将支出增量应用到覆盖对应日期的活跃预算（不提交，由调用方在同一事务中提交）
+
+    候选预算（分类匹配或分类为空）来自进程内区间索引，按日期前缀和算出每个预算的增量，
+    再用一条 executemany 的 UPDATE budgets SET spent = spent + :delta 在数据库端原子累加，
+    不回扫账单表。返回已更新（并已检查提醒）的预算。
+    """
+    indexes = get_budget_indexes(db, [ledger_id for ledger_id, category_deltas in changes.items() if category_deltas])
+    rows = []
+    for ledger_id, category_deltas in changes.items():
+        index = indexes.get(ledger_id)
+        if not category_deltas or not index:
+            continue
+        by_category = {category: _DateSeries(date_deltas) for category, date_deltas in category_deltas.items()}
+        # 分类为空的预算覆盖账本内全部支出
+        merged = {}
+        for date_deltas in category_deltas.values():
+            for bill_date, amount in date_deltas.items():
+                merged[bill_date] = merged.get(bill_date, 0.0) + amount
+        whole_ledger = _DateSeries(merged)
+        
+        candidates = index.overlapping(whole_ledger.dates[0], whole_ledger.dates[-1], category_deltas.keys())
+        for budget_id, category, start_date, end_date in candidates:
+            series = whole_ledger if category is None else by_category[category]
+            delta = series.total(start_date, end_date)
+            if delta:
+                rows.append({"budget_id": budget_id, "delta": delta})
     
-    active_budgets = get_active_budgets_by_category(db, ledger_id, billDate)
+    if not rows:
+        return []
     
-    for budget in active_budgets:
-        budget.spent += amount
-        
-        # 检查是否需要创建提醒
-        check_and_create_alerts(db, budget)
+    db.execute(
+        update(Budget.__table__)
+        .where(Budget.__table__.c.id == bindparam("budget_id"))
+        .values(spent=func.coalesce(Budget.__table__.c.spent, 0.0) + bindparam("delta")),
+        rows
+    )
     
+    # 读回更新后的支出用于提醒检查
+    budgets = db.query(Budget).filter(Budget.id.in_([row["budget_id"] for row in rows])).populate_existing().all()
+    check_and_create_alerts(db, *budgets)
+    bump_ledger_version(db, *{budget.ledger_id for budget in budgets})
+    return budgets
+
+def update_budget_spent(db: Session, ledger_id: int, amount: float, bill_type: BillType, billDate: datetime, category: Optional[str] = None):
+    """更新预算支出金额（数据库端原子累加）"""
+    changes = {}
+    accumulate_budget_delta(changes, ledger_id, billDate, bill_type, category, amount)
+    apply_budget_deltas(db, changes)
     db.commit()
 
+def _budget_bill_conditions(budget: Budget) -> list:
+    """单个预算统计范围内支出账单的过滤条件"""
+    conditions = [
+        Bill.ledger_id == budget.ledger_id,
+        Bill.type == BillType.EXPENSE,
+        Bill.date >= budget.start_date,
+        Bill.date <= budget.end_date
+    ]
+    if budget.category is not None:
+        conditions.append(Bill.category == budget.category)
+    return conditions
+
+def _budget_spent_total(db: Session, budget: Budget) -> float:
+    """计算预算时间范围内匹配分类的支出总额"""
+    return db.query(func.sum(Bill.amount)).filter(*_budget_bill_conditions(budget)).scalar() or 0.0
+
 def recalculate_budget_spent(db: Session, budget_id: int):
     """重新计算预算支出金额"""
     budget = get_budget(db, budget_id)
     if not budget:
         return
     
-    # 计算该预算时间范围内的支出总额
-    total_spent = db.query(func.sum(Bill.amount)).filter(
-        and_(
-            Bill.ledger_id == budget.ledger_id,
-            Bill.type == BillType.EXPENSE,
-            Bill.date >= budget.start_date,
-            Bill.date <= budget.end_date
-        )
-    ).scalar() or 0.0
-    
-    budget.spent = total_spent
+    budget.spent = _budget_spent_total(db, budget)
+    bump_ledger_version(db, budget.ledger_id)
     db.commit()
 
-def get_budget_stats(db: Session, ledger_id: int) -> BudgetStats:
-    """获取预算统计信息"""
-    current_date = datetime.utcnow()
+def reconcile_budgets(db: Session, fix: bool = True, tolerance: float = 0.005) -> BudgetReconcileResult:
+    """核对所有活跃预算的支出，返回偏差报告，fix 为真时批量修正
+
+    用一条 LEFT JOIN + GROUP BY 同时取出记录值与账单实际合计，只返回偏差超过容差的预算；
+    修正时按偏差量原子累加（spent = spent + 偏差），查询之后并发写入的增量不会被覆盖。
+    """
+    checked = db.query(func.count(Budget.id)).filter(Budget.status == BudgetStatus.ACTIVE).scalar()
     
-    # 总预算数
-    total_budgets = db.query(Budget).filter(Budget.ledger_id == ledger_id).count()
+    recorded = func.coalesce(Budget.spent, 0.0)
+    actual = func.coalesce(func.sum(Bill.amount), 0.0)
+    drifted = db.query(
+        Budget.id, Budget.ledger_id, Budget.name, recorded, actual
+    ).outerjoin(
+        Bill, _budget_expense_condition()
+    ).filter(
+        Budget.status == BudgetStatus.ACTIVE
+    ).group_by(
+        Budget.id, Budget.ledger_id, Budget.name, Budget.spent
+    ).having(
+        func.abs(recorded - actual) > tolerance
+    ).order_by(Budget.id).all()
     
-    # 活跃预算数
-    active_budgets = db.query(Budget).filter(
-        and_(
-            Budget.ledger_id == ledger_id,
-            Budget.status == BudgetStatus.ACTIVE,
-            Budget.start_date <= current_date,
-            Budget.end_date >= current_date
+    drifts = [
+        BudgetDrift(
+            budget_id=budget_id,
+            ledger_id=ledger_id,
+            name=name,
+            recorded_spent=recorded_spent,
+            actual_spent=actual_spent,
+            drift=round(actual_spent - recorded_spent, 2)
         )
-    ).count()
+        for budget_id, ledger_id, name, recorded_spent, actual_spent in drifted
+    ]
     
-    # 总预算金额和支出
-    budget_totals = db.query(
-        func.sum(Budget.amount).label('total_amount'),
-        func.sum(Budget.spent).label('total_spent')
-    ).filter(
-        and_(
-            Budget.ledger_id == ledger_id,
-            Budget.status == BudgetStatus.ACTIVE
+    if fix and drifts:
+        table = Budget.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("budget_id"))
+            .values(spent=func.coalesce(table.c.spent, 0.0) + bindparam("delta")),
+            [{"budget_id": row.budget_id, "delta": row.actual_spent - row.recorded_spent} for row in drifts]
+        )
+        budgets = db.query(Budget).filter(Budget.id.in_([row.budget_id for row in drifts])).populate_existing().all()
+        check_and_create_alerts(db, *budgets)
+        bump_ledger_version(db, *{row.ledger_id for row in drifts})
+        db.commit()
+    
+    return BudgetReconcileResult(checked=checked, drifted=len(drifts), fixed=fix, drifts=drifts)
+
+def _budget_expense_condition():
+    """预算与其统计范围内支出账单的关联条件（分类为空的预算匹配所有分类）"""
+    return and_(
+        Bill.ledger_id == Budget.ledger_id,
+        Bill.type == BillType.EXPENSE,
+        Bill.date >= Budget.start_date,
+        Bill.date <= Budget.end_date,
+        or_(Budget.category.is_(None), Bill.category == Budget.category)
+    )
+
+# 周期预算每期的月数
+PERIOD_MONTHS = {
+    BudgetPeriodType.MONTHLY: 1,
+    BudgetPeriodType.QUARTERLY: 3,
+    BudgetPeriodType.YEARLY: 12
+}
+
+def _add_months(moment: datetime, months: int) -> datetime:
+    """按月偏移时间，目标月份没有对应日期时取该月最后一天"""
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, monthrange(year, month)[1]))
+
+def _next_period(start_date: datetime, end_date: datetime, months: int, now: datetime):
+    """计算包含当前时间的下一期起止时间，错过的周期直接跳过"""
+    # 沿用原预算结束时间与下期开始之间的间隔（通常为 1 秒或 1 天）
+    gap = max(_add_months(start_date, months) - end_date, timedelta(0))
+    periods = 1
+    while _add_months(start_date, (periods + 1) * months) <= now:
+        periods += 1
+    return (
+        _add_months(start_date, periods * months),
+        _add_months(start_date, (periods + 1) * months) - gap
+    )
+
+def rollover_budgets(db: Session, now: Optional[datetime] = None) -> int:
+    """将已结束的周期预算置为过期并批量创建下一期预算，返回新建数量
+
+    用 UPDATE ... RETURNING 认领已结束的活跃预算，同一预算只会被一次运行处理，
+    因此可以在每个周期边界（或更频繁地）重复执行。新预算的期初支出用一条分组查询统计。
+    """
+    now = now or datetime.utcnow()
+    table = Budget.__table__
+    expired = db.execute(
+        update(table)
+        .where(
+            table.c.status == BudgetStatus.ACTIVE,
+            table.c.period_type.in_(list(PERIOD_MONTHS)),
+            table.c.end_date < now
         )
-    ).first()
-    
-    total_amount = budget_totals.total_amount or 0.0
-    total_spent = budget_totals.total_spent or 0.0
-    total_remaining = max(total_amount - total_spent, 0.0)
-    
-    # 超支和预警预算数
-    active_budget_list = db.query(Budget).filter(
-        and_(
-            Budget.ledger_id == ledger_id,
-            Budget.status == BudgetStatus.ACTIVE,
-            Budget.start_date <= current_date,
-            Budget.end_date >= current_date
+        .values(status=BudgetStatus.EXPIRED, updated_at=now)
+        .returning(
+            table.c.id, table.c.name, table.c.amount, table.c.category, table.c.period_type,
+            table.c.start_date, table.c.end_date, table.c.alert_threshold, table.c.alert_thresholds,
+            table.c.ledger_id, table.c.created_by
         )
     ).all()
+    if not expired:
+        db.commit()
+        return 0
+    
+    new_budgets = []
+    for row in expired:
+        start_date, end_date = _next_period(row.start_date, row.end_date, PERIOD_MONTHS[row.period_type], now)
+        new_budgets.append(Budget(
+            name=row.name,
+            amount=row.amount,
+            spent=0.0,
+            category=row.category,
+            period_type=row.period_type,
+            start_date=start_date,
+            end_date=end_date,
+            status=BudgetStatus.ACTIVE,
+            alert_threshold=row.alert_threshold,
+            alert_thresholds=row.alert_thresholds,
+            ledger_id=row.ledger_id,
+            created_by=row.created_by
+        ))
+    db.add_all(new_budgets)
+    db.flush()
+    budgets_by_id = {budget.id: budget for budget in new_budgets}
+    
+    # 期初支出：所有新预算一次性按预算分组汇总匹配的账单
+    opening = db.query(Budget.id, func.sum(Bill.amount)).join(Bill, _budget_expense_condition()).filter(
+        Budget.id.in_(budgets_by_id)
+    ).group_by(Budget.id).all()
+    # 只有期初支出非零的预算会在提交时被批量 UPDATE
+    for budget_id, spent in opening:
+        if spent:
+            budgets_by_id[budget_id].spent = spent
+    
+    check_and_create_alerts(db, *new_budgets)
+    bump_budget_version(db, *{budget.ledger_id for budget in new_budgets})
+    db.commit()
+    return len(new_budgets)
+
+def get_budget_daily_expenses(db: Session, budgets: List[Budget]) -> List[tuple]:
+    """按预算和日期聚合预算周期内匹配分类的支出，返回 [(预算ID, 日期, 支出合计)]"""
+    if not budgets:
+        return []
+    day = func.date(Bill.date, type_=Date)
+    return db.query(Budget.id, day, func.sum(Bill.amount)).join(Bill, _budget_expense_condition()).filter(
+        Budget.id.in_([budget.id for budget in budgets])
+    ).group_by(Budget.id, day).all()
+
+# 支出曲线的时间粒度 -> 每格天数
+CURVE_GRANULARITIES = {"day": 1, "week": 7}
+
+def get_budget_spend_curve(
+    db: Session,
+    budget: Budget,
+    granularity: str = "day",
+    now: Optional[datetime] = None
+) -> BudgetSpendCurve:
+    """预算周期内的累计支出曲线
+
+    先按天（或周）聚合账单，再用 SUM() OVER (ORDER BY 时间) 在数据库端累加；
+    没有支出的时间格沿用上一格的累计值，曲线截止到今天（已记入未来日期的账单会延长曲线）。
+    """
+    now = now or datetime.utcnow()
+    step = CURVE_GRANULARITIES[granularity]
+    if granularity == "week":
+        bucket = week_start(db, Bill.date)
+        first = budget.start_date.date() - timedelta(days=budget.start_date.weekday())
+    else:
+        bucket = func.date(Bill.date, type_=Date)
+        first = budget.start_date.date()
+    
+    totals = db.query(
+        bucket.label("bucket"), func.sum(Bill.amount).label("total")
+    ).filter(*_budget_bill_conditions(budget)).group_by(bucket).subquery()
+    cumulative_by_bucket = dict(
+        db.query(totals.c.bucket, func.sum(totals.c.total).over(order_by=totals.c.bucket))
+        .order_by(totals.c.bucket)
+        .all()
+    )
+    
+    last = min(budget.end_date.date(), max([now.date(), *cumulative_by_bucket]))
+    labels = []
+    cumulative = []
+    running = 0.0
+    day = first
+    while day <= last:
+        running = cumulative_by_bucket.get(day, running)
+        labels.append(day)
+        cumulative.append(round(running, 2))
+        day += timedelta(days=step)
+    
+    return BudgetSpendCurve(
+        budget_id=budget.id,
+        granularity=granularity,
+        amount=budget.amount,
+        labels=labels,
+        cumulative=cumulative
+    )
+
+def get_budget_stats(db: Session, ledger_id: int) -> BudgetStats:
+    """获取预算统计信息，用一条条件聚合查询完成"""
+    current_date = datetime.utcnow()
+    
+    is_active = Budget.status == BudgetStatus.ACTIVE
+    # 当前处于周期内的活跃预算
+    in_period = and_(is_active, Budget.start_date <= current_date, Budget.end_date >= current_date)
+    spent = func.coalesce(Budget.spent, 0.0)
+    is_exceeded = spent > Budget.amount
+    # 与 Budget.is_warning 一致：进度达到预警阈值但未超支
+    is_warning = and_(
+        Budget.amount > 0,
+        spent >= Budget.alert_threshold * Budget.amount,
+        spent <= Budget.amount
+    )
     
-    exceeded_count = sum(1 for b in active_budget_list if b.is_exceeded)
-    warning_count = sum(1 for b in active_budget_list if b.is_warning and not b.is_exceeded)
+    row = db.query(
+        func.count(Budget.id).label('total_budgets'),
+        func.count(Budget.id).filter(in_period).label('active_budgets'),
+        func.sum(Budget.amount).filter(is_active).label('total_amount'),
+        func.sum(spent).filter(is_active).label('total_spent'),
+        func.count(Budget.id).filter(and_(in_period, is_exceeded)).label('exceeded_count'),
+        func.count(Budget.id).filter(and_(in_period, is_warning)).label('warning_count')
+    ).filter(Budget.ledger_id == ledger_id).one()
+    
+    total_amount = row.total_amount or 0.0
+    total_spent = row.total_spent or 0.0
     
     return BudgetStats(
-        total_budgets=total_budgets,
+        total_budgets=row.total_budgets,
+        active_budgets=row.active_budgets,
+        total_amount=total_amount,
+        total_spent=total_spent,
+        total_remaining=max(total_amount - total_spent, 0.0),
+        exceeded_count=row.exceeded_count,
+        warning_count=row.warning_count
+    )
+
+def get_budget_summary_data(db: Session, ledger_id: int) -> Tuple[List[Budget], BudgetStats]:
+    """一次查询取出账本全部活跃预算并计算统计信息，返回 (活跃预算列表, 统计)
+
+    预算总数（含非活跃）以子查询带出，其余统计口径与 get_budget_stats 一致，在已取出的活跃预算上计算。
+    """
+    current_date = datetime.utcnow()
+    totals = db.query(func.count(Budget.id).label("total")).filter(Budget.ledger_id == ledger_id).subquery()
+    # 以计数子查询为左表外连接活跃预算，没有活跃预算时仍返回一行计数
+    rows = db.query(totals.c.total, Budget).select_from(totals).outerjoin(Budget, and_(
+        Budget.ledger_id == ledger_id,
+        Budget.status == BudgetStatus.ACTIVE
+    )).all()
+    
+    budgets = [budget for _, budget in rows if budget is not None]
+    active_budgets = exceeded_count = warning_count = 0
+    total_amount = total_spent = 0.0
+    for budget in budgets:
+        spent = budget.spent or 0.0
+        total_amount += budget.amount
+        total_spent += spent
+        if not (budget.start_date <= current_date <= budget.end_date):
+            continue
+        active_budgets += 1
+        if spent > budget.amount:
+            exceeded_count += 1
+        elif budget.amount > 0 and budget.alert_threshold is not None and spent >= budget.alert_threshold * budget.amount:
+            warning_count += 1
+    
+    stats = BudgetStats(
+        total_budgets=rows[0].total if rows else 0,
         active_budgets=active_budgets,
         total_amount=total_amount,
         total_spent=total_spent,
-        total_remaining=total_remaining,
+        total_remaining=max(total_amount - total_spent, 0.0),
         exceeded_count=exceeded_count,
         warning_count=warning_count
     )
+    return budgets, stats
 
 # 预算提醒相关操作
-def check_and_create_alerts(db: Session, budget: Budget):
-    """检查并创建预算提醒"""
-    current_progress = budget.progress
-    
-    # 检查是否需要创建预警提醒
-    if current_progress >= budget.alert_threshold and current_progress < 0.95:
-        create_alert_if_not_exists(db, budget, AlertType.WARNING, budget.alert_threshold)
-    
-    # 检查是否需要创建严重提醒
-    if current_progress >= 0.95 and current_progress < 1.0:
-        create_alert_if_not_exists(db, budget, AlertType.CRITICAL, 0.95)
-    
-    # 检查是否需要创建超支提醒
-    if current_progress >= 1.0:
-        create_alert_if_not_exists(db, budget, AlertType.EXCEEDED, 1.0)
-
-def create_alert_if_not_exists(db: Session, budget: Budget, alert_type: AlertType, threshold: float):
-    """如果不存在则创建提醒"""
-    existing_alert = db.query(BudgetAlert).filter(
-        and_(
-            BudgetAlert.budget_id == budget.id,
-            BudgetAlert.alert_type == alert_type,
-            BudgetAlert.threshold == threshold
-        )
-    ).first()
-    
-    if not existing_alert:
-        alert_message = generate_alert_message(budget, alert_type)
-        db_alert = BudgetAlert(
-            budget_id=budget.id,
-            alert_type=alert_type,
-            threshold=threshold,
-            message=alert_message
-        )
-        db.add(db_alert)
+def alert_type_for_threshold(threshold: float) -> AlertType:
+    """按阈值高低确定提醒类型"""
+    if threshold >= 1.0:
+        return AlertType.EXCEEDED
+    if threshold >= 0.95:
+        return AlertType.CRITICAL
+    return AlertType.WARNING
+
+def check_and_create_alerts(db: Session, *budgets: Budget):
+    """检查并创建预算提醒（不提交）
+
+    每个预算取已越过的最高一级阈值，所有预算的提醒用一条
+    INSERT ... ON CONFLICT DO NOTHING 写入，重复提醒由唯一约束在数据库端丢弃。
+    """
+    rows = []
+    for budget in budgets:
+        if not budget.amount or budget.amount <= 0:
+            continue
+        ratio = (budget.spent or 0.0) / budget.amount
+        crossed = [threshold for threshold in budget.alert_ladder if ratio >= threshold]
+        if not crossed:
+            continue
+        alert_type = alert_type_for_threshold(crossed[-1])
+        rows.append({
+            "budget_id": budget.id,
+            "alert_type": alert_type,
+            "threshold": crossed[-1],
+            "message": generate_alert_message(budget, alert_type),
+            "is_sent": False,
+            "created_at": datetime.utcnow()
+        })
+    if not rows:
+        return
+    
+    table = BudgetAlert.__table__
+    stmt = dialect_insert(db, table).values(rows).on_conflict_do_nothing(
+        index_elements=[table.c.budget_id, table.c.alert_type, table.c.threshold]
+    )
+    db.execute(stmt)
 
 def generate_alert_message(budget: Budget, alert_type: AlertType) -> str:
     """生成提醒消息"""
@@ -247,5 +561,6 @@ def mark_alert_as_sent(db: Session, alert_id: int) -> bool:
     
     alert.is_sent = True
     alert.sent_at = datetime.utcnow()
+    bump_ledger_version(db, alert.budget.ledger_id)
     db.commit()
     return True 
\ No newline at end of file
@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Budget, Ledger
+from app.models.enums import BudgetStatus
+
+# (预算ID, 分类, 开始时间, 结束时间)
+BudgetInterval = Tuple[int, Optional[str], datetime, datetime]
+
+# 每个进程最多缓存的账本索引数
+INDEX_CACHE_SIZE = 1024
+
+class BudgetIntervalIndex:
+    """单个账本活跃预算的区间索引（构建后只读，可在线程间共享）
+
+    所有预算的起止时间构成有序边界 b0 < b1 < ... < bk-1，把时间轴切成 2k+1 个槽：
+    偶数槽 2i 是开区间 (b[i-1], b[i])，奇数槽 2i+1 是边界点 b[i]。
+    每个槽预先记录覆盖它的预算，查询时二分定位槽位，O(log n) 得到覆盖某一时间的预算。
+    """
+
+    def __init__(self, intervals: Iterable[BudgetInterval]):
+        self.intervals: Dict[int, BudgetInterval] = {row[0]: tuple(row) for row in intervals}
+        self.bounds = sorted({moment for _, _, start, end in self.intervals.values() for moment in (start, end)})
+        slots = [[] for _ in range(2 * len(self.bounds) + 1)]
+        for budget_id, _, start, end in self.intervals.values():
+            for slot in range(self._slot(start), self._slot(end) + 1):
+                slots[slot].append(budget_id)
+        self.slots = [tuple(budget_ids) for budget_ids in slots]
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def _slot(self, moment: datetime) -> int:
+        i = bisect_left(self.bounds, moment)
+        if i < len(self.bounds) and self.bounds[i] == moment:
+            return 2 * i + 1
+        return 2 * i
+
+    @staticmethod
+    def _matches(budget_category: Optional[str], categories) -> bool:
+        # 分类为空的预算覆盖整个账本，否则只匹配同分类账单
+        return budget_category is None or budget_category in categories
+
+    def covering(self, moment: datetime, category: Optional[str] = None) -> List[int]:
+        """返回覆盖该时间且匹配分类的预算ID"""
+        return [
+            budget_id for budget_id in self.slots[self._slot(moment)]
+            if self._matches(self.intervals[budget_id][1], (category,))
+        ]
+
+    def overlapping(self, start: datetime, end: datetime, categories: Iterable[Optional[str]]) -> List[BudgetInterval]:
+        """返回与 [start, end] 相交且匹配任一分类的预算"""
+        if not self.intervals:
+            return []
+        categories = set(categories)
+        budget_ids = set()
+        for slot in range(self._slot(start), self._slot(end) + 1):
+            budget_ids.update(self.slots[slot])
+        return [
+            self.intervals[budget_id] for budget_id in sorted(budget_ids)
+            if self._matches(self.intervals[budget_id][1], categories)
+        ]
+
+_index_cache: "OrderedDict[int, Tuple[int, BudgetIntervalIndex]]" = OrderedDict()
+_index_lock = threading.Lock()
+
+def get_budget_indexes(db: Session, ledger_ids: Iterable[int]) -> Dict[int, BudgetIntervalIndex]:
+    """获取多个账本的活跃预算索引
+
+    索引缓存在进程内，以账本的 budget_version 作为有效性标记：每次只用一条主键查询读取版本号，
+    版本一致直接复用；预算增删改会递增版本号，因此其它 uvicorn worker 中的旧索引也会在下次读取时重建。
+    """
+    ids = sorted({ledger_id for ledger_id in ledger_ids if ledger_id is not None})
+    if not ids:
+        return {}
+    versions = dict(db.query(Ledger.id, Ledger.budget_version).filter(Ledger.id.in_(ids)).all())
+
+    indexes = {}
+    stale = []
+    with _index_lock:
+        for ledger_id, version in versions.items():
+            cached = _index_cache.get(ledger_id)
+            if cached and cached[0] == version:
+                _index_cache.move_to_end(ledger_id)
+                indexes[ledger_id] = cached[1]
+            else:
+                stale.append(ledger_id)
+    if not stale:
+        return indexes
+
+    rows = {ledger_id: [] for ledger_id in stale}
+    for ledger_id, *interval in db.query(
+        Budget.ledger_id, Budget.id, Budget.category, Budget.start_date, Budget.end_date
+    ).filter(
+        Budget.ledger_id.in_(stale),
+        Budget.status == BudgetStatus.ACTIVE
+    ):
+        rows[ledger_id].append(interval)
+
+    with _index_lock:
+        for ledger_id in stale:
+            index = BudgetIntervalIndex(rows[ledger_id])
+            _index_cache[ledger_id] = (versions[ledger_id], index)
+            _index_cache.move_to_end(ledger_id)
+            indexes[ledger_id] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return indexes
+
+def get_budget_index(db: Session, ledger_id: int) -> Optional[BudgetIntervalIndex]:
+    """获取单个账本的活跃预算索引，账本不存在时返回 None"""
+    return get_budget_indexes(db, [ledger_id]).get(ledger_id)
+
+def clear_budget_indexes():
+    """清空进程内的预算索引缓存"""
+    with _index_lock:
+        _index_cache.clear()
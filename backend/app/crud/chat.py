@@ -1,7 +1,9 @@
-from sqlalchemy.orm import Session
-from typing import Optional, List
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Optional, List, Tuple
 from app.models import ChatMessage, MessageBill, Bill
 from app.schemas.chat import ChatMessageCreate
+from app.utils.pagination import encode_cursor, decode_cursor
 
 def create_chat_message(db: Session, message: ChatMessageCreate, user_id: int):
     """创建聊天消息"""
@@ -84,30 +86,55 @@ def get_recent_chat_messages(db: Session, ledger_id: int, user_id: int, skip: in
         ChatMessage.user_id == user_id, 
     ).order_by(ChatMessage.timestamp.desc()).offset(skip).limit(limit).all()
 
+def get_chat_history_page(
+    db: Session,
+    ledger_id: int,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    skip: int = 0
+) -> Tuple[List[ChatMessage], Optional[str]]:
+    """按 (timestamp, id) 游标分页获取聊天历史（从新到旧），返回 (消息列表, 下一页游标)
+
+    关联账单随消息一并预加载：消息一条查询，关联与账单再一条查询，不随消息数增长。
+    未提供游标时兼容按 skip 偏移读取。
+    """
+    query = db.query(ChatMessage).options(
+        selectinload(ChatMessage.message_bills).joinedload(MessageBill.bill)
+    ).filter(
+        ChatMessage.ledger_id == ledger_id,
+        ChatMessage.user_id == user_id
+    )
+
+    # 从上一页最后一条消息之后继续读取，避免 OFFSET 扫描
+    position = decode_cursor(cursor)
+    if position:
+        last_timestamp, last_id = position
+        query = query.filter(or_(
+            ChatMessage.timestamp < last_timestamp,
+            and_(ChatMessage.timestamp == last_timestamp, ChatMessage.id < last_id)
+        ))
+    elif skip:
+        query = query.offset(skip)
+
+    # 多取一条用于判断是否还有下一页
+    messages = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+
+    return messages, next_cursor
+
 def get_message_bills(db: Session, message_id: int):
     """获取消息关联的所有账单"""
-    message_bills = db.query(MessageBill).filter(
+    return db.query(Bill).join(MessageBill, MessageBill.bill_id == Bill.id).filter(
         MessageBill.message_id == message_id
-    ).all()
-
-    bills = []
-    for mb in message_bills:
-        bill = db.query(Bill).filter(Bill.id == mb.bill_id).first()
-        if bill:
-            bills.append(bill)
-
-    return bills
+    ).order_by(MessageBill.id).all()
 
 def get_bill_messages(db: Session, bill_id: int):
     """获取账单关联的所有消息"""
-    message_bills = db.query(MessageBill).filter(
+    return db.query(ChatMessage).join(MessageBill, MessageBill.message_id == ChatMessage.id).filter(
         MessageBill.bill_id == bill_id
-    ).all()
-
-    messages = []
-    for mb in message_bills:
-        message = db.query(ChatMessage).filter(ChatMessage.id == mb.message_id).first()
-        if message:
-            messages.append(message)
-
-    return messages
\ No newline at end of file
+    ).order_by(MessageBill.id).all()
\ No newline at end of file
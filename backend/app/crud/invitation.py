@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from app.models import Invitation, UserLedger, InvitationStatus, UserRole
 from app.schemas.invitation import InvitationCreate
 from app.core.config.settings import settings
+from app.crud.ledger import bump_ledger_version
 
 def create_invitation(db: Session, invitation: InvitationCreate, inviter_id: int):
     """创建邀请"""
@@ -18,6 +19,7 @@ def create_invitation(db: Session, invitation: InvitationCreate, inviter_id: int
         expires_at=expires_at
     )
     db.add(db_invitation)
+    bump_ledger_version(db, invitation.ledger_id)
     db.commit()
     db.refresh(db_invitation)
     return db_invitation
@@ -47,6 +49,7 @@ def accept_invitation(db: Session, invitation_id: int, user_id: int):
     # 检查邀请是否过期
     if invitation.expires_at < datetime.utcnow():
         invitation.status = InvitationStatus.EXPIRED
+        bump_ledger_version(db, invitation.ledger_id)
         db.commit()
         return False
     
@@ -72,6 +75,7 @@ def accept_invitation(db: Session, invitation_id: int, user_id: int):
     # 更新邀请状态
     invitation.status = InvitationStatus.ACCEPTED
     invitation.accepted_at = datetime.utcnow()
+    bump_ledger_version(db, invitation.ledger_id)
     db.commit()
     return True
 
@@ -80,6 +84,7 @@ def reject_invitation(db: Session, invitation_id: int):
     invitation = db.query(Invitation).filter(Invitation.id == invitation_id).first()
     if invitation:
         invitation.status = InvitationStatus.REJECTED
+        bump_ledger_version(db, invitation.ledger_id)
         db.commit()
         return True
     return False
@@ -93,6 +98,7 @@ def cancel_invitation(db: Session, invitation_id: int, inviter_id: int):
     ).first()
     if invitation:
         db.delete(invitation)
+        bump_ledger_version(db, invitation.ledger_id)
         db.commit()
         return True
     return False
@@ -107,5 +113,6 @@ def expire_invitations(db: Session):
     for invitation in expired_invitations:
         invitation.status = InvitationStatus.EXPIRED
     
+    bump_ledger_version(db, *{invitation.ledger_id for invitation in expired_invitations})
     db.commit()
     return len(expired_invitations) 
\ No newline at end of file
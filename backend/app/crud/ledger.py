@@ -5,6 +5,35 @@ from app.models import Ledger, UserLedger, UserRole, LedgerStatus
 from app.schemas.ledger import LedgerCreate
 from app.core.config.settings import settings
 
+def bump_ledger_version(db: Session, *ledger_ids: int):
+    """递增账本数据版本号（不提交，由调用方在同一事务中提交）"""
+    ids = {ledger_id for ledger_id in ledger_ids if ledger_id is not None}
+    if ids:
+        db.query(Ledger).filter(Ledger.id.in_(ids)).update(
+            {Ledger.version: Ledger.version + 1}, synchronize_session=False
+        )
+
+def bump_budget_version(db: Session, *ledger_ids: int):
+    """递增账本的预算版本号及数据版本号（不提交），各进程据此失效本地预算索引"""
+    ids = {ledger_id for ledger_id in ledger_ids if ledger_id is not None}
+    if ids:
+        db.query(Ledger).filter(Ledger.id.in_(ids)).update(
+            {Ledger.version: Ledger.version + 1, Ledger.budget_version: Ledger.budget_version + 1},
+            synchronize_session=False
+        )
+
+def get_ledger_version(db: Session, ledger_id: int) -> Optional[int]:
+    """获取账本数据版本号，只读 ledgers 表"""
+    return db.query(Ledger.version).filter(Ledger.id == ledger_id).scalar()
+
+def get_user_ledger_versions(db: Session, user_id: int) -> List[tuple]:
+    """获取用户所有活跃账本的 (账本ID, 版本号)，用于账本列表的 ETag"""
+    return db.query(Ledger.id, Ledger.version).join(UserLedger, UserLedger.ledger_id == Ledger.id).filter(
+        UserLedger.user_id == user_id,
+        UserLedger.status == "active",
+        Ledger.status == LedgerStatus.ACTIVE
+    ).order_by(Ledger.id).all()
+
 def create_ledger(db: Session, ledger: LedgerCreate, owner_id: int):
     """创建账本"""
     db_ledger = Ledger(**ledger.model_dump())
@@ -71,6 +100,7 @@ def remove_ledger_member(db: Session, ledger_id: int, user_id: int):
     if user_ledger:
         # 设置状态为 inactive 而不是删除记录
         user_ledger.status = "inactive"
+        bump_ledger_version(db, ledger_id)
         db.commit()
         return True
     return False
@@ -122,6 +152,7 @@ def transfer_ledger_ownership(db: Session, ledger_id: int, new_owner_id: int):
         )
         db.add(new_admin)
     
+    bump_ledger_version(db, ledger_id)
     db.commit()
     return True
 
@@ -133,6 +164,7 @@ def delete_ledger(db: Session, ledger_id: int):
         ledger.deleted_at = datetime.utcnow()
 
         db.query(UserLedger).filter(UserLedger.ledger_id == ledger_id, UserLedger.status == "active").update({"status": "inactive"})
+        bump_ledger_version(db, ledger_id)
         db.commit()
         return True
     return False
@@ -143,6 +175,7 @@ def restore_ledger(db: Session, ledger_id: int):
     if ledger and ledger.status == LedgerStatus.DELETED:
         ledger.status = LedgerStatus.ACTIVE
         ledger.deleted_at = None
+        bump_ledger_version(db, ledger_id)
         db.commit()
         return True
     return False
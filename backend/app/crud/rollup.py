@@ -0,0 +1,96 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, delete, insert
+from typing import Dict, Tuple, Optional
+from datetime import datetime, date
+
+from app.models import Bill, BillDailyRollup
+from app.models.enums import BillType
+from app.db.dialect import dialect_insert
+
+# 汇总键 (ledger_id, day, type, category) -> (金额增量, 笔数增量)
+RollupDeltas = Dict[Tuple[int, date, BillType, str], Tuple[float, int]]
+
+def accumulate_rollup_delta(
+    deltas: RollupDeltas,
+    ledger_id: int,
+    bill_date: datetime,
+    bill_type: BillType,
+    category: Optional[str],
+    amount: float,
+    count: int
+):
+    """累加一笔账单对按日汇总的影响（移出时传入负的金额与笔数）"""
+    if bill_date is None:
+        return
+    key = (ledger_id, bill_date.date(), bill_type, category or "")
+    total_amount, bill_count = deltas.get(key, (0.0, 0))
+    deltas[key] = (total_amount + amount, bill_count + count)
+
+def apply_rollup_deltas(db: Session, deltas: RollupDeltas):
+    """将增量写入汇总表（不提交，由调用方在同一事务中提交）"""
+    rows = [
+        {
+            "ledger_id": ledger_id,
+            "day": day,
+            "type": bill_type,
+            "category": category,
+            "total_amount": total_amount,
+            "bill_count": bill_count
+        }
+        for (ledger_id, day, bill_type, category), (total_amount, bill_count) in deltas.items()
+        if total_amount or bill_count
+    ]
+    if not rows:
+        return
+
+    table = BillDailyRollup.__table__
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.ledger_id, table.c.day, table.c.type, table.c.category],
+        set_={
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+            "bill_count": table.c.bill_count + stmt.excluded.bill_count
+        }
+    )
+    db.execute(stmt, rows)
+
+    # 清理笔数归零的汇总行
+    for row in rows:
+        if row["bill_count"] < 0:
+            db.execute(delete(table).where(
+                table.c.ledger_id == row["ledger_id"],
+                table.c.day == row["day"],
+                table.c.type == row["type"],
+                table.c.category == row["category"],
+                table.c.bill_count <= 0
+            ))
+
+def rebuild_bill_daily_rollups(db: Session, ledger_id: Optional[int] = None) -> int:
+    """根据账单表批量重建按日汇总，返回汇总行数"""
+    table = BillDailyRollup.__table__
+
+    clear = delete(table)
+    if ledger_id is not None:
+        clear = clear.where(table.c.ledger_id == ledger_id)
+    db.execute(clear)
+
+    day = func.date(Bill.date)
+    category = func.coalesce(Bill.category, "")
+    source = select(
+        Bill.ledger_id, day, Bill.type, category,
+        func.sum(Bill.amount), func.count(Bill.id)
+    ).where(Bill.date.isnot(None))
+    if ledger_id is not None:
+        source = source.where(Bill.ledger_id == ledger_id)
+    source = source.group_by(Bill.ledger_id, day, Bill.type, category)
+
+    db.execute(insert(table).from_select(
+        ["ledger_id", "day", "type", "category", "total_amount", "bill_count"],
+        source
+    ))
+    db.commit()
+
+    count_query = db.query(func.count()).select_from(BillDailyRollup)
+    if ledger_id is not None:
+        count_query = count_query.filter(BillDailyRollup.ledger_id == ledger_id)
+    return count_query.scalar()
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import Table, Date, case, cast, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+def dialect_insert(db: Session, table: Table):
+    """返回当前数据库方言的 INSERT 构造，以便使用 ON CONFLICT 子句"""
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"不支持的数据库类型: {dialect_name}")
+
+def resolve_timezone(name: str) -> ZoneInfo:
+    """解析时区名称，无法识别时回退为 UTC"""
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+def _utc_offset_segments(tz: ZoneInfo, start_utc: datetime, end_utc: datetime):
+    """按小时扫描区间内的 UTC 偏移变化（夏令时切换），返回 [(起始UTC时间, 偏移分钟数)]"""
+    def offset_at(moment: datetime) -> int:
+        return int(moment.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset().total_seconds() // 60)
+    
+    segments = [(start_utc, offset_at(start_utc))]
+    moment = start_utc.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    while moment < end_utc:
+        offset = offset_at(moment)
+        if offset != segments[-1][1]:
+            segments.append((moment, offset))
+        moment += timedelta(hours=1)
+    return segments
+
+def local_date(db: Session, column, tz_name: str, start_utc: datetime, end_utc: datetime):
+    """将按 UTC 存储的时间列转换为指定时区本地日期的 SQL 表达式
+
+    PostgreSQL 使用 timezone() 逐行换算；SQLite 没有时区支持，按 [start_utc, end_utc) 区间内的
+    UTC 偏移分段，用 date(col, '+N minutes') 换算，夏令时切换同样正确。
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return cast(func.timezone(tz_name, func.timezone("UTC", column)), Date)
+    if dialect_name == "sqlite":
+        segments = _utc_offset_segments(resolve_timezone(tz_name), start_utc, end_utc)
+        shifted = [func.date(column, f"{offset:+d} minutes") for _, offset in segments]
+        if len(shifted) == 1:
+            return shifted[0]
+        return case(
+            *((column < segments[i + 1][0], shifted[i]) for i in range(len(segments) - 1)),
+            else_=shifted[-1]
+        )
+    raise NotImplementedError(f"不支持的数据库类型: {dialect_name}")
+
+def week_start(db: Session, column):
+    """时间列所在周（周一开始）的日期表达式"""
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc("week", column), Date)
+    if dialect_name == "sqlite":
+        # 'weekday 0' 前进到本周日（当天是周日则不动），再回退 6 天即为周一
+        return func.date(column, "weekday 0", "-6 days", type_=Date)
+    raise NotImplementedError(f"不支持的数据库类型: {dialect_name}")
@@ -3,6 +3,7 @@ from .ledger import Ledger
 from .user_ledger import UserLedger
 from .invitation import Invitation
 from .bill import Bill
+from .bill_daily_rollup import BillDailyRollup
 from .chat_message import ChatMessage
 from .message_bill import MessageBill
 from .budget import Budget
@@ -10,6 +11,6 @@ from .budget_alert import BudgetAlert
 from .enums import BillType, UserRole, InvitationStatus, LedgerStatus, BudgetPeriodType, BudgetStatus, AlertType
 
 __all__ = [
-    "User", "Ledger", "UserLedger", "Invitation", "Bill", "ChatMessage", "MessageBill", "Budget", "BudgetAlert",
+    "User", "Ledger", "UserLedger", "Invitation", "Bill", "BillDailyRollup", "ChatMessage", "MessageBill", "Budget", "BudgetAlert",
     "BillType", "UserRole", "InvitationStatus", "LedgerStatus", "BudgetPeriodType", "BudgetStatus", "AlertType"
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship, mapped_column
 import datetime
 from app.db.database import Base
@@ -6,6 +6,12 @@ from app.models.enums import BillType
 
 class Bill(Base):
     __tablename__ = "bills"
+    __table_args__ = (
+        # 账本维度按时间读取（统计、预算重算）
+        Index("ix_bills_ledger_date", "ledger_id", "date", "id"),
+        # 用户在账本中的账单列表与游标分页
+        Index("ix_bills_ledger_owner_date", "ledger_id", "owner_id", "date", "id"),
+    )
     id = mapped_column(Integer, primary_key=True, index=True)
     amount = Column(Float, nullable=False)
     type = Column(Enum(BillType), default=BillType.EXPENSE, nullable=False)  # 收入或支出
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, Enum
+from app.db.database import Base
+from app.models.enums import BillType
+
+class BillDailyRollup(Base):
+    """账单按日汇总，由账单写入路径在同一事务中增量维护"""
+    __tablename__ = "bill_daily_rollups"
+    
+    ledger_id = Column(Integer, ForeignKey("ledgers.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # 账单日期（按存储时间取日期）
+    type = Column(Enum(BillType), primary_key=True)
+    category = Column(String, primary_key=True, default="")  # 未分类记为空字符串，保证唯一键可比较
+    total_amount = Column(Float, nullable=False, default=0.0)  # 金额合计
+    bill_count = Column(Integer, nullable=False, default=0)  # 账单笔数
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Enum, Boolean, Index, JSON
 from sqlalchemy.orm import relationship
 import datetime
 from app.db.database import Base
@@ -6,17 +6,24 @@ from app.models.enums import BudgetPeriodType, BudgetStatus
 
 class Budget(Base):
     __tablename__ = "budgets"
+    __table_args__ = (
+        # 查找覆盖某一日期的活跃预算
+        Index("ix_budgets_ledger_status_period", "ledger_id", "status", "start_date", "end_date"),
+        # 记账时按分类匹配活跃预算（分类为空的预算覆盖整个账本）
+        Index("ix_budgets_ledger_category_status_period", "ledger_id", "category", "status", "start_date", "end_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)  # 预算名称
     amount = Column(Float, nullable=False)  # 预算金额
     spent = Column(Float, default=0.0)  # 已花费金额
-    category = Column(String, nullable=True)  # 预算分类
+    category = Column(String, nullable=True)  # 预算分类，为空表示整个账本
     period_type = Column(Enum(BudgetPeriodType), nullable=False)  # 周期类型
     start_date = Column(DateTime, nullable=False)  # 开始日期
     end_date = Column(DateTime, nullable=False)  # 结束日期
     status = Column(Enum(BudgetStatus), default=BudgetStatus.ACTIVE)  # 状态
     alert_threshold = Column(Float, default=0.8)  # 预警阈值（80%）
+    alert_thresholds = Column(JSON, nullable=True)  # 提醒阈值阶梯，为空时使用 预警阈值/0.95/1.0
     ledger_id = Column(Integer, ForeignKey("ledgers.id"), nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -47,4 +54,11 @@ class Budget(Base):
     @property
     def is_warning(self) -> bool:
         """判断是否达到预警阈值"""
-        return self.progress >= self.alert_threshold 
\ No newline at end of file
+        return self.progress >= self.alert_threshold
+    
+    @property
+    def alert_ladder(self) -> list:
+        """提醒阈值阶梯（升序）"""
+        if self.alert_thresholds:
+            return sorted(set(self.alert_thresholds))
+        return sorted({self.alert_threshold if self.alert_threshold is not None else 0.8, 0.95, 1.0}) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Enum, Boolean, String
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Enum, Boolean, String, UniqueConstraint
 from sqlalchemy.orm import relationship
 import datetime
 from app.db.database import Base
@@ -6,6 +6,10 @@ from app.models.enums import AlertType
 
 class BudgetAlert(Base):
     __tablename__ = "budget_alerts"
+    __table_args__ = (
+        # 同一预算同一阈值只提醒一次，并发写入时由数据库去重
+        UniqueConstraint("budget_id", "alert_type", "threshold", name="uq_budget_alerts_budget_type_threshold"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     budget_id = Column(Integer, ForeignKey("budgets.id"), nullable=False)
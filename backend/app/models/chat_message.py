@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, Text, String, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, Integer, Text, String, DateTime, ForeignKey, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 import datetime
 from app.db.database import Base
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_ledger_user_timestamp", "ledger_id", "user_id", "timestamp", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
     message_type = Column(String, nullable=False)  # 'user' or 'assistant'
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 import datetime
 from app.db.database import Base
@@ -6,6 +6,12 @@ from app.models.enums import UserRole, InvitationStatus
 
 class Invitation(Base):
     __tablename__ = "invitations"
+    __table_args__ = (
+        # 用户待处理邀请
+        Index("ix_invitations_invitee_status", "invitee_email", "status"),
+        # 账本邀请列表
+        Index("ix_invitations_ledger_id", "ledger_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     ledger_id = Column(Integer, ForeignKey("ledgers.id"), nullable=False)
     inviter_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 邀请人
@@ -12,6 +12,8 @@ class Ledger(Base):
     currency = Column(String, default="CNY")  # 货币单位
     timezone = Column(String, default="Asia/Shanghai")  # 时区
     status = Column(Enum(LedgerStatus), default=LedgerStatus.ACTIVE)  # 账本状态
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # 数据版本号，账本内任何数据变更时递增
+    budget_version = Column(Integer, nullable=False, default=1, server_default="1")  # 预算版本号，预算增删或范围变化时递增，用于失效进程内预算索引
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)  # 删除时间（用于回收站）
     
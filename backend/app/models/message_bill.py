@@ -8,8 +8,8 @@ class MessageBill(Base):
     __tablename__ = "message_bills"
     
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("chat_messages.id"), nullable=False)
-    bill_id = Column(Integer, ForeignKey("bills.id"), nullable=False)
+    message_id = Column(Integer, ForeignKey("chat_messages.id"), nullable=False, index=True)
+    bill_id = Column(Integer, ForeignKey("bills.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     # AI识别的置信度（针对这个特定的消息-账单关联）
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Enum
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Enum, Index
 from sqlalchemy.orm import relationship
 import datetime
 from app.db.database import Base
@@ -6,6 +6,12 @@ from app.models.enums import UserRole
 
 class UserLedger(Base):
     __tablename__ = "user_ledgers"
+    __table_args__ = (
+        # 权限检查：几乎每个请求都会执行
+        Index("ix_user_ledgers_user_ledger_status", "user_id", "ledger_id", "status"),
+        # 账本成员列表
+        Index("ix_user_ledgers_ledger_status", "ledger_id", "status"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     ledger_id = Column(Integer, ForeignKey("ledgers.id"), nullable=False)
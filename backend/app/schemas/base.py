@@ -19,9 +19,10 @@ class PaginatedResponse(BaseModel):
     success: bool
     message: str
     data: List[Any]
-    total: int
+    total: Optional[int] = None  # 调用方可跳过计数查询
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
 
 # 认证相关模型
 class LoginRequest(BaseModel):
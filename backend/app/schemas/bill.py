@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Literal
+from datetime import datetime, date
 from app.models import BillType
 
 class BillBase(BaseModel):
@@ -26,4 +26,53 @@ class BillUpdate(BaseModel):
     type: Optional[BillType] = None
     category: Optional[str] = None
     description: Optional[str] = None
-    date: Optional[datetime] = None 
\ No newline at end of file
+    date: Optional[datetime] = None 
+
+class BillPageResponse(BaseModel):
+    """游标分页的账单列表"""
+    items: List[BillResponse]
+    next_cursor: Optional[str] = None
+
+
+class BillBatchOperation(BaseModel):
+    """批量操作中的单项：create 需提供 bill，update 需提供 bill_id 和 changes，delete 需提供 bill_id"""
+    action: Literal["create", "update", "delete"]
+    bill_id: Optional[int] = None
+    bill: Optional[BillCreate] = None
+    changes: Optional[BillUpdate] = None
+
+class BillBatchRequest(BaseModel):
+    """批量账单操作请求"""
+    operations: List[BillBatchOperation] = Field(..., min_length=1, max_length=1000)
+    atomic: bool = False  # 为 true 时任一项失败则全部回滚
+
+class BillBatchResult(BaseModel):
+    """批量操作单项结果"""
+    index: int
+    action: str
+    success: bool
+    bill_id: Optional[int] = None
+    bill: Optional[BillResponse] = None
+    error: Optional[str] = None
+
+class StatementImportResult(BaseModel):
+    """账单文件导入结果"""
+    source: str  # alipay / wechat / bank
+    imported: int
+    skipped: int
+    errors: List[str] = []
+
+class CalendarDay(BaseModel):
+    """日历中单日的收支汇总"""
+    date: date
+    income: float = 0.0
+    expense: float = 0.0
+    income_count: int = 0
+    expense_count: int = 0
+
+class LedgerCalendar(BaseModel):
+    """账本日历：按账本时区分桶的每日收支，只包含有账单的日期"""
+    timezone: str
+    start_date: date
+    end_date: date  # 包含
+    days: List[CalendarDay]
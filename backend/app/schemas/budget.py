@@ -1,16 +1,21 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Annotated
+from datetime import datetime, date
 from app.models.enums import BudgetPeriodType, BudgetStatus, AlertType
 
+# 提醒阈值（预算使用比例，超过 1 表示超支比例）
+AlertThreshold = Annotated[float, Field(gt=0, le=10)]
+
 # 预算基础模型
 class BudgetBase(BaseModel):
     name: str = Field(..., description="预算名称")
     amount: float = Field(..., gt=0, description="预算金额")
+    category: Optional[str] = Field(None, description="预算分类，为空表示整个账本")
     period_type: BudgetPeriodType = Field(..., description="周期类型")
     start_date: datetime = Field(..., description="开始日期")
     end_date: datetime = Field(..., description="结束日期")
     alert_threshold: float = Field(0.8, ge=0, le=1, description="预警阈值")
+    alert_thresholds: Optional[List[AlertThreshold]] = Field(None, max_length=10, description="提醒阈值阶梯，如 [0.5, 0.8, 1.0, 1.2]，为空时使用 预警阈值/0.95/1.0")
 
 # 创建预算请求模型
 class BudgetCreate(BudgetBase):
@@ -21,11 +26,13 @@ class BudgetCreate(BudgetBase):
 class BudgetUpdate(BaseModel):
     name: Optional[str] = Field(None, description="预算名称")
     amount: Optional[float] = Field(None, gt=0, description="预算金额")
+    category: Optional[str] = Field(None, description="预算分类，为空表示整个账本")
     period_type: Optional[BudgetPeriodType] = Field(None, description="周期类型")
     start_date: Optional[datetime] = Field(None, description="开始日期")
     end_date: Optional[datetime] = Field(None, description="结束日期")
     status: Optional[BudgetStatus] = Field(None, description="状态")
     alert_threshold: Optional[float] = Field(None, ge=0, le=1, description="预警阈值")
+    alert_thresholds: Optional[List[AlertThreshold]] = Field(None, max_length=10, description="提醒阈值阶梯")
 
 # 预算响应模型
 class BudgetResponse(BudgetBase):
@@ -67,10 +74,23 @@ class BudgetProgress(BaseModel):
     is_warning: bool
     days_remaining: int = Field(..., description="剩余天数")
 
+# 预算消耗预测
+class BudgetForecast(BaseModel):
+    budget_id: int
+    name: str
+    amount: float
+    spent: float
+    projected_spent: float = Field(..., description="期末预计支出")
+    projected_remaining: float = Field(..., description="期末预计剩余（负数表示预计超支）")
+    daily_rate: float = Field(..., description="剩余天数的预计日均支出")
+    will_exceed: bool = Field(..., description="是否预计超支")
+    expected_exceed_date: Optional[date] = Field(None, description="预计超支日期")
+    days_remaining: int = Field(..., description="剩余天数")
+
 # 预算提醒基础模型
 class BudgetAlertBase(BaseModel):
     alert_type: AlertType = Field(..., description="提醒类型")
-    threshold: float = Field(..., ge=0, le=1, description="触发阈值")
+    threshold: AlertThreshold = Field(..., description="触发阈值（超过 1 表示超支比例）")
     message: Optional[str] = Field(None, description="提醒消息")
 
 # 创建预算提醒模型
@@ -99,4 +119,27 @@ class BudgetSummary(BaseModel):
     yearly_budgets: List[BudgetResponse]
     custom_budgets: List[BudgetResponse]
     alerts: List[BudgetAlertResponse]
-    stats: BudgetStats 
\ No newline at end of file
+    stats: BudgetStats
+
+# 预算累计支出曲线
+class BudgetSpendCurve(BaseModel):
+    budget_id: int
+    granularity: str = Field(..., description="时间粒度: day, week")
+    amount: float = Field(..., description="预算金额")
+    labels: List[date] = Field(..., description="每个时间格的起始日期")
+    cumulative: List[float] = Field(..., description="与 labels 一一对应的累计支出")
+
+# 预算支出核对
+class BudgetDrift(BaseModel):
+    budget_id: int
+    ledger_id: int
+    name: str
+    recorded_spent: float = Field(..., description="预算记录的支出")
+    actual_spent: float = Field(..., description="账单实际支出")
+    drift: float = Field(..., description="偏差（实际 - 记录）")
+
+class BudgetReconcileResult(BaseModel):
+    checked: int = Field(..., description="核对的活跃预算数")
+    drifted: int = Field(..., description="存在偏差的预算数")
+    fixed: bool = Field(..., description="是否已修正")
+    drifts: List[BudgetDrift]
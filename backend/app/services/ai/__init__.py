@@ -1,5 +1,6 @@
 from .service import ai_service
 from .mock_service import mock_ai_service
 from .aliyun_nls_service import aliyun_nls_service
+from .metrics import ai_metrics
 
-__all__ = ["ai_service", "mock_ai_service", "aliyun_nls_service"]
+__all__ = ["ai_service", "mock_ai_service", "aliyun_nls_service", "ai_metrics"]
@@ -0,0 +1,145 @@
+"""
+AI 文本分析结果缓存
+
+用户经常重复记同样的账（“咖啡 13”“地铁 4元”），以规范化后的文本加当天日期为键缓存
+analyze_text 的结果，命中时不再调用 dashscope。日期写进键里，“昨天”“上周二”等相对日期
+跨天后自然失效。
+
+默认使用进程内 LRU + TTL 缓存；配置 AI_CACHE_REDIS_URL 且安装了 redis 包时改用 Redis，
+所有 uvicorn worker 共享同一份缓存。
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional
+
+from app.core.config.settings import settings
+from .metrics import ai_metrics
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # redis 为可选依赖
+    redis_asyncio = None
+
+KEY_PREFIX = "ai:analyze_text"
+TRAILING_PUNCTUATION = "。.!！~～?？"
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、英文转小写、去掉空白和句末标点"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", "", text)
+    return text.rstrip(TRAILING_PUNCTUATION)
+
+def analysis_cache_key(text: str, today: Optional[date] = None) -> str:
+    """缓存键：前缀 + 当天日期 + 规范化文本的摘要"""
+    today = today or date.today()
+    digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:{today.isoformat()}:{digest}"
+
+class LocalAnalysisCache:
+    """进程内 LRU + TTL 缓存，超过容量时淘汰最久未使用的条目"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: str):
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            ai_metrics.increment("ai_cache_evictions", evicted)
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisAnalysisCache:
+    """Redis 共享缓存，过期由 TTL 控制，容量由 Redis 的 maxmemory 淘汰策略控制"""
+
+    def __init__(self, url: str, ttl: float):
+        self.ttl = ttl
+        # 缓存只是加速手段，连接或读写超时时按未命中处理，不拖慢请求
+        self._client = redis_asyncio.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self._client.get(key)
+        except Exception as e:
+            print(f"AI缓存读取失败: {e}")
+            ai_metrics.increment("ai_cache_errors")
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str):
+        try:
+            await self._client.set(key, value, ex=max(1, int(self.ttl)))
+        except Exception as e:
+            print(f"AI缓存写入失败: {e}")
+            ai_metrics.increment("ai_cache_errors")
+
+    async def clear(self):
+        try:
+            async for key in self._client.scan_iter(match=f"{KEY_PREFIX}:*"):
+                await self._client.delete(key)
+        except Exception as e:
+            print(f"AI缓存清理失败: {e}")
+
+class AnalysisCache:
+    """按规范化文本缓存 analyze_text 结果，并统计命中率"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get(self, text: str) -> Optional[Dict[str, Any]]:
+        if self.backend is None:
+            return None
+        value = await self.backend.get(analysis_cache_key(text))
+        ai_metrics.increment("ai_cache_hits" if value is not None else "ai_cache_misses")
+        # 以 JSON 存储，每次命中返回新对象，调用方修改结果不会污染缓存
+        return json.loads(value) if value is not None else None
+
+    async def set(self, text: str, result: Dict[str, Any]):
+        if self.backend is None:
+            return
+        await self.backend.set(analysis_cache_key(text), json.dumps(result, ensure_ascii=False))
+
+    async def clear(self):
+        if self.backend is not None:
+            await self.backend.clear()
+
+def build_analysis_cache() -> AnalysisCache:
+    """根据配置创建缓存：AI_CACHE_SIZE 为 0 时关闭，配置了 Redis 地址时使用共享缓存"""
+    if settings.ai_cache_size <= 0:
+        return AnalysisCache(None)
+    if settings.ai_cache_redis_url:
+        if redis_asyncio is not None:
+            return AnalysisCache(RedisAnalysisCache(settings.ai_cache_redis_url, settings.ai_cache_ttl_seconds))
+        print("未安装 redis，AI缓存退回进程内缓存")
+    return AnalysisCache(LocalAnalysisCache(settings.ai_cache_size, settings.ai_cache_ttl_seconds))
@@ -0,0 +1,254 @@
+"""
+本地账单解析器
+
+在调用大模型之前，用确定性规则解析“午餐18块，咖啡13元”“昨天打车35”这类短句。
+只有每一项都能确定金额、日期和分类时才返回结果，其余情况返回 None 交给大模型处理。
+"""
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# 分类关键词表：(账单类型, 分类, 关键词)，按顺序匹配，靠前的优先
+CATEGORY_KEYWORDS: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("income", "工资", ("工资", "薪水", "薪资", "发薪")),
+    ("income", "奖金", ("奖金", "年终奖", "绩效奖", "提成")),
+    ("income", "投资收益", ("分红", "利息", "理财收益", "基金收益", "股票收益")),
+    ("income", "兼职", ("兼职", "外快", "稿费")),
+    ("income", "红包", ("抢红包",)),
+    ("income", "退款", ("报销", "返现")),
+    ("expense", "人情", ("发红包", "随礼", "份子钱", "礼物")),
+    ("expense", "餐饮", (
+        "早餐", "早饭", "午餐", "午饭", "晚餐", "晚饭", "夜宵", "宵夜", "吃饭", "外卖", "饭", "面",
+        "咖啡", "奶茶", "饮料", "水果", "零食", "火锅", "烧烤", "聚餐", "餐厅", "食堂", "下午茶", "早点",
+    )),
+    ("expense", "交通", (
+        "打车", "出租车", "滴滴", "地铁", "公交", "高铁", "火车", "机票", "飞机", "加油", "油费",
+        "停车", "过路费", "共享单车", "单车", "车费", "路费",
+    )),
+    ("expense", "住房", ("房租", "房贷", "物业", "租金")),
+    ("expense", "水电煤", ("水费", "电费", "燃气", "煤气", "暖气")),
+    ("expense", "通讯", ("话费", "宽带", "流量", "电话费")),
+    ("expense", "日用品", ("日用品", "超市", "纸巾", "洗发水", "牙膏", "便利店")),
+    ("expense", "购物", ("衣服", "裤子", "鞋", "包包", "化妆品", "护肤品", "淘宝", "京东", "网购", "购物")),
+    ("expense", "娱乐", ("电影", "游戏", "KTV", "唱歌", "酒吧", "演唱会", "门票", "娱乐")),
+    ("expense", "医疗", ("药", "医院", "看病", "挂号", "体检")),
+    ("expense", "教育", ("学费", "培训", "课程", "书", "教材")),
+    ("expense", "健身", ("健身", "游泳", "瑜伽", "球馆")),
+    ("expense", "旅行", ("酒店", "住宿", "旅游", "旅行", "景点")),
+]
+
+CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CN_UNITS = {"十": 10, "百": 100, "千": 1000}
+MULTIPLIERS = {"万": 10000, "w": 10000, "W": 10000, "千": 1000, "k": 1000, "K": 1000}
+WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6, "1": 0, "2": 1, "3": 2, "4": 3, "5": 4, "6": 5, "7": 6}
+
+_CN_NUMBER = "[零〇一二两三四五六七八九十百千万点]+"
+_NUMBER = r"\d+(?:\.\d+)?"
+_JIAO = r"\d|[一二两三四五六七八九]"
+
+# 带货币单位的金额：18块、十三元、三块五、3元5角、1.2万元、五毛
+UNIT_AMOUNT_RE = re.compile(
+    rf"(?P<num>{_NUMBER}|{_CN_NUMBER})(?P<mult>[万千wWkK])?"
+    rf"(?:(?P<yuan>块钱|块|元|圆)(?:(?P<jiao>{_JIAO})(?:毛|角)?)?|(?P<mao>毛钱|毛|角))"
+)
+# 不带单位的阿拉伯数字金额只允许出现在一项末尾：咖啡 13、打车35、工资1.2万
+BARE_AMOUNT_RE = re.compile(rf"(?P<num>{_NUMBER})(?P<mult>[万千wWkK])?\s*$")
+
+RELATIVE_DAYS = {"大前天": -3, "前天": -2, "昨天": -1, "昨日": -1, "今天": 0, "今日": 0}
+RELATIVE_DAY_RE = re.compile("|".join(RELATIVE_DAYS))
+WEEKDAY_RE = re.compile(r"(?P<prefix>上上|上|下|这|本)?(?:个)?(?:周|星期|礼拜)(?P<day>[一二三四五六日天1-7])")
+FULL_DATE_RE = re.compile(r"(?P<year>\d{4})[-/年.](?P<month>\d{1,2})[-/月.](?P<day>\d{1,2})[日号]?")
+MONTH_DAY_RE = re.compile(r"(?P<month>\d{1,2})月(?P<day>\d{1,2})[日号]")
+
+# 收入/卖出动词、否定、退款与借还会改变收支方向或含义，交给大模型判断
+AMBIGUOUS_RE = re.compile(r"收到|收了|卖|到账|进账|入账|不|没|别|退|借|还|欠")
+# 本地不支持的日期说法，保留原样会把它们误当成描述并记到今天
+UNSUPPORTED_DATE_RE = re.compile(
+    r"明天|明日|后天|大后天|下周|下星期|下礼拜|上周|上星期|上礼拜|这周|本周|周末|"
+    r"[上下本这]个?月|去年|前年|明年|今年|月初|月中|月底|月末|年初|年底|\d+[日号]"
+)
+
+SEGMENT_SPLIT_RE = re.compile(r"[，,。；;、\n]|还有|另外|以及|然后")
+LEADING_FILLER_RE = re.compile(r"^(?:我|又|刚刚|刚才|刚|花了|花|用了|付了|支付了|买了|买|吃了|喝了|交了|发了|一共|总共|共)+")
+TRAILING_FILLER_RE = re.compile(r"(?:花了|花费了?|花|用了|付了|支付了|消费了?|一共|总共|共计|共|大概|大约|约|左右|的钱|钱|了|是|为)+$")
+MAX_DESCRIPTION_LENGTH = 20
+
+def chinese_to_number(text: str) -> Optional[float]:
+    """中文数字转数值，支持“十八”“一百零五”“两千五”（口语省略末位单位）“三点五”"""
+    if "点" in text:
+        integer, _, fraction = text.partition("点")
+        if not fraction or any(char not in CN_DIGITS for char in fraction):
+            return None
+        integer_value = chinese_to_number(integer) if integer else 0
+        if integer_value is None:
+            return None
+        return integer_value + float("0." + "".join(str(CN_DIGITS[char]) for char in fraction))
+
+    total = section = number = 0
+    last_unit = 1
+    after_unit = False
+    for char in text:
+        if char in CN_DIGITS:
+            if number and not after_unit:
+                return None  # “一二三”这类连续数字不是金额
+            number = CN_DIGITS[char]
+            after_unit = after_unit and number != 0
+        elif char in CN_UNITS:
+            unit = CN_UNITS[char]
+            section += (number or (1 if unit == 10 else 0)) * unit
+            number, last_unit, after_unit = 0, unit, True
+        elif char == "万":
+            total += (section + number) * 10000
+            section = number = 0
+            last_unit, after_unit = 10000, True
+        else:
+            return None
+    # 紧跟在单位后的末位数字省略了下一级单位：两千五 = 2500，一百二 = 120，十五 = 15
+    if number and after_unit and last_unit > 10:
+        number *= last_unit // 10
+    return float(total + section + number)
+
+def parse_amount(match: re.Match) -> Optional[float]:
+    """根据金额正则的匹配结果计算金额（元）"""
+    num = match.group("num")
+    value = float(num) if num[0].isdigit() else chinese_to_number(num)
+    if value is None:
+        return None
+    if match.group("mult"):
+        value *= MULTIPLIERS[match.group("mult")]
+    if match.groupdict().get("mao"):
+        value *= 0.1
+    jiao = match.groupdict().get("jiao")
+    if jiao:
+        value += (int(jiao) if jiao.isdigit() else CN_DIGITS[jiao]) * 0.1
+    return round(value, 2)
+
+def find_amount(segment: str) -> Optional[Tuple[float, Tuple[int, int]]]:
+    """找出一项中唯一的金额，返回 (金额, 位置)；没有或有多个候选时返回 None"""
+    candidates = [match for match in UNIT_AMOUNT_RE.finditer(segment) if match.group("num") != "点"]
+    bare = BARE_AMOUNT_RE.search(segment)
+    if bare and not any(match.start() <= bare.start() < match.end() for match in candidates):
+        candidates.append(bare)
+    if len(candidates) != 1:
+        return None
+    amount = parse_amount(candidates[0])
+    if not amount or amount <= 0:
+        return None
+    return amount, candidates[0].span()
+
+def find_date(segment: str, today: date) -> Tuple[Optional[date], List[Tuple[int, int]], bool]:
+    """识别一项中的日期，返回 (日期, 日期文字位置, 是否合法)"""
+    found = []
+    for regex in (FULL_DATE_RE, MONTH_DAY_RE, WEEKDAY_RE, RELATIVE_DAY_RE):
+        for match in regex.finditer(segment):
+            if any(start < match.end() and match.start() < end for start, end, _ in found):
+                continue
+            found.append((match.start(), match.end(), match))
+    if not found:
+        return None, [], True
+    if len(found) > 1:
+        return None, [], False
+
+    _, _, match = found[0]
+    try:
+        if match.re is RELATIVE_DAY_RE:
+            day = today + timedelta(days=RELATIVE_DAYS[match.group()])
+        elif match.re is WEEKDAY_RE:
+            if match.group("prefix") == "下":
+                return None, [], False  # 未来日期不在本地解析
+            monday = today - timedelta(days=today.weekday())
+            weeks_back = {"上上": 2, "上": 1}.get(match.group("prefix") or "", 0)
+            day = monday - timedelta(weeks=weeks_back) + timedelta(days=WEEKDAYS[match.group("day")])
+            # “周三”“这周五”指的是已经过去的那一天
+            if weeks_back == 0 and day > today:
+                day -= timedelta(weeks=1)
+        elif match.re is FULL_DATE_RE:
+            day = date(int(match.group("year")), int(match.group("month")), int(match.group("day")))
+        else:
+            day = date(today.year, int(match.group("month")), int(match.group("day")))
+    except ValueError:
+        return None, [], False
+    return day, [match.span()], True
+
+def classify(description: str) -> Optional[Tuple[str, str]]:
+    """按关键词表确定 (账单类型, 分类)，没有命中返回 None
+
+    单字关键词（饭、面、书……）只在描述恰好是这个字时命中，避免“面膜”“书包”被误分类。
+    """
+    for bill_type, category, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in description if len(keyword) > 1 else description == keyword for keyword in keywords):
+            return bill_type, category
+    return None
+
+def _remove_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    return text
+
+def _clean_description(text: str) -> str:
+    text = re.sub(r"[\s:：]+", "", text)
+    previous = None
+    while previous != text:
+        previous = text
+        text = TRAILING_FILLER_RE.sub("", LEADING_FILLER_RE.sub("", text))
+    return text
+
+def _format_amount(amount: float) -> str:
+    return f"{amount:g}" if amount != int(amount) else str(int(amount))
+
+def parse_bill_text(text: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """解析短句中的账单，返回与 AIService.analyze_text 相同结构的结果；不能确定时返回 None"""
+    if not text or len(text) > 200:
+        return None
+    today = today or date.today()
+
+    bills = []
+    current_date = today
+    for segment in SEGMENT_SPLIT_RE.split(text.strip()):
+        if not segment.strip():
+            continue
+        if AMBIGUOUS_RE.search(segment):
+            return None
+        day, date_spans, valid = find_date(segment, today)
+        if not valid:
+            return None
+        if day is not None:
+            current_date = day
+        rest = _remove_spans(segment, date_spans)
+        if UNSUPPORTED_DATE_RE.search(rest):
+            return None
+
+        found = find_amount(rest)
+        if found is None:
+            # 只有日期的片段（如“昨天，午餐18”）作用于后面的项目，其余内容交给大模型
+            if _clean_description(rest):
+                return None
+            continue
+        amount, amount_span = found
+
+        description = _clean_description(_remove_spans(rest, [amount_span]))
+        if not description or len(description) > MAX_DESCRIPTION_LENGTH or re.search(r"\d", description):
+            return None
+        classified = classify(description)
+        if classified is None:
+            return None
+        bill_type, category = classified
+        bills.append({
+            "amount": amount,
+            "type": bill_type,
+            "description": description,
+            "category": category,
+            "date": current_date.strftime("%Y-%m-%d")
+        })
+
+    if not bills:
+        return None
+
+    types = {bill["type"] for bill in bills}
+    label = "财务信息" if len(types) > 1 else ("收入信息" if "income" in types else "支出信息")
+    items = "，".join(f"{bill['description']} ¥{_format_amount(bill['amount'])}" for bill in bills)
+    return {
+        "has_bill": True,
+        "bills": bills,
+        "message": f"已识别到{label}：{items}"
+    }
@@ -0,0 +1,65 @@
+"""
+AI 调用指标
+
+进程内统计聊天请求数、LLM 调用次数、本地解析命中率、结果缓存命中率、需要多次调用的请求占比及延迟分位数。
+"""
+import threading
+from collections import Counter, deque
+from statistics import quantiles
+from typing import Any, Dict
+
+# 保留最近的延迟样本数
+LATENCY_SAMPLES = 1000
+
+class AIMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self.counters = Counter()
+            self.latencies = deque(maxlen=LATENCY_SAMPLES)
+    
+    def increment(self, name: str, value: int = 1):
+        """累加计数器"""
+        with self._lock:
+            self.counters[name] += value
+    
+    def record_chat(self, llm_calls: int, seconds: float):
+        """记录一次聊天请求使用的 LLM 调用次数与耗时"""
+        with self._lock:
+            self.counters["chat_requests"] += 1
+            self.counters["llm_calls"] += llm_calls
+            if llm_calls > 1:
+                self.counters["multi_call_requests"] += 1
+            self.latencies.append(seconds)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前指标"""
+        with self._lock:
+            counters = dict(self.counters)
+            latencies = list(self.latencies)
+        
+        requests = counters.get("chat_requests", 0)
+        cache_lookups = counters.get("ai_cache_hits", 0) + counters.get("ai_cache_misses", 0)
+        data: Dict[str, Any] = {
+            **counters,
+            "multi_call_ratio": counters.get("multi_call_requests", 0) / requests if requests else 0.0,
+            "llm_calls_per_request": counters.get("llm_calls", 0) / requests if requests else 0.0,
+            "local_parser_ratio": counters.get("local_parser_hits", 0) / requests if requests else 0.0,
+            "ai_cache_hit_rate": counters.get("ai_cache_hits", 0) / cache_lookups if cache_lookups else 0.0,
+            "latency_p50_ms": None,
+            "latency_p95_ms": None
+        }
+        if len(latencies) >= 2:
+            cuts = quantiles(latencies, n=100)
+            data["latency_p50_ms"] = round(cuts[49] * 1000, 1)
+            data["latency_p95_ms"] = round(cuts[94] * 1000, 1)
+        elif latencies:
+            data["latency_p50_ms"] = data["latency_p95_ms"] = round(latencies[0] * 1000, 1)
+        return data
+
+# 创建全局指标实例
+ai_metrics = AIMetrics()
@@ -1,7 +1,11 @@
 import os
+import asyncio
 import base64
 import io
-from typing import Optional, List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterator
 from PIL import Image
 import dashscope
 from dashscope import MultiModalConversation
@@ -9,21 +13,248 @@ import json
 from datetime import datetime, date, timedelta
 from app.core.config.settings import settings
 from .aliyun_nls_service import aliyun_nls_service
+from .metrics import ai_metrics
+from .local_parser import parse_bill_text
+from .cache import AnalysisCache, build_analysis_cache
+from .streaming import StructuredReplyReader
 
 # 设置阿里百练API密钥
 dashscope.api_key = settings.dashscope_api_key or "your-dashscope-api-key"
 
 class AIService:
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[AnalysisCache] = None
+    ):
         self.model = "qwen-vl-plus"  # 使用qwen-vl-plus模型支持多模态
+        # dashscope SDK 是同步阻塞的，放到专用的有界线程池中执行，避免阻塞事件循环；
+        # 线程数即同时进行的 AI 调用上限，超出的调用在线程池队列中等待
+        self.max_concurrency = max_concurrency or settings.ai_max_concurrency
+        self.timeout = timeout or settings.ai_timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ai-call")
+        self.cache = cache if cache is not None else build_analysis_cache()
+    
+    async def _run_blocking(self, func, *args):
+        """在 AI 线程池中执行阻塞调用，超时（含排队时间）抛出 asyncio.TimeoutError"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, func, *args), self.timeout)
+    
+    async def _stream_blocking(self, func, *args) -> AsyncIterator[Any]:
+        """在 AI 线程池中迭代阻塞的生成器，逐项产出；等待下一项超时抛出 asyncio.TimeoutError
+        
+        调用方提前结束迭代（如客户端断开）时通知工作线程停止读取上游流。
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+        finished = object()
+        
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stopped.set()  # 事件循环已关闭
+        
+        def run():
+            try:
+                for item in func(*args):
+                    if stopped.is_set():
+                        break
+                    put(item)
+            except Exception as e:
+                put(e)
+            finally:
+                put(finished)
+        
+        loop.run_in_executor(self._executor, run)
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), self.timeout)
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+    
+    async def analyze_text(self, text: str) -> Dict[str, Any]:
+        """分析文本中的账单信息，识别出账单的结果按规范化文本缓存"""
+        cached = await self.cache.get(text)
+        if cached is not None:
+            return cached
+        return await self._analyze_text_uncached(text)
+    
+    async def _analyze_text_uncached(self, text: str) -> Dict[str, Any]:
+        """调用模型分析文本，并缓存识别出账单的结果"""
+        try:
+            result = await self._run_blocking(self._analyze_text_sync, text)
+        except asyncio.TimeoutError:
+            return {
+                "has_bill": False,
+                "message": "抱歉，AI服务响应超时，请稍后再试。"
+            }
+        # 只缓存识别出账单的结果：失败兜底和闲聊回复不缓存
+        if result.get("has_bill") and result.get("bills"):
+            await self.cache.set(text, result)
+        return result
+    
+    async def analyze_image(self, image_data: str) -> Dict[str, Any]:
+        """分析图片中的账单信息"""
+        try:
+            return await self._run_blocking(self._analyze_image_sync, image_data)
+        except asyncio.TimeoutError:
+            return {
+                "has_bill": False,
+                "message": "抱歉，图片分析超时，请稍后再试。"
+            }
+    
+    async def recognize_voice(self, audio_data: str) -> Dict[str, Any]:
+        """语音识别"""
+        try:
+            return await self._run_blocking(self._recognize_voice_sync, audio_data)
+        except asyncio.TimeoutError:
+            return {
+                "success": False,
+                "text": "",
+                "message": "语音识别超时"
+            }
+    
+    async def chat(self, message: str) -> Dict[str, Any]:
+        """聊天对话
+
+        本地解析器能确定的简单记账语句直接返回，不调用模型；其余情况一次结构化调用
+        同时返回账单与回复，只有模型没有给出回复时才追加一次一般对话调用。
+        """
+        start = time.perf_counter()
+        local = parse_bill_text(message)
+        if local is not None:
+            ai_metrics.increment("local_parser_hits")
+            ai_metrics.record_chat(0, time.perf_counter() - start)
+            return {"message": local["message"], "bills": local["bills"]}
+        
+        # 缓存命中时不调用模型，不计入 LLM 调用次数
+        analysis = await self.cache.get(message)
+        llm_calls = 0 if analysis is not None else 1
+        if analysis is None:
+            analysis = await self._analyze_text_uncached(message)
+        
+        if analysis.get("has_bill", False):
+            result = {
+                "message": analysis.get("message") or "已识别到财务信息",
+                "bills": analysis.get("bills", [])
+            }
+        elif analysis.get("message"):
+            result = {
+                "message": analysis["message"],
+                "bills": []
+            }
+        else:
+            # 兜底：回复缺失时再进行一般性对话
+            llm_calls += 1
+            try:
+                result = await self._run_blocking(self._small_talk_sync, message)
+            except asyncio.TimeoutError:
+                result = {
+                    "message": "抱歉，AI服务响应超时，请稍后再试。",
+                    "bills": []
+                }
+        
+        ai_metrics.record_chat(llm_calls, time.perf_counter() - start)
+        return result
+    
+    async def chat_stream(self, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """流式聊天，依次产出事件：
+        
+        - {"type": "token", "text": ...}：回复文字片段
+        - {"type": "bill", "bill": {...}}：解析出的一笔账单
+        - {"type": "result", "message": ..., "bills": [...]}：最终结果，总是最后一个事件
+        """
+        start = time.perf_counter()
+        local = parse_bill_text(message)
+        if local is not None:
+            ai_metrics.increment("local_parser_hits")
+            ai_metrics.record_chat(0, time.perf_counter() - start)
+            for bill in local["bills"]:
+                yield {"type": "bill", "bill": bill}
+            yield {"type": "token", "text": local["message"]}
+            yield {"type": "result", "message": local["message"], "bills": local["bills"]}
+            return
+        
+        llm_calls = 1
+        cached = await self.cache.get(message)
+        if cached is not None:
+            llm_calls = 0
+            result = cached
+            for bill in result.get("bills", []):
+                yield {"type": "bill", "bill": bill}
+            if result.get("message"):
+                yield {"type": "token", "text": result["message"]}
+        else:
+            reader = StructuredReplyReader()
+            emitted = []
+            streamed = []  # 已流出的回复文字片段
+            try:
+                async for delta in self._stream_blocking(self._analyze_text_stream_sync, message):
+                    for event in reader.feed(delta):
+                        if event["type"] == "bill":
+                            emitted.append(self._fill_bill_defaults(event["bill"]))
+                        else:
+                            streamed.append(event["text"])
+                        yield event
+                result = reader.result()
+            except asyncio.TimeoutError:
+                result = {"has_bill": False, "message": "抱歉，AI服务响应超时，请稍后再试。"}
+            except Exception as e:
+                print(f"AI流式分析错误: {e}")
+                result = {"has_bill": False, "message": "抱歉，AI服务暂时不可用，请稍后再试。"}
+            
+            complete = isinstance(result.get("bills"), list)
+            if emitted and not complete:
+                # 账单已在流中发出，但完整输出未能解析或中途出错：回复改用已流出的文字，
+                # 不能把原始 JSON 或错误提示当作回复；不完整的结果也不写入缓存
+                result = {"has_bill": True, "message": "".join(streamed) or "已识别到财务信息"}
+            
+            # 流中未能增量解析出的账单在完整解析后补发；已发出的账单以发出的为准
+            bills = result["bills"] if complete else []
+            for bill in bills[len(emitted):]:
+                if isinstance(bill, dict):
+                    emitted.append(self._fill_bill_defaults(bill))
+                    yield {"type": "bill", "bill": bill}
+            result["bills"] = emitted
+            if result.get("message") and not streamed:
+                yield {"type": "token", "text": result["message"]}
+            if emitted:
+                result["has_bill"] = True
+                if complete:
+                    await self.cache.set(message, result)
         
-    def analyze_text(self, text: str) -> Dict[str, Any]:
-        """分析文本中的账单信息"""
+        if result.get("has_bill") and result.get("bills"):
+            reply = result.get("message") or "已识别到财务信息"
+        elif result.get("message"):
+            reply = result["message"]
+        else:
+            # 兜底：回复缺失时再进行一般性对话
+            llm_calls += 1
+            try:
+                reply = (await self._run_blocking(self._small_talk_sync, message)).get("message", "")
+            except asyncio.TimeoutError:
+                reply = "抱歉，AI服务响应超时，请稍后再试。"
+            yield {"type": "token", "text": reply}
+        
+        ai_metrics.record_chat(llm_calls, time.perf_counter() - start)
+        yield {"type": "result", "message": reply, "bills": result.get("bills", [])}
+    
+    def _text_analysis_prompt(self, text: str) -> str:
+        """构造文本账单分析的提示词"""
         current_date = datetime.now().strftime("%Y年%m月%d日")
         current_time = datetime.now().strftime("%H:%M")
         
         prompt = f"""
-        你是一个专业的记账助手。请仔细分析以下文本中的财务信息，提取金额、描述、分类、日期等信息，忽略掉预算信息等其他无关信息，并判断是收入还是支出。
+        你是一个专业又友好的AI记账助手。请仔细分析以下文本中的财务信息，提取金额、描述、分类、日期等信息，忽略掉预算信息等其他无关信息，并判断是收入还是支出。
+        同时直接给出回复用户的话（message 字段），无论文本是否包含财务信息，都只返回一个JSON。
 
         当前日期：{current_date}
         当前时间：{current_time}
@@ -70,10 +301,11 @@ class AIService:
             "message": "已识别到财务信息"
         }}
 
-        如果没有财务信息，返回：
+        如果没有财务信息，message 是你对用户的友好回复：正常回应用户的话，并询问是否需要帮助记录收入或支出；
+        如果用户提到了支出、消费、收入、工资等财务信息但缺少金额，请主动询问具体金额。返回：
         {{
             "has_bill": false,
-            "message": "我没有识别到财务信息，请告诉我您的收入或支出情况。"
+            "message": "对用户的回复"
         }}
 
         示例：
@@ -136,13 +368,47 @@ class AIService:
             "message": "已识别到支出信息：衣服 ¥200"
         }}
 
+        输入："今天心情不错"
+        输出：{{
+            "has_bill": false,
+            "message": "听起来今天过得很开心！今天有什么收入或支出需要我帮您记录吗？"
+        }}
+
         文本内容：{text}
         """
-        
+        return prompt
+    
+    def _fill_bill_defaults(self, bill: Dict[str, Any]) -> Dict[str, Any]:
+        """补全模型返回账单中缺失的类型与日期"""
+        if "type" not in bill:
+            bill["type"] = "expense"
+        if "date" not in bill:
+            bill["date"] = datetime.now().strftime('%Y-%m-%d')
+        return bill
+    
+    def _analyze_text_stream_sync(self, text: str) -> Iterator[str]:
+        """流式分析文本中的账单信息（阻塞调用），逐段产出模型输出的增量文本"""
+        responses = dashscope.Generation.call(
+            model='qwen-plus',
+            prompt=self._text_analysis_prompt(text),
+            result_format='message',
+            response_format={"type": "json_object"},
+            stream=True,
+            incremental_output=True
+        )
+        for response in responses:
+            if response.status_code != 200:
+                raise RuntimeError(f"dashscope 返回错误: {response.status_code} {response.message}")
+            content = response.output.choices[0].message.content
+            if content:
+                yield content
+    
+    def _analyze_text_sync(self, text: str) -> Dict[str, Any]:
+        """分析文本中的账单信息（阻塞调用）"""
         try:
             response = dashscope.Generation.call(
                 model='qwen-plus',
-                prompt=prompt,
+                prompt=self._text_analysis_prompt(text),
                 result_format='message',
                 response_format={"type": "json_object"}
             )
@@ -155,10 +421,7 @@ class AIService:
                     # 确保所有账单都有必要字段，设置默认值
                     if result.get("has_bill", False) and "bills" in result:
                         for bill in result["bills"]:
-                            if "type" not in bill:
-                                bill["type"] = "expense"
-                            if "date" not in bill:
-                                bill["date"] = datetime.now().strftime('%Y-%m-%d')
+                            self._fill_bill_defaults(bill)
                     return result
                 except json.JSONDecodeError:
                     print("decode json error", content)
@@ -184,8 +447,8 @@ class AIService:
                 "message": "抱歉，AI服务暂时不可用，请稍后再试。"
             }
     
-    def analyze_image(self, image_data: str) -> Dict[str, Any]:
-        """分析图片中的账单信息"""
+    def _analyze_image_sync(self, image_data: str) -> Dict[str, Any]:
+        """分析图片中的账单信息（阻塞调用）"""
         try:
             # 解码base64图片数据
             image_bytes = base64.b64decode(image_data)
@@ -238,8 +501,8 @@ class AIService:
                 "message": "抱歉，图片分析服务暂时不可用，请稍后再试。"
             }
     
-    def recognize_voice(self, audio_data: str) -> Dict[str, Any]:
-        """语音识别 - 使用阿里云NLS服务"""
+    def _recognize_voice_sync(self, audio_data: str) -> Dict[str, Any]:
+        """语音识别 - 使用阿里云NLS服务（阻塞调用）"""
         try:
             # 使用阿里云NLS服务进行语音识别
             # result = aliyun_nls_service.recognize_voice(audio_data)
@@ -281,51 +544,40 @@ class AIService:
                 "message": f"语音识别服务异常: {str(e)}"
             }
     
-    def chat(self, message: str) -> Dict[str, Any]:
-        """聊天对话"""
-        # 首先尝试分析是否包含账单信息
-        analysis = self.analyze_text(message)
+    def _small_talk_sync(self, message: str) -> Dict[str, Any]:
+        """一般性对话（阻塞调用）"""
+        prompt = f"""
+        你是一个友好的AI记账助手。用户说：{message}
         
-        if analysis.get("has_bill", False):
-            bills = analysis.get("bills", [])
-            return {
-                "message": analysis.get("message", "已识别到财务信息"),
-                "bills": bills
-            }
-        else:
-            # 如果没有账单信息，进行一般性对话
-            prompt = f"""
-            你是一个友好的AI记账助手。用户说：{message}
-            
-            请用友好的语气回复，并询问是否需要帮助记录收入或支出。
-            如果用户提到了支出、消费、收入、工资等财务信息，请主动询问是否需要记录。
-            记住，财务信息包括收入和支出两种类型。
-            """
+        请用友好的语气回复，并询问是否需要帮助记录收入或支出。
+        如果用户提到了支出、消费、收入、工资等财务信息，请主动询问是否需要记录。
+        记住，财务信息包括收入和支出两种类型。
+        """
+        
+        try:
+            response = dashscope.Generation.call(
+                model='qwen-plus',
+                prompt=prompt,
+                result_format='message'
+            )
             
-            try:
-                response = dashscope.Generation.call(
-                    model='qwen-plus',
-                    prompt=prompt,
-                    result_format='message'
-                )
-                
-                if response.status_code == 200:
-                    content = response.output.choices[0].message.content
-                    return {
-                        "message": content,
-                        "bills": []
-                    }
-                else:
-                    return {
-                        "message": "抱歉，我现在无法回复，请稍后再试。",
-                        "bills": []
-                    }
-            except Exception as e:
-                print(f"聊天错误: {e}")
+            if response.status_code == 200:
+                content = response.output.choices[0].message.content
+                return {
+                    "message": content,
+                    "bills": []
+                }
+            else:
                 return {
-                    "message": "抱歉，AI服务暂时不可用，请稍后再试。",
+                    "message": "抱歉，我现在无法回复，请稍后再试。",
                     "bills": []
                 }
+        except Exception as e:
+            print(f"聊天错误: {e}")
+            return {
+                "message": "抱歉，AI服务暂时不可用，请稍后再试。",
+                "bills": []
+            }
 
 # 创建全局AI服务实例
 ai_service = AIService() 
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+流式结构化回复解析
+
+模型以增量方式输出 {"has_bill": ..., "bills": [...], "message": "..."} 形式的 JSON。
+StructuredReplyReader 边接收边解析：bills 数组中的每个对象一完整就产出，message 字段的
+文字逐段产出，不必等整个 JSON 生成完毕。
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+BILLS_RE = re.compile(r'"bills"\s*:\s*\[')
+MESSAGE_RE = re.compile(r'"message"\s*:\s*"')
+JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class StructuredReplyReader:
+    """增量解析模型的 JSON 输出，feed 返回本次新产生的事件"""
+
+    def __init__(self):
+        self.buffer = ""
+        self._decoder = json.JSONDecoder()
+        self._bills_pos: Optional[int] = None  # bills 数组中下一个元素的扫描位置
+        self._bills_done = False
+        self._message_pos: Optional[int] = None  # message 字符串中下一个未产出字符的位置
+        self._message_done = False
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        """追加一段模型输出，返回新解析出的 bill / token 事件"""
+        self.buffer += delta
+        return self._read_bills() + self._read_message()
+
+    def result(self) -> Dict[str, Any]:
+        """解析完整输出；不是合法 JSON 时把原文当作回复"""
+        try:
+            result = json.loads(self.buffer)
+        except json.JSONDecodeError:
+            return {"has_bill": False, "message": self.buffer.strip()}
+        return result if isinstance(result, dict) else {"has_bill": False, "message": self.buffer.strip()}
+
+    def _read_bills(self) -> List[Dict[str, Any]]:
+        if self._bills_done:
+            return []
+        if self._bills_pos is None:
+            match = BILLS_RE.search(self.buffer)
+            if not match:
+                return []
+            self._bills_pos = match.end()
+
+        events = []
+        while True:
+            pos = self._bills_pos
+            while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n,":
+                pos += 1
+            self._bills_pos = pos
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] == "]":
+                self._bills_done = True
+                break
+            try:
+                bill, end = self._decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break  # 对象还没输出完整，等待后续片段
+            self._bills_pos = end
+            if isinstance(bill, dict):
+                events.append({"type": "bill", "bill": bill})
+        return events
+
+    def _read_message(self) -> List[Dict[str, Any]]:
+        if self._message_done:
+            return []
+        if self._message_pos is None:
+            match = MESSAGE_RE.search(self.buffer)
+            if not match:
+                return []
+            self._message_pos = match.end()
+
+        buffer, pos, chars = self.buffer, self._message_pos, []
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self._message_done = True
+                pos += 1
+                break
+            if char != "\\":
+                chars.append(char)
+                pos += 1
+                continue
+            # 转义序列不完整时停在反斜杠处，等待后续片段
+            if pos + 1 >= len(buffer):
+                break
+            if buffer[pos + 1] != "u":
+                chars.append(JSON_ESCAPES.get(buffer[pos + 1], buffer[pos + 1]))
+                pos += 2
+                continue
+            length = 12 if re.match(r"\\u[dD][89abAB]", buffer[pos:pos + 4]) else 6  # 代理对占两个 \u 转义
+            if pos + length > len(buffer):
+                break
+            chars.append(json.loads('"' + buffer[pos:pos + length] + '"'))
+            pos += length
+        self._message_pos = pos
+        return [{"type": "token", "text": "".join(chars)}] if chars else []
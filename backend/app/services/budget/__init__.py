@@ -0,0 +1,3 @@
+from .forecast import forecast_budget, forecast_budgets, project_daily_spend
+
+__all__ = ["forecast_budget", "forecast_budgets", "project_daily_spend"]
@@ -0,0 +1,91 @@
+"""
+预算消耗速度预测
+
+对预算周期内的日支出序列用最小二乘同时拟合线性趋势与星期季节项，
+预测剩余天数的日支出，得到期末预计支出与预计超支日期。全部计算用 NumPy 向量化完成。
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.models import Budget
+from app.schemas.budget import BudgetForecast
+
+# 至少观测到两周才估计星期季节项，否则只用线性趋势
+MIN_SEASONAL_DAYS = 14
+
+def project_daily_spend(daily: np.ndarray, first_weekday: int, observed: int) -> np.ndarray:
+    """根据前 observed 天的日支出预测整个周期的日支出
+
+    已观测部分原样保留；未来部分为线性趋势加星期季节项，负值截为 0，
+    并且不低于已经记入未来日期的账单金额。
+    """
+    days = np.arange(len(daily))
+    actual = daily[:observed]
+    if observed < 2:
+        fitted = np.full(len(daily), float(actual.mean()) if observed else 0.0)
+    else:
+        # 设计矩阵：截距、线性趋势，观测够两周时再加星期哑变量（以周期首日的星期为基准）
+        columns = [np.ones(len(daily)), days.astype(float)]
+        if observed >= MIN_SEASONAL_DAYS:
+            weekdays = (first_weekday + days) % 7
+            columns.extend((weekdays == weekday).astype(float) for weekday in range(7) if weekday != first_weekday)
+        design = np.column_stack(columns)
+        coefficients, *_ = np.linalg.lstsq(design[:observed], actual, rcond=None)
+        fitted = design @ coefficients
+    
+    projected = np.maximum(np.clip(fitted, 0.0, None), daily)
+    projected[:observed] = actual
+    return projected
+
+def forecast_budget(budget: Budget, daily_totals: Dict[date, float], now: Optional[datetime] = None) -> BudgetForecast:
+    """预测单个预算的期末支出与超支日期
+
+    daily_totals 为预算周期内每天的支出合计（来自聚合查询），今天计入已观测部分。
+    """
+    now = now or datetime.utcnow()
+    start_day, end_day = budget.start_date.date(), budget.end_date.date()
+    period_days = max((end_day - start_day).days + 1, 1)
+    observed = min(max((now.date() - start_day).days + 1, 0), period_days)
+    
+    daily = np.zeros(period_days)
+    for day, total in daily_totals.items():
+        offset = (day - start_day).days
+        if 0 <= offset < period_days:
+            daily[offset] += total
+    
+    projected = project_daily_spend(daily, start_day.weekday(), observed)
+    cumulative = np.cumsum(projected)
+    projected_spent = float(cumulative[-1])
+    
+    expected_exceed_date = None
+    # 按分取整后比较，避免拟合的浮点误差提前一天判定超支
+    over = np.flatnonzero(np.round(cumulative, 2) > budget.amount)
+    if over.size:
+        expected_exceed_date = date.fromordinal(start_day.toordinal() + int(over[0]))
+    
+    return BudgetForecast(
+        budget_id=budget.id,
+        name=budget.name,
+        amount=budget.amount,
+        spent=budget.spent or 0.0,
+        projected_spent=round(projected_spent, 2),
+        projected_remaining=round(budget.amount - projected_spent, 2),
+        daily_rate=round(float(projected[observed:].mean()) if observed < period_days else 0.0, 2),
+        will_exceed=expected_exceed_date is not None,
+        expected_exceed_date=expected_exceed_date,
+        days_remaining=period_days - observed
+    )
+
+def forecast_budgets(
+    budgets: List[Budget],
+    daily_rows: Iterable[Tuple[int, date, float]],
+    now: Optional[datetime] = None
+) -> List[BudgetForecast]:
+    """批量预测，daily_rows 为 (预算ID, 日期, 支出合计) 的聚合结果"""
+    daily_by_budget = defaultdict(dict)
+    for budget_id, day, total in daily_rows:
+        daily_by_budget[budget_id][day] = total or 0.0
+    return [forecast_budget(budget, daily_by_budget[budget.id], now) for budget in budgets]
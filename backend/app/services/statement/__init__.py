@@ -0,0 +1,3 @@
+from .parser import StatementParser, parse_statement
+
+__all__ = ["StatementParser", "parse_statement"]
@@ -0,0 +1,171 @@
+import csv
+import io
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from app.models.enums import BillType
+from app.schemas.bill import BillCreate
+
+# 各平台导出文件的表头别名 -> 统一字段
+HEADER_ALIASES = {
+    "date": ["交易时间", "交易创建时间", "付款时间", "交易日期", "记账日期", "日期", "时间"],
+    "amount": ["金额", "金额(元)", "交易金额", "发生额"],
+    "income_amount": ["收入金额", "收入", "贷方金额", "存入金额"],
+    "expense_amount": ["支出金额", "支出", "借方金额", "取出金额"],
+    "direction": ["收/支", "收支", "收支类型", "借贷标志"],
+    "category": ["交易分类", "分类"],
+    "counterparty": ["交易对方", "对方户名", "对方名称"],
+    "goods": ["商品说明", "商品", "商品名称", "摘要", "交易摘要"],
+    "note": ["备注", "用途"],
+    "status": ["交易状态", "当前状态"],
+}
+ALIAS_TO_FIELD = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+DIRECTION_TYPES = {"支出": BillType.EXPENSE, "借": BillType.EXPENSE, "收入": BillType.INCOME, "贷": BillType.INCOME}
+# 交易未完成的状态关键字，这些行不入账
+SKIPPED_STATUS_KEYWORDS = ("关闭", "失败", "撤销")
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y-%m-%d", "%Y/%m/%d", "%Y%m%d")
+# 表头之前的说明行最多扫描的行数
+MAX_PREAMBLE_LINES = 50
+MAX_REPORTED_ERRORS = 20
+
+def detect_encoding(stream: BinaryIO) -> str:
+    """根据文件开头判断编码：UTF-8（含 BOM）或 GB18030（支付宝、多数银行导出）"""
+    head = stream.read(64 * 1024)
+    stream.seek(0)
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # 截断在多字节字符中间不算解码失败
+        if e.start < len(head) - 3:
+            return "gb18030"
+    return "utf-8-sig"
+
+def _normalize_header(cell: str) -> str:
+    return cell.strip().replace("﻿", "").replace("（", "(").replace("）", ")").replace(" ", "")
+
+def _parse_amount(value: str) -> Optional[float]:
+    value = value.strip().replace(",", "").replace("¥", "").replace("￥", "")
+    if not value or value in ("-", "/"):
+        return None
+    return float(value)
+
+class StatementParser:
+    """流式解析支付宝、微信支付及银行导出的 CSV 账单
+
+    逐行读取文件，按表头别名识别列，迭代输出 BillCreate；无法入账的行计入 skipped，
+    格式错误的行记录在 errors 中（最多保留前 MAX_REPORTED_ERRORS 条）。
+    """
+
+    def __init__(self, stream: BinaryIO, ledger_id: int):
+        self.ledger_id = ledger_id
+        self.encoding = detect_encoding(stream)
+        self.source = "bank"
+        self.skipped = 0
+        self.errors: List[str] = []
+        self._text = io.TextIOWrapper(stream, encoding=self.encoding, errors="replace", newline="")
+        self._reader = csv.reader(self._text)
+        self._columns = self._read_header()
+        self._date_format: Optional[str] = None
+
+    def _read_header(self) -> Dict[str, int]:
+        """跳过导出文件开头的说明行，定位表头"""
+        for _ in range(MAX_PREAMBLE_LINES):
+            row = next(self._reader, None)
+            if row is None:
+                break
+            line = "".join(row)
+            if "支付宝" in line:
+                self.source = "alipay"
+            elif "微信" in line:
+                self.source = "wechat"
+            
+            columns = {}
+            for index, cell in enumerate(row):
+                field = ALIAS_TO_FIELD.get(_normalize_header(cell))
+                if field and field not in columns:
+                    columns[field] = index
+            has_amount = "amount" in columns or ("income_amount" in columns and "expense_amount" in columns)
+            if "date" in columns and has_amount:
+                return columns
+        raise ValueError("无法识别的账单文件格式：未找到包含日期和金额的表头")
+
+    def _parse_date(self, value: str) -> datetime:
+        value = value.strip()
+        # 同一文件日期格式一致，优先使用上次成功的格式
+        formats = (self._date_format,) + DATE_FORMATS if self._date_format else DATE_FORMATS
+        for fmt in formats:
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            self._date_format = fmt
+            return parsed
+        raise ValueError(f"无法解析日期: {value}")
+
+    def _cell(self, row: List[str], field: str) -> str:
+        index = self._columns.get(field)
+        if index is None or index >= len(row):
+            return ""
+        return row[index].strip()
+
+    def _to_bill(self, row: List[str]) -> Optional[BillCreate]:
+        """将一行转换为账单，不应入账的行返回 None"""
+        status = self._cell(row, "status")
+        if any(keyword in status for keyword in SKIPPED_STATUS_KEYWORDS):
+            return None
+        
+        direction = self._cell(row, "direction")
+        if "amount" in self._columns:
+            amount = _parse_amount(self._cell(row, "amount"))
+            if amount is None:
+                return None
+            bill_type = next((t for key, t in DIRECTION_TYPES.items() if key in direction), None)
+            if bill_type is None:
+                if direction:
+                    # "不计收支" 等转账类记录
+                    return None
+                bill_type = BillType.EXPENSE if amount < 0 else BillType.INCOME
+        else:
+            income = _parse_amount(self._cell(row, "income_amount"))
+            expense = _parse_amount(self._cell(row, "expense_amount"))
+            if expense:
+                amount, bill_type = expense, BillType.EXPENSE
+            elif income:
+                amount, bill_type = income, BillType.INCOME
+            else:
+                return None
+        
+        description = " ".join(
+            part for part in (self._cell(row, "counterparty"), self._cell(row, "goods"), self._cell(row, "note"))
+            if part and part != "/"
+        )
+        return BillCreate(
+            amount=abs(amount),
+            type=bill_type,
+            category=self._cell(row, "category") or None,
+            description=description or None,
+            date=self._parse_date(self._cell(row, "date")),
+            ledger_id=self.ledger_id
+        )
+
+    def __iter__(self) -> Iterator[BillCreate]:
+        for row in self._reader:
+            # 跳过空行和文件末尾的汇总说明
+            if not row or not self._cell(row, "date") or self._cell(row, "date").startswith(("-", "#")):
+                continue
+            try:
+                bill = self._to_bill(row)
+            except ValueError as e:
+                self.skipped += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f"第 {self._reader.line_num} 行: {e}")
+                continue
+            if bill is None:
+                self.skipped += 1
+                continue
+            yield bill
+
+def parse_statement(stream: BinaryIO, ledger_id: int) -> StatementParser:
+    """创建账单文件解析器，文件格式无法识别时抛出 ValueError"""
+    return StatementParser(stream, ledger_id)
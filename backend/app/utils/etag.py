@@ -0,0 +1,27 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(version: Any, *parts: Any) -> str:
+    """由账本版本号与请求参数生成弱 ETag
+
+    parts 应包含影响返回内容的全部因素（用户、解析后的查询参数等），版本号变化或参数不同时 ETag 都不同。
+    """
+    digest = hashlib.sha1(repr((version,) + parts).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """为响应设置 ETag；若与请求的 If-None-Match 匹配，返回 304 响应，否则返回 None"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        # 弱比较：忽略 W/ 前缀
+        if "*" in candidates or etag in candidates or etag[2:] in candidates:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
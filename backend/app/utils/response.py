@@ -1,5 +1,8 @@
+import json
 from typing import Any, Optional
 from pydantic import BaseModel
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
 
 class BaseResponse(BaseModel):
     success: bool
@@ -11,9 +14,10 @@ class PaginatedResponse(BaseModel):
     success: bool
     message: str
     data: list[Any]
-    total: int
+    total: Optional[int] = None  # 调用方可跳过计数查询
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
 
 def success_response(data: Any = None, message: str = "操作成功"):
     return BaseResponse(
@@ -30,12 +34,31 @@ def error_response(message: str, error_code: str = None, data: Any = None):
         data=data
     )
 
-def paginated_response(data: list[Any], total: int, skip: int, limit: int, message: str = "获取数据成功"):
+def paginated_response(
+    data: list[Any],
+    total: Optional[int],
+    skip: int,
+    limit: int,
+    message: str = "获取数据成功",
+    next_cursor: Optional[str] = None
+):
     return PaginatedResponse(
         success=True,
         message=message,
         data=data,
         total=total,
         skip=skip,
-        limit=limit
-    ) 
\ No newline at end of file
+        limit=limit,
+        next_cursor=next_cursor
+    )
+
+def raw_success_response(data_json: bytes, message: str = "操作成功") -> Response:
+    """用已序列化的 JSON 数据拼出统一响应格式，跳过响应模型的再次校验与序列化"""
+    head = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    body = b'{"success":true,"message":' + head + b',"data":' + data_json + b',"error_code":null}'
+    return Response(content=body, media_type="application/json")
+
+def sse_event(event: str, data: Any) -> str:
+    """编码一条 Server-Sent Events 消息"""
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
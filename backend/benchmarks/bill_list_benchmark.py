@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+账单列表读取性能基准
+
+对比默认模式（ORM + BillResponse 校验 + 响应模型序列化）与轻量模式（Core 查询直接序列化）
+在 1 万、10 万条账单下的端到端耗时。
+
+用法（在 backend 目录下）:
+    python benchmarks/bill_list_benchmark.py [行数 ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from statistics import median
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.db.database import Base, get_db
+from app.core.security.auth import get_current_user
+from app.models import Bill, BillType, Ledger, User
+
+DEFAULT_SIZES = [10_000, 100_000]
+REPEAT = 3
+
+def seed(session_factory, count):
+    """创建用户、账本和指定数量的账单，返回 (用户ID, 账本ID)"""
+    db = session_factory()
+    user = User(email="bench@example.com", username="bench", hashed_password="x")
+    ledger = Ledger(name="基准账本")
+    db.add_all([user, ledger])
+    db.commit()
+    
+    base = datetime(2020, 1, 1)
+    categories = ["餐饮", "交通", "购物", "娱乐", None]
+    rows = [
+        {
+            "amount": float(i % 500) + 0.5,
+            "type": BillType.EXPENSE if i % 10 else BillType.INCOME,
+            "category": categories[i % len(categories)],
+            "description": f"账单{i}",
+            "date": base + timedelta(minutes=13 * i),
+            "owner_id": user.id,
+            "ledger_id": ledger.id,
+        }
+        for i in range(count)
+    ]
+    db.execute(insert(Bill), rows)
+    db.commit()
+    ids = (user.id, ledger.id)
+    db.close()
+    return ids
+
+def timed(client, params):
+    """多次请求取中位数耗时（毫秒）和响应大小"""
+    durations = []
+    size = 0
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        resp = client.get("/api/v1/bills/", params=params)
+        durations.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200
+        size = len(resp.content)
+    return median(durations), size
+
+def run(count):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        user_id, ledger_id = seed(session_factory, count)
+        
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+        
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: User(id=user_id)
+        try:
+            client = TestClient(app)
+            default_ms, default_size = timed(client, {"ledger_id": ledger_id})
+            lite_ms, lite_size = timed(client, {"ledger_id": ledger_id, "lite": True})
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+    
+    print(f"{count:>8} 行 | 默认 {default_ms:9.1f} ms | 轻量 {lite_ms:9.1f} ms | 提升 {default_ms / lite_ms:5.1f}x"
+          f" | 响应 {default_size / 1024:.0f} KB / {lite_size / 1024:.0f} KB")
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"账单列表读取基准（每项取 {REPEAT} 次中位数）")
+    for count in sizes:
+        run(count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+预算支出全局核对性能基准
+
+对比逐个预算调用 recalculate_budget_spent（按抽样耗时外推）与
+reconcile_budgets 一条 LEFT JOIN + GROUP BY 核对并批量修正全部活跃预算的耗时。
+
+用法（在 backend 目录下）:
+    python benchmarks/budget_reconcile_benchmark.py [预算数 ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.crud.budget import recalculate_budget_spent, reconcile_budgets
+from app.models import Bill, BillType, Budget, BudgetPeriodType, Ledger, User
+
+DEFAULT_SIZES = [10_000, 100_000]
+BUDGETS_PER_LEDGER = 5
+BILLS_PER_LEDGER = 20
+SAMPLE = 500
+
+def seed(session_factory, count):
+    """按每个账本 5 个预算、20 条账单生成数据，约 1% 的预算带有偏差"""
+    db = session_factory()
+    user = User(email="bench@example.com", username="bench", hashed_password="x")
+    db.add(user)
+    db.commit()
+    
+    ledger_count = count // BUDGETS_PER_LEDGER
+    db.execute(insert(Ledger), [{"name": f"账本{i}"} for i in range(ledger_count)])
+    ledger_ids = db.execute(select(Ledger.id).order_by(Ledger.id)).scalars().all()
+    
+    start = datetime(2024, 3, 1)
+    categories = [None, "餐饮", "交通", "购物", "娱乐"]
+    bills = []
+    budgets = []
+    for index, ledger_id in enumerate(ledger_ids):
+        for i in range(BILLS_PER_LEDGER):
+            bills.append({
+                "amount": float(i + 1), "type": BillType.EXPENSE, "category": categories[1 + i % 4],
+                "date": start + timedelta(hours=30 * i), "owner_id": user.id, "ledger_id": ledger_id
+            })
+        for i, category in enumerate(categories):
+            actual = sum(
+                bill["amount"] for bill in bills[-BILLS_PER_LEDGER:]
+                if category is None or bill["category"] == category
+            )
+            budgets.append({
+                "name": f"预算{i}", "amount": 1000.0, "category": category,
+                "spent": actual + (7.0 if (index * BUDGETS_PER_LEDGER + i) % 100 == 0 else 0.0),
+                "period_type": BudgetPeriodType.MONTHLY, "start_date": start,
+                "end_date": datetime(2024, 3, 31, 23, 59, 59), "ledger_id": ledger_id, "created_by": user.id
+            })
+    db.execute(insert(Bill), bills)
+    db.execute(insert(Budget), budgets)
+    db.commit()
+    db.close()
+
+def run(count):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        seed(session_factory, count)
+        
+        db = session_factory()
+        try:
+            budget_ids = db.execute(select(Budget.id).order_by(Budget.id).limit(SAMPLE)).scalars().all()
+            start = time.perf_counter()
+            for budget_id in budget_ids:
+                recalculate_budget_spent(db, budget_id)
+            per_budget = (time.perf_counter() - start) / len(budget_ids)
+            
+            start = time.perf_counter()
+            result = reconcile_budgets(db)
+            reconcile_seconds = time.perf_counter() - start
+        finally:
+            db.close()
+            engine.dispose()
+    
+    print(f"{count:>8} 个预算 | 逐个重算（外推）{per_budget * count:8.1f} s | 全局核对 {reconcile_seconds:6.2f} s"
+          f" | 偏差 {result.drifted} 个")
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"预算支出核对基准（逐个重算按 {SAMPLE} 个预算抽样）")
+    for count in sizes:
+        run(count)
+
+if __name__ == "__main__":
+    main()
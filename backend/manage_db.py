@@ -90,6 +90,88 @@ def create_migration(message):
         print("迁移文件创建成功！")
         print("请检查生成的迁移文件，然后运行 'alembic upgrade head' 应用迁移")
 
+def rebuild_rollups(ledger_id=None):
+    """根据账单表重建按日汇总"""
+    from app.db.database import SessionLocal
+    from app.crud.rollup import rebuild_bill_daily_rollups
+    
+    scope = f"账本 {ledger_id}" if ledger_id else "全部账本"
+    print(f"正在重建{scope}的按日汇总...")
+    db = SessionLocal()
+    try:
+        count = rebuild_bill_daily_rollups(db, ledger_id)
+        print(f"重建完成，共 {count} 条汇总记录")
+    finally:
+        db.close()
+
+def import_statement(path, ledger_id, email):
+    """从支付宝、微信支付或银行导出的 CSV 文件导入账单"""
+    from app.db.database import SessionLocal
+    from app.crud.bill import bulk_import_bills
+    from app.crud.user import get_user_by_email
+    from app.crud.ledger import check_user_ledger_access
+    from app.services.statement import parse_statement
+    
+    db = SessionLocal()
+    try:
+        user = get_user_by_email(db, email)
+        if not user:
+            print(f"用户不存在: {email}")
+            return False
+        
+        # 与 HTTP 导入接口一致：只能导入到用户有权访问的账本
+        if not check_user_ledger_access(db, user.id, ledger_id):
+            print(f"导入失败: 用户 {email} 无权限访问账本 {ledger_id}")
+            return False
+        
+        with open(path, "rb") as f:
+            try:
+                parser = parse_statement(f, ledger_id)
+            except ValueError as e:
+                print(f"导入失败: {e}")
+                return False
+            
+            print(f"识别为 {parser.source} 账单文件（编码 {parser.encoding}），开始导入...")
+            imported = bulk_import_bills(
+                db, parser, user.id,
+                progress=lambda count: print(f"已导入 {count} 条", flush=True)
+            )
+        
+        print(f"导入完成：导入 {imported} 条，跳过 {parser.skipped} 条")
+        for error in parser.errors:
+            print(f"  {error}")
+        return True
+    finally:
+        db.close()
+
+def rollover_budgets():
+    """将已结束的月度/季度/年度预算滚动到下一期（可由定时任务在周期边界重复执行）"""
+    from app.db.database import SessionLocal
+    from app.crud.budget import rollover_budgets as rollover
+    
+    db = SessionLocal()
+    try:
+        count = rollover(db)
+        print(f"预算滚动完成，新建 {count} 个下一期预算")
+    finally:
+        db.close()
+
+def reconcile_budgets(dry_run=False):
+    """核对所有活跃预算的支出并修正偏差"""
+    from app.db.database import SessionLocal
+    from app.crud.budget import reconcile_budgets as reconcile
+    
+    db = SessionLocal()
+    try:
+        result = reconcile(db, fix=not dry_run)
+        print(f"核对 {result.checked} 个活跃预算，{result.drifted} 个存在偏差")
+        for row in result.drifts:
+            print(f"  预算 {row.budget_id}（账本 {row.ledger_id}，{row.name}）: 记录 {row.recorded_spent:.2f}，实际 {row.actual_spent:.2f}，偏差 {row.drift:+.2f}")
+        if result.drifted:
+            print("已修正" if result.fixed else "未修正（--dry-run）")
+    finally:
+        db.close()
+
 def main():
     """主函数"""
     if len(sys.argv) < 2:
@@ -100,6 +182,10 @@ def main():
         print("  python manage_db.py status    # 显示状态")
         print("  python manage_db.py migrate   # 创建新迁移")
         print("  python manage_db.py upgrade   # 应用迁移")
+        print("  python manage_db.py rebuild-rollups [ledger_id]  # 重建账单按日汇总")
+        print("  python manage_db.py import-statement <文件> <ledger_id> <用户邮箱>  # 导入支付宝/微信/银行账单")
+        print("  python manage_db.py rollover-budgets  # 滚动已结束的周期预算（建议 cron 每日执行）")
+        print("  python manage_db.py reconcile-budgets [--dry-run]  # 核对并修正预算支出")
         return
     
     command = sys.argv[1]
@@ -115,9 +201,21 @@ def main():
         create_migration(message)
     elif command == "upgrade":
         run_command("alembic upgrade head", "应用迁移")
+    elif command == "rebuild-rollups":
+        ledger_id = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        rebuild_rollups(ledger_id)
+    elif command == "import-statement":
+        if len(sys.argv) < 5:
+            print("用法: python manage_db.py import-statement <文件> <ledger_id> <用户邮箱>")
+            return
+        import_statement(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    elif command == "rollover-budgets":
+        rollover_budgets()
+    elif command == "reconcile-budgets":
+        reconcile_budgets(dry_run="--dry-run" in sys.argv[2:])
     else:
         print(f"未知命令: {command}")
-        print("可用命令: init, reset, status, migrate, upgrade")
+        print("可用命令: init, reset, status, migrate, upgrade, rebuild-rollups, import-statement, rollover-budgets, reconcile-budgets")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
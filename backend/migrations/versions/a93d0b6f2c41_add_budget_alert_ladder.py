@@ -0,0 +1,41 @@
+"""add budget alert ladder and unique alerts
+
+Revision ID: a93d0b6f2c41
+Revises: f1c6a8e03d72
+Create Date: 2026-10-17 17:48:13.529860
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93d0b6f2c41'
+down_revision: Union[str, None] = 'f1c6a8e03d72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('budgets', sa.Column('alert_thresholds', sa.JSON(), nullable=True))
+
+    # 先清理并发写入产生的重复提醒，每组保留最早的一条
+    op.execute(
+        "DELETE FROM budget_alerts WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM budget_alerts "
+        "GROUP BY budget_id, alert_type, threshold) AS kept)"
+    )
+    with op.batch_alter_table('budget_alerts', schema=None) as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_budget_alerts_budget_type_threshold', ['budget_id', 'alert_type', 'threshold']
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('budget_alerts', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_budget_alerts_budget_type_threshold', type_='unique')
+
+    with op.batch_alter_table('budgets', schema=None) as batch_op:
+        batch_op.drop_column('alert_thresholds')
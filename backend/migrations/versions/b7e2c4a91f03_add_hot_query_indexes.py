@@ -0,0 +1,56 @@
+"""add hot query indexes
+
+Revision ID: b7e2c4a91f03
+Revises: 3344469e1610
+Create Date: 2026-10-17 10:12:40.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2c4a91f03'
+down_revision: Union[str, None] = '3344469e1610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名, 表名, 列)
+INDEXES = [
+    ('ix_bills_ledger_date', 'bills', ['ledger_id', 'date', 'id']),
+    ('ix_bills_ledger_owner_date', 'bills', ['ledger_id', 'owner_id', 'date', 'id']),
+    ('ix_chat_messages_ledger_user_timestamp', 'chat_messages', ['ledger_id', 'user_id', 'timestamp', 'id']),
+    ('ix_user_ledgers_user_ledger_status', 'user_ledgers', ['user_id', 'ledger_id', 'status']),
+    ('ix_user_ledgers_ledger_status', 'user_ledgers', ['ledger_id', 'status']),
+    ('ix_message_bills_message_id', 'message_bills', ['message_id']),
+    ('ix_message_bills_bill_id', 'message_bills', ['bill_id']),
+    ('ix_budgets_ledger_status_period', 'budgets', ['ledger_id', 'status', 'start_date', 'end_date']),
+    ('ix_invitations_invitee_status', 'invitations', ['invitee_email', 'status']),
+    ('ix_invitations_ledger_id', 'invitations', ['ledger_id']),
+]
+
+
+def upgrade() -> None:
+    # PostgreSQL 上使用 CREATE INDEX CONCURRENTLY，避免建索引期间锁表；
+    # CONCURRENTLY 不能在事务中执行，因此放在 autocommit 块里
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True
+            )
@@ -0,0 +1,46 @@
+"""add bill daily rollups
+
+Revision ID: c41d9e7a2b58
+Revises: b7e2c4a91f03
+Create Date: 2026-10-17 14:03:52.470215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d9e7a2b58'
+down_revision: Union[str, None] = 'b7e2c4a91f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('bill_daily_rollups',
+    sa.Column('ledger_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    # billtype 枚举类型已由初始迁移创建
+    sa.Column('type', postgresql.ENUM('EXPENSE', 'INCOME', name='billtype', create_type=False), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('bill_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ledger_id'], ['ledgers.id'], ),
+    sa.PrimaryKeyConstraint('ledger_id', 'day', 'type', 'category')
+    )
+
+    # 根据现有账单回填汇总
+    day = 'date(date)' if op.get_bind().dialect.name == 'sqlite' else 'CAST(date AS DATE)'
+    op.execute(
+        "INSERT INTO bill_daily_rollups (ledger_id, day, type, category, total_amount, bill_count) "
+        f"SELECT ledger_id, {day}, type, COALESCE(category, ''), SUM(amount), COUNT(id) "
+        "FROM bills WHERE date IS NOT NULL "
+        f"GROUP BY ledger_id, {day}, type, COALESCE(category, '')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('bill_daily_rollups')
@@ -0,0 +1,27 @@
+"""add ledger version
+
+Revision ID: d5f83a1c6e27
+Revises: c41d9e7a2b58
+Create Date: 2026-10-17 16:21:08.935114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f83a1c6e27'
+down_revision: Union[str, None] = 'c41d9e7a2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ledgers', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('ledgers', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,39 @@
+"""add budget category index
+
+Revision ID: e8a27c5d4b19
+Revises: d5f83a1c6e27
+Create Date: 2026-10-17 15:42:08.374216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a27c5d4b19'
+down_revision: Union[str, None] = 'd5f83a1c6e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 与热点索引迁移一致，PostgreSQL 上并发建索引避免锁表
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_budgets_ledger_category_status_period', 'budgets',
+            ['ledger_id', 'category', 'status', 'start_date', 'end_date'],
+            unique=False,
+            if_not_exists=True,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_budgets_ledger_category_status_period', table_name='budgets',
+            if_exists=True,
+            postgresql_concurrently=True
+        )
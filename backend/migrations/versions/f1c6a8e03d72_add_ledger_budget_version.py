@@ -0,0 +1,27 @@
+"""add ledger budget version
+
+Revision ID: f1c6a8e03d72
+Revises: e8a27c5d4b19
+Create Date: 2026-10-17 17:06:51.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6a8e03d72'
+down_revision: Union[str, None] = 'e8a27c5d4b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ledgers', sa.Column('budget_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('ledgers', schema=None) as batch_op:
+        batch_op.drop_column('budget_version')
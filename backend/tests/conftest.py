@@ -7,6 +7,7 @@ from sqlalchemy.pool import StaticPool
 from app.main import app
 from app.db.database import get_db, Base
 from app.core.config.settings import settings
+from app.crud.budget_index import clear_budget_indexes
 
 # 使用内存数据库进行测试
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -26,6 +27,13 @@ def override_get_db():
     finally:
         db.close()
 
+@pytest.fixture(autouse=True)
+def reset_budget_indexes():
+    """每个测试都重建数据库，账本ID与预算版本号会重复，需清空进程内预算索引"""
+    clear_budget_indexes()
+    yield
+    clear_budget_indexes()
+
 @pytest.fixture(scope="function")
 def db():
     """提供测试数据库会话"""
@@ -61,4 +69,21 @@ def test_user_data2():
         "email": "test2@example.com",
         "username": "testuser2",
         "password": "testpassword456"
-    } 
\ No newline at end of file
+    }
+
+@pytest.fixture
+def auth_headers(client, test_user_data):
+    """注册并登录，返回认证头"""
+    client.post("/api/v1/register", json=test_user_data)
+    resp = client.post("/api/v1/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    })
+    token = resp.json()["data"]["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def ledger_id(client, auth_headers):
+    """当前用户的个人账本ID"""
+    resp = client.get("/api/v1/ledgers/current", headers=auth_headers)
+    return resp.json()["data"]["current_ledger_id"]
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from app.core.config.settings import settings
+from app.services.ai.cache import AnalysisCache, LocalAnalysisCache, analysis_cache_key, normalize_text
+from app.services.ai.metrics import ai_metrics
+from app.services.ai.service import AIService, ai_service
+from app.services.ai.streaming import StructuredReplyReader
+
+@pytest.fixture(autouse=True)
+def reset_ai_metrics():
+    """AI 指标是进程级全局状态，每个测试前后清空"""
+    ai_metrics.reset()
+    yield
+    ai_metrics.reset()
+
+def slow_call(delay, result, tracker=None):
+    """构造一个阻塞 delay 秒的假 dashscope 调用，tracker 记录同时执行的最大数量"""
+    def call(*args):
+        if tracker is not None:
+            with tracker["lock"]:
+                tracker["running"] += 1
+                tracker["peak"] = max(tracker["peak"], tracker["running"])
+        try:
+            time.sleep(delay)
+            return result
+        finally:
+            if tracker is not None:
+                with tracker["lock"]:
+                    tracker["running"] -= 1
+    return call
+
+class TestAsyncAIService:
+    """AI 调用不阻塞事件循环"""
+
+    def test_calls_run_off_the_event_loop_with_concurrency_cap(self):
+        """测试并发调用受线程数限制，且等待期间事件循环保持响应"""
+        service = AIService(max_concurrency=4, timeout=5)
+        tracker = {"lock": threading.Lock(), "running": 0, "peak": 0}
+        service._analyze_text_sync = slow_call(0.2, {"has_bill": True, "bills": [], "message": "ok"}, tracker)
+
+        async def main():
+            ticks = 0
+            done = asyncio.Event()
+
+            async def ticker():
+                nonlocal ticks
+                while not done.is_set():
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker_task = asyncio.create_task(ticker())
+            start = time.perf_counter()
+            results = await asyncio.gather(*(service.analyze_text(f"午餐{i}元") for i in range(8)))
+            elapsed = time.perf_counter() - start
+            done.set()
+            await ticker_task
+            return results, elapsed, ticks
+
+        results, elapsed, ticks = asyncio.run(main())
+        assert all(result["has_bill"] for result in results)
+        assert tracker["peak"] == 4
+        # 8 个调用分两批执行，约 0.4 秒，远小于串行的 1.6 秒
+        assert elapsed < 1.0
+        assert ticks >= 20
+
+    def test_timeout_returns_fallback(self):
+        """测试超时返回友好提示而不是一直等待"""
+        service = AIService(max_concurrency=2, timeout=0.05)
+        service._analyze_text_sync = slow_call(0.5, {"has_bill": True})
+        service._recognize_voice_sync = slow_call(0.5, {"success": True})
+
+        start = time.perf_counter()
+        result = asyncio.run(service.analyze_text("咖啡13元"))
+        assert time.perf_counter() - start < 0.4
+        assert result["has_bill"] is False and "超时" in result["message"]
+        assert asyncio.run(service.recognize_voice("audio"))["success"] is False
+
+    def test_chat_uses_single_structured_call(self):
+        """测试模型已给出回复时不再追加一般对话调用"""
+        service = AIService(max_concurrency=2, timeout=1)
+        service._analyze_text_sync = slow_call(0, {"has_bill": False, "message": "你好！需要记账吗？"})
+        small_talk = []
+        service._small_talk_sync = lambda message: small_talk.append(message)
+
+        assert asyncio.run(service.chat("你好")) == {"message": "你好！需要记账吗？", "bills": []}
+        assert small_talk == []
+
+    def test_chat_falls_back_when_reply_missing(self):
+        """测试模型没有给出回复时兜底进行一般对话，并计入多次调用指标"""
+        service = AIService(max_concurrency=2, timeout=1)
+        service._analyze_text_sync = slow_call(0, {"has_bill": False, "message": ""})
+        service._small_talk_sync = slow_call(0, {"message": "你好！", "bills": []})
+
+        assert asyncio.run(service.chat("你好")) == {"message": "你好！", "bills": []}
+        service._analyze_text_sync = slow_call(0, {"has_bill": True, "bills": [{"amount": 1}], "message": "已记录"})
+        asyncio.run(service.chat("帮我记一下刚才那笔"))
+
+        metrics = ai_metrics.snapshot()
+        assert metrics["chat_requests"] == 2
+        assert metrics["llm_calls"] == 3
+        assert metrics["multi_call_ratio"] == 0.5
+        assert metrics["latency_p50_ms"] is not None
+
+class TestAnalysisCache:
+    """文本分析结果缓存"""
+
+    def test_normalized_text_shares_cache_key(self):
+        """测试空白、全角和句末标点不同的同一句话命中同一缓存键"""
+        assert normalize_text(" 咖啡 １３。") == normalize_text("咖啡13") == "咖啡13"
+        today = date(2026, 10, 17)
+        assert analysis_cache_key("咖啡 13", today) == analysis_cache_key("咖啡13！", today)
+        # 日期是键的一部分，相对日期跨天后不会命中旧结果
+        assert analysis_cache_key("昨天地铁4元", today) != analysis_cache_key("昨天地铁4元", date(2026, 10, 18))
+
+    def test_repeated_text_skips_llm(self):
+        """测试重复输入命中缓存，不再调用模型，且返回的结果互不影响"""
+        service = AIService(max_concurrency=2, timeout=1, cache=AnalysisCache(LocalAnalysisCache(10, 60)))
+        calls = []
+        service._analyze_text_sync = lambda text: calls.append(text) or {
+            "has_bill": True, "bills": [{"amount": 13, "description": "咖啡"}], "message": "已记录"
+        }
+
+        asyncio.run(service.analyze_text("咖啡 13"))
+        hit = asyncio.run(service.analyze_text("咖啡13"))
+        hit["bills"].clear()
+        again = asyncio.run(service.analyze_text("咖啡13。"))
+
+        assert calls == ["咖啡 13"]
+        assert again["bills"] == [{"amount": 13, "description": "咖啡"}]
+        metrics = ai_metrics.snapshot()
+        assert (metrics["ai_cache_hits"], metrics["ai_cache_misses"]) == (2, 1)
+        assert metrics["ai_cache_hit_rate"] == 2 / 3
+
+    def test_chat_cache_hit_counts_no_llm_call(self):
+        """测试 chat 命中缓存时不计入 LLM 调用次数"""
+        service = AIService(max_concurrency=2, timeout=1, cache=AnalysisCache(LocalAnalysisCache(10, 60)))
+        calls = []
+        service._analyze_text_sync = lambda text: calls.append(text) or {
+            "has_bill": True, "bills": [{"amount": 13, "description": "星巴克"}], "message": "已记录"
+        }
+
+        asyncio.run(service.chat("星巴克 拿铁"))
+        ai_metrics.reset()
+        result = asyncio.run(service.chat("星巴克拿铁"))
+
+        assert calls == ["星巴克 拿铁"]
+        assert result["bills"] == [{"amount": 13, "description": "星巴克"}]
+        metrics = ai_metrics.snapshot()
+        assert metrics["chat_requests"] == 1
+        assert metrics["llm_calls"] == 0
+        assert metrics["multi_call_ratio"] == 0.0
+
+    def test_failures_are_not_cached(self):
+        """测试没有识别出账单的结果不缓存"""
+        service = AIService(max_concurrency=2, timeout=1, cache=AnalysisCache(LocalAnalysisCache(10, 60)))
+        calls = []
+        service._analyze_text_sync = lambda text: calls.append(text) or {"has_bill": False, "message": "抱歉，AI服务暂时不可用"}
+
+        asyncio.run(service.analyze_text("咖啡 13"))
+        asyncio.run(service.analyze_text("咖啡 13"))
+        assert len(calls) == 2
+
+    def test_lru_eviction_and_ttl(self):
+        """测试超过容量时淘汰最久未使用的条目，过期条目视为未命中"""
+        cache = LocalAnalysisCache(maxsize=2, ttl=60)
+
+        async def main():
+            await cache.set("a", "1")
+            await cache.set("b", "2")
+            assert await cache.get("a") == "1"  # a 变为最近使用
+            await cache.set("c", "3")
+            assert await cache.get("b") is None
+            assert await cache.get("a") == "1"
+
+            cache.ttl = 0
+            await cache.set("d", "4")
+            assert await cache.get("d") is None
+
+        asyncio.run(main())
+        assert len(cache) == 1
+        assert ai_metrics.snapshot()["ai_cache_evictions"] == 2
+
+STREAMED_REPLY = json.dumps({
+    "has_bill": True,
+    "bills": [
+        {"amount": 18, "type": "expense", "description": "吃了个午餐", "category": "餐饮", "date": "2026-10-17"},
+        {"amount": 13, "description": "喝了杯\"咖啡\"", "category": "餐饮"},
+    ],
+    "message": "已识别到支出信息：午餐 ¥18，咖啡 ¥13 😊"
+}, ensure_ascii=False)
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def collect(events):
+    async def main():
+        return [event async for event in events]
+    return asyncio.run(main())
+
+class TestChatStream:
+    """流式聊天"""
+
+    @pytest.mark.parametrize("size", [1, 3, 7, 1000])
+    def test_reader_emits_bills_and_tokens_incrementally(self, size):
+        """测试任意切分的流式 JSON 都能增量解析出账单与回复文字"""
+        text = json.dumps(json.loads(STREAMED_REPLY))  # 含 \uXXXX 转义与代理对
+        for raw in (STREAMED_REPLY, text):
+            reader = StructuredReplyReader()
+            events = [event for chunk in chunked(raw, size) for event in reader.feed(chunk)]
+            bills = [event["bill"] for event in events if event["type"] == "bill"]
+            tokens = "".join(event["text"] for event in events if event["type"] == "token")
+            assert bills == json.loads(STREAMED_REPLY)["bills"]
+            assert tokens == "已识别到支出信息：午餐 ¥18，咖啡 ¥13 😊"
+            assert reader.result() == json.loads(STREAMED_REPLY)
+
+    def test_bill_is_emitted_before_stream_finishes(self):
+        """测试账单对象完整后立即产出，不等待整个 JSON"""
+        reader = StructuredReplyReader()
+        head = STREAMED_REPLY[:STREAMED_REPLY.index("}") + 1]
+        assert [event["type"] for event in reader.feed(head)] == ["bill"]
+
+    def test_chat_stream_events(self):
+        """测试 chat_stream 依次产出账单、文字片段和最终结果，并补全账单默认字段"""
+        service = AIService(max_concurrency=2, timeout=1, cache=AnalysisCache(None))
+        service._analyze_text_stream_sync = lambda text: iter(chunked(STREAMED_REPLY, 5))
+
+        events = collect(service.chat_stream("中午吃了个午餐，又喝了杯咖啡"))
+        assert [event["type"] for event in events][-1] == "result"
+        result = events[-1]
+        assert result["message"] == "已识别到支出信息：午餐 ¥18，咖啡 ¥13 😊"
+        assert result["bills"][1]["type"] == "expense"
+        assert result["bills"][1]["date"]
+        assert [event["bill"] for event in events if event["type"] == "bill"] == result["bills"]
+        assert ai_metrics.snapshot()["llm_calls"] == 1
+
+    def test_chat_stream_upstream_error(self):
+        """测试上游流出错时返回兜底回复"""
+        service = AIService(max_concurrency=2, timeout=1, cache=AnalysisCache(None))
+
+        def broken(text):
+            yield '{"has_bill": true, "bi'
+            raise RuntimeError("连接中断")
+
+        service._analyze_text_stream_sync = broken
+        events = collect(service.chat_stream("中午吃了个午餐"))
+        assert events[-1] == {"type": "result", "message": "抱歉，AI服务暂时不可用，请稍后再试。", "bills": []}
+
+    def test_chat_stream_unparsable_tail_keeps_streamed_reply(self):
+        """测试账单已流出但完整输出无法解析时，回复使用已流出的文字而非原始 JSON，且不写入缓存"""
+        cache = AnalysisCache(LocalAnalysisCache(maxsize=8, ttl=60))
+        service = AIService(max_concurrency=2, timeout=1, cache=cache)
+        service._analyze_text_stream_sync = lambda text: iter(chunked(STREAMED_REPLY + "\n以上", 5))
+
+        events = collect(service.chat_stream("中午吃了个午餐，又喝了杯咖啡"))
+        assert events[-1]["message"] == "已识别到支出信息：午餐 ¥18，咖啡 ¥13 😊"
+        assert len(events[-1]["bills"]) == 2
+        assert asyncio.run(cache.get("中午吃了个午餐，又喝了杯咖啡")) is None
+
+    def test_chat_stream_interrupted_after_bills(self):
+        """测试账单已流出、回复文字尚未开始时中断，回复为概括文字"""
+        service = AIService(max_concurrency=2, timeout=1, cache=AnalysisCache(None))
+
+        def broken(text):
+            yield STREAMED_REPLY[:STREAMED_REPLY.index("]") + 1]
+            raise RuntimeError("连接中断")
+
+        service._analyze_text_stream_sync = broken
+        events = collect(service.chat_stream("中午吃了个午餐，又喝了杯咖啡"))
+        assert [event["text"] for event in events if event["type"] == "token"] == ["已识别到财务信息"]
+        assert events[-1]["message"] == "已识别到财务信息"
+        assert len(events[-1]["bills"]) == 2
+
+def read_sse(response):
+    """解析 SSE 响应为 (事件名, 数据) 列表"""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_stream_endpoint_persists_bills_as_they_arrive(client, auth_headers, ledger_id, monkeypatch):
+    """测试流式接口逐笔创建账单并推送，最后返回完整回复"""
+    monkeypatch.setattr(ai_service, "cache", AnalysisCache(None))
+    monkeypatch.setattr(ai_service, "_analyze_text_stream_sync", lambda text: iter(chunked(STREAMED_REPLY, 4)))
+
+    resp = client.post(
+        "/api/v1/chat/stream",
+        json={"message": "中午吃了个午餐，又喝了杯咖啡", "ledger_id": ledger_id},
+        headers=auth_headers
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = read_sse(resp)
+    names = [name for name, _ in events]
+    assert names[0] == "start"
+    assert names[-1] == "final"
+    assert names.count("bill") == 2
+    # 第一笔账单在回复文字之前就已入库推送
+    assert names.index("bill") < names.index("token")
+    bill_ids = [data["id"] for name, data in events if name == "bill"]
+    final = events[-1][1]
+    assert [bill["id"] for bill in final["bills"]] == bill_ids
+    assert "".join(data["text"] for name, data in events if name == "token") == final["message"]
+
+    bills = client.get("/api/v1/bills/", params={"ledger_id": ledger_id}, headers=auth_headers).json()["data"]
+    assert sorted(bill["amount"] for bill in bills) == [13, 18]
+
+def test_stream_endpoint_requires_ledger_access(client, auth_headers):
+    """测试无账本权限时直接返回 403"""
+    resp = client.post("/api/v1/chat/stream", json={"message": "你好", "ledger_id": 9999}, headers=auth_headers)
+    assert resp.status_code == 403
+
+def test_metrics_endpoint_requires_admin_token(client, monkeypatch):
+    """测试指标接口需要管理员令牌"""
+    assert client.get("/api/v1/chat/metrics").status_code == 403
+    monkeypatch.setattr(settings, "admin_token", "secret-token")
+    resp = client.get("/api/v1/chat/metrics", headers={"X-Admin-Token": "secret-token"})
+    assert resp.status_code == 200
+    assert resp.json()["data"]["multi_call_ratio"] == 0.0
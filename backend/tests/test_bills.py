@@ -0,0 +1,335 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from app.crud.bill import create_bill, update_bill, delete_bill, get_ledger_stats, get_ledger_calendar
+from app.crud.budget import create_budget
+from app.crud.rollup import rebuild_bill_daily_rollups
+from app.crud.user import get_user_by_email
+from app.models import Bill, BillType, BillDailyRollup, Budget, BudgetPeriodType
+from app.schemas.bill import BillCreate
+from app.schemas.budget import BudgetCreate
+
+def seed_bills(db, email, ledger_id, count, base_date=None):
+    """批量创建测试账单，每条间隔一小时"""
+    user = get_user_by_email(db, email)
+    base_date = base_date or datetime(2024, 3, 1, 12, 0, 0)
+    bills = []
+    for i in range(count):
+        bills.append(create_bill(db, BillCreate(
+            amount=10 + i,
+            type=BillType.EXPENSE,
+            category="餐饮",
+            description=f"账单{i}",
+            date=base_date + timedelta(hours=i),
+            ledger_id=ledger_id
+        ), user.id))
+    return bills
+
+class TestBillList:
+    """账单列表相关测试"""
+
+    def test_cursor_pagination_walks_all_bills(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试游标分页按 (date, id) 倒序遍历全部账单且不重复"""
+        seed_bills(db, test_user_data["email"], ledger_id, 7)
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"ledger_id": ledger_id, "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            resp = client.get("/api/v1/bills/", params=params, headers=auth_headers)
+            assert resp.status_code == 200
+            page = resp.json()["data"]
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+        # 最新的账单排在最前
+        assert seen == sorted(seen, reverse=True)
+
+    def test_same_timestamp_bills_are_not_skipped(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试同一时间的多条账单在分页边界上不会丢失"""
+        user = get_user_by_email(db, test_user_data["email"])
+        same_time = datetime(2024, 3, 1, 8, 0, 0)
+        for i in range(4):
+            create_bill(db, BillCreate(amount=1, date=same_time, ledger_id=ledger_id), user.id)
+
+        first = client.get("/api/v1/bills/", params={"ledger_id": ledger_id, "limit": 2}, headers=auth_headers).json()["data"]
+        second = client.get("/api/v1/bills/", params={
+            "ledger_id": ledger_id, "limit": 2, "cursor": first["next_cursor"]
+        }, headers=auth_headers).json()["data"]
+
+        ids = [b["id"] for b in first["items"] + second["items"]]
+        assert len(set(ids)) == 4
+        assert second["next_cursor"] is None
+
+    def test_invalid_cursor(self, client, auth_headers, ledger_id):
+        """测试无效游标返回400"""
+        resp = client.get("/api/v1/bills/", params={"ledger_id": ledger_id, "cursor": "not-a-cursor"}, headers=auth_headers)
+        assert resp.status_code == 400
+
+    def test_stream_ndjson(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试流式模式逐行输出全部账单"""
+        seed_bills(db, test_user_data["email"], ledger_id, 5)
+
+        resp = client.get("/api/v1/bills/", params={"ledger_id": ledger_id, "stream": True}, headers=auth_headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+        rows = [json.loads(line) for line in resp.text.splitlines() if line]
+        assert len(rows) == 5
+        assert rows[0]["description"] == "账单4"
+
+    def test_legacy_list_unchanged(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试不带分页参数时仍返回完整列表"""
+        seed_bills(db, test_user_data["email"], ledger_id, 3)
+
+        resp = client.get("/api/v1/bills/", params={"ledger_id": ledger_id}, headers=auth_headers)
+        assert resp.status_code == 200
+        assert isinstance(resp.json()["data"], list)
+        assert len(resp.json()["data"]) == 3
+
+    def test_lite_list_matches_legacy(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试轻量模式返回内容与默认列表完全一致"""
+        seed_bills(db, test_user_data["email"], ledger_id, 4, base_date=datetime(2024, 3, 1, 12, 0, 0, 123456))
+        user = get_user_by_email(db, test_user_data["email"])
+        create_bill(db, BillCreate(amount=5000, type=BillType.INCOME, date=datetime(2024, 3, 2), ledger_id=ledger_id), user.id)
+
+        params = {"ledger_id": ledger_id, "start_date": "2024-03-01T00:00:00", "end_date": "2024-03-31T23:59:59"}
+        legacy = client.get("/api/v1/bills/", params=params, headers=auth_headers)
+        lite = client.get("/api/v1/bills/", params={**params, "lite": True}, headers=auth_headers)
+        assert lite.status_code == 200
+        assert lite.headers["content-type"] == "application/json"
+        assert lite.json() == legacy.json()
+        assert len(lite.json()["data"]) == 5
+
+class TestLedgerStats:
+    """账本统计相关测试"""
+
+    def test_stats_grouped_by_type_and_category(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试统计接口按类型与分类汇总"""
+        user = get_user_by_email(db, test_user_data["email"])
+        day = datetime(2024, 3, 5, 12, 0, 0)
+        for amount, bill_type, category in [
+            (18, BillType.EXPENSE, "餐饮"),
+            (13, BillType.EXPENSE, "餐饮"),
+            (35, BillType.EXPENSE, "交通"),
+            (5000, BillType.INCOME, "工资"),
+            (7, BillType.EXPENSE, None),
+        ]:
+            create_bill(db, BillCreate(amount=amount, type=bill_type, category=category, date=day, ledger_id=ledger_id), user.id)
+
+        resp = client.get("/api/v1/bills/stats", params={
+            "ledger_id": ledger_id,
+            "start_date": "2024-03-01T00:00:00",
+            "end_date": "2024-03-31T23:59:59"
+        }, headers=auth_headers)
+        assert resp.status_code == 200
+        stats = resp.json()["data"]
+        assert stats["total_income"] == 5000
+        assert stats["total_expense"] == 73
+        assert stats["net_amount"] == 4927
+        assert stats["bill_count"] == 5
+        assert stats["time_filter"] == "custom"
+        assert stats["category_stats"]["expense"]["餐饮"] == {"amount": 31, "count": 2}
+        assert stats["category_stats"]["expense"]["其他"] == {"amount": 7, "count": 1}
+        assert stats["category_stats"]["income"]["工资"]["count"] == 1
+
+    def test_stats_requires_ledger_access(self, client, auth_headers):
+        """测试无权限账本返回403"""
+        resp = client.get("/api/v1/bills/stats", params={"ledger_id": 9999}, headers=auth_headers)
+        assert resp.status_code == 403
+
+def rollup_rows(db, ledger_id):
+    """读取账本的按日汇总，返回 {(日期, 类型, 分类): (金额, 笔数)}"""
+    db.expire_all()
+    return {
+        (r.day, r.type, r.category): (r.total_amount, r.bill_count)
+        for r in db.query(BillDailyRollup).filter(BillDailyRollup.ledger_id == ledger_id).all()
+    }
+
+class TestBillDailyRollup:
+    """账单按日汇总相关测试"""
+
+    def test_rollup_follows_bill_writes(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试新增、修改、删除账单时汇总同步更新"""
+        user = get_user_by_email(db, test_user_data["email"])
+        day1 = datetime(2024, 3, 1, 9, 0, 0)
+        day2 = datetime(2024, 3, 2, 9, 0, 0)
+        first = create_bill(db, BillCreate(amount=20, category="餐饮", date=day1, ledger_id=ledger_id), user.id)
+        second = create_bill(db, BillCreate(amount=30, category="餐饮", date=day1, ledger_id=ledger_id), user.id)
+        assert rollup_rows(db, ledger_id) == {(day1.date(), BillType.EXPENSE, "餐饮"): (50, 2)}
+
+        # 改到另一天和另一分类
+        update_bill(db, second.id, user.id, amount=35, category="交通", date=day2)
+        assert rollup_rows(db, ledger_id) == {
+            (day1.date(), BillType.EXPENSE, "餐饮"): (20, 1),
+            (day2.date(), BillType.EXPENSE, "交通"): (35, 1),
+        }
+
+        # 删除后笔数归零的汇总行被清理
+        delete_bill(db, first.id, user.id)
+        assert rollup_rows(db, ledger_id) == {(day2.date(), BillType.EXPENSE, "交通"): (35, 1)}
+
+    def test_rebuild_matches_incremental(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试批量重建结果与增量维护一致"""
+        seed_bills(db, test_user_data["email"], ledger_id, 30)
+        user = get_user_by_email(db, test_user_data["email"])
+        create_bill(db, BillCreate(amount=5000, type=BillType.INCOME, date=datetime(2024, 3, 2), ledger_id=ledger_id), user.id)
+        incremental = rollup_rows(db, ledger_id)
+
+        assert rebuild_bill_daily_rollups(db, ledger_id) == len(incremental)
+        assert rollup_rows(db, ledger_id) == incremental
+
+    def test_stats_from_rollup_match_bills(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试整天范围走汇总表时统计结果与直接聚合账单一致"""
+        seed_bills(db, test_user_data["email"], ledger_id, 40)
+
+        from_rollup = get_ledger_stats(db, ledger_id, datetime(2024, 3, 1), datetime(2024, 3, 2, 23, 59, 59))
+        # 结束时间不在整天边界时回退到账单表
+        from_bills = get_ledger_stats(db, ledger_id, datetime(2024, 3, 1), datetime(2024, 3, 2, 23, 59, 58, 999999))
+        assert from_rollup.bill_count == 36
+        assert from_rollup.total_expense == from_bills.total_expense
+        assert from_rollup.category_stats == from_bills.category_stats
+
+class TestBillExport:
+    """账单导出相关测试"""
+
+    def test_export_csv(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试CSV导出包含表头和全部账单，按时间正序"""
+        seed_bills(db, test_user_data["email"], ledger_id, 5)
+
+        resp = client.get("/api/v1/bills/export", params={"ledger_id": ledger_id}, headers=auth_headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/csv")
+        assert "attachment" in resp.headers["content-disposition"]
+
+        rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        assert rows[0] == ["id", "date", "type", "category", "amount", "description", "owner_id", "ledger_id"]
+        assert len(rows) == 6
+        assert rows[1][2:6] == ["expense", "餐饮", "10.0", "账单0"]
+        assert rows[-1][5] == "账单4"
+
+    def test_export_ndjson_with_date_range(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试NDJSON导出按时间范围筛选"""
+        seed_bills(db, test_user_data["email"], ledger_id, 5)
+
+        resp = client.get("/api/v1/bills/export", params={
+            "ledger_id": ledger_id,
+            "format": "ndjson",
+            "start_date": "2024-03-01T13:00:00",
+            "end_date": "2024-03-01T15:00:00"
+        }, headers=auth_headers)
+        assert resp.status_code == 200
+
+        rows = [json.loads(line) for line in resp.text.splitlines() if line]
+        assert [row["description"] for row in rows] == ["账单1", "账单2", "账单3"]
+        assert rows[0]["date"] == "2024-03-01T13:00:00"
+
+    def test_export_rejects_unknown_format_and_foreign_ledger(self, client, auth_headers, ledger_id):
+        """测试不支持的格式返回400，无权限账本返回403"""
+        resp = client.get("/api/v1/bills/export", params={"ledger_id": ledger_id, "format": "xlsx"}, headers=auth_headers)
+        assert resp.status_code == 400
+        resp = client.get("/api/v1/bills/export", params={"ledger_id": 9999}, headers=auth_headers)
+        assert resp.status_code == 403
+
+class TestBillBatch:
+    """批量账单操作相关测试"""
+
+    def test_batch_mixed_operations(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试一次请求中混合新增、修改、删除并返回逐项结果"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budget = create_budget(db, BudgetCreate(
+            name="三月", amount=100, period_type=BudgetPeriodType.MONTHLY,
+            start_date=datetime(2024, 3, 1), end_date=datetime(2024, 3, 31, 23, 59, 59), ledger_id=ledger_id
+        ), user.id)
+        bills = seed_bills(db, test_user_data["email"], ledger_id, 3)
+        keep_id, edit_id, drop_id = (bill.id for bill in bills)
+
+        resp = client.post("/api/v1/bills/batch", json={"operations": [
+            {"action": "create", "bill": {"amount": 40, "category": "交通", "date": "2024-03-05T10:00:00", "ledger_id": ledger_id}},
+            {"action": "update", "bill_id": edit_id, "changes": {"amount": 50, "category": "购物"}},
+            {"action": "delete", "bill_id": drop_id},
+            {"action": "delete", "bill_id": 999999},
+            {"action": "create", "bill": {"amount": 1, "ledger_id": 9999}},
+        ]}, headers=auth_headers)
+        assert resp.status_code == 200
+        results = resp.json()["data"]
+        assert [r["success"] for r in results] == [True, True, True, False, False]
+        assert results[0]["bill"]["category"] == "交通"
+        assert results[1]["bill"]["amount"] == 50
+        assert results[3]["error"] == "账单不存在或无权限操作"
+
+        db.expire_all()
+        remaining = {bill.id: bill.amount for bill in db.query(Bill).filter(Bill.ledger_id == ledger_id)}
+        assert remaining == {keep_id: 10, edit_id: 50, results[0]["bill_id"]: 40}
+        # 预算按批量结果重新计算一次
+        assert db.get(Budget, budget.id).spent == 100
+        # 汇总与逐条维护的结果一致
+        incremental = rollup_rows(db, ledger_id)
+        rebuild_bill_daily_rollups(db, ledger_id)
+        assert rollup_rows(db, ledger_id) == incremental
+
+    def test_atomic_batch_rolls_back_on_failure(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试 atomic 模式下任一项失败则不写入任何变更"""
+        bill = seed_bills(db, test_user_data["email"], ledger_id, 1)[0]
+
+        resp = client.post("/api/v1/bills/batch", json={"atomic": True, "operations": [
+            {"action": "update", "bill_id": bill.id, "changes": {"amount": 99}},
+            {"action": "delete", "bill_id": 999999},
+        ]}, headers=auth_headers)
+        assert resp.status_code == 200
+        results = resp.json()["data"]
+        assert not any(r["success"] for r in results)
+        assert results[0]["error"] == "批量操作已回滚"
+
+        db.expire_all()
+        assert db.get(Bill, bill.id).amount == 10
+
+class TestLedgerCalendar:
+    """账本日历相关测试"""
+
+    def test_month_calendar_uses_ledger_timezone(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试按账本时区（默认 Asia/Shanghai）分桶"""
+        user = get_user_by_email(db, test_user_data["email"])
+        for amount, bill_type, when in [
+            (20, BillType.EXPENSE, datetime(2024, 3, 1, 10, 0)),   # 北京时间 3月1日 18:00
+            (30, BillType.EXPENSE, datetime(2024, 3, 1, 17, 0)),   # 北京时间 3月2日 01:00
+            (500, BillType.INCOME, datetime(2024, 3, 1, 18, 0)),   # 北京时间 3月2日 02:00
+            (99, BillType.EXPENSE, datetime(2024, 2, 29, 15, 0)),  # 北京时间 2月29日 23:00，不在3月
+        ]:
+            create_bill(db, BillCreate(amount=amount, type=bill_type, date=when, ledger_id=ledger_id), user.id)
+
+        resp = client.get("/api/v1/bills/calendar", params={"ledger_id": ledger_id, "month": "2024-03"}, headers=auth_headers)
+        assert resp.status_code == 200
+        calendar = resp.json()["data"]
+        assert calendar["timezone"] == "Asia/Shanghai"
+        assert calendar["end_date"] == "2024-03-31"
+        assert calendar["days"] == [
+            {"date": "2024-03-01", "income": 0.0, "expense": 20.0, "income_count": 0, "expense_count": 1},
+            {"date": "2024-03-02", "income": 500.0, "expense": 30.0, "income_count": 1, "expense_count": 1},
+        ]
+
+    def test_calendar_across_dst_change(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试夏令时切换前后的日期换算（美东 2024-03-10 切换为 UTC-4）"""
+        user = get_user_by_email(db, test_user_data["email"])
+        for when in [datetime(2024, 3, 9, 4, 30), datetime(2024, 3, 11, 3, 30)]:
+            create_bill(db, BillCreate(amount=1, date=when, ledger_id=ledger_id), user.id)
+
+        calendar = get_ledger_calendar(db, ledger_id, "America/New_York", date(2024, 3, 1), date(2024, 3, 31))
+        # UTC-5 时 04:30 为前一天 23:30；UTC-4 时 03:30 为前一天 23:30
+        assert [day.date for day in calendar.days] == [date(2024, 3, 8), date(2024, 3, 10)]
+
+    def test_calendar_requires_month_or_year(self, client, auth_headers, ledger_id):
+        """测试 month 与 year 必须且只能提供一个"""
+        resp = client.get("/api/v1/bills/calendar", params={"ledger_id": ledger_id}, headers=auth_headers)
+        assert resp.status_code == 400
+        resp = client.get("/api/v1/bills/calendar", params={"ledger_id": ledger_id, "year": 2024}, headers=auth_headers)
+        assert resp.status_code == 200
+        assert resp.json()["data"]["start_date"] == "2024-01-01"
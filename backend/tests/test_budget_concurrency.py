@@ -0,0 +1,132 @@
+"""
+预算支出并发维护测试
+
+多个线程各用独立会话同时写入同一账本的账单，最终预算支出必须等于账单合计（无丢失更新）。
+SQLite 使用文件数据库以便多连接并发；设置 TEST_POSTGRES_URL 环境变量后同时在 PostgreSQL 上运行。
+"""
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.crud.bill import create_bill, update_bill, delete_bill
+from app.models import Bill, BillType, Budget, BudgetPeriodType, Ledger, User
+from app.schemas.bill import BillCreate
+
+WRITERS = 8
+BILLS_PER_WRITER = 15
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def session_factory(request, tmp_path):
+    """提供可供多线程各自建立会话的会话工厂"""
+    if request.param == "sqlite":
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'concurrency.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+    else:
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("未设置 TEST_POSTGRES_URL，跳过 PostgreSQL 并发测试")
+        engine = create_engine(url, pool_size=WRITERS)
+
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+@pytest.fixture
+def shared_ledger(session_factory):
+    """创建共享账本、若干成员及覆盖三月的预算，返回 (账本ID, 成员ID列表, 预算ID)"""
+    db = session_factory()
+    ledger = Ledger(name="共享账本")
+    users = [User(email=f"member{i}@example.com", username=f"member{i}", hashed_password="x") for i in range(WRITERS)]
+    db.add(ledger)
+    db.add_all(users)
+    db.flush()
+    budget = Budget(
+        name="三月预算", amount=10000, spent=0.0, period_type=BudgetPeriodType.MONTHLY,
+        start_date=datetime(2024, 3, 1), end_date=datetime(2024, 3, 31, 23, 59, 59),
+        ledger_id=ledger.id, created_by=users[0].id
+    )
+    db.add(budget)
+    db.commit()
+    ids = (ledger.id, [user.id for user in users], budget.id)
+    db.close()
+    return ids
+
+def run_writers(session_factory, work, user_ids):
+    """每个成员一个线程、一个会话并发执行 work(db, user_id, writer_index)"""
+    def writer(index):
+        db = session_factory()
+        try:
+            work(db, user_ids[index], index)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        for future in [pool.submit(writer, i) for i in range(WRITERS)]:
+            future.result()
+
+def assert_budget_matches_bills(session_factory, ledger_id, budget_id):
+    db = session_factory()
+    try:
+        expected = db.query(func.coalesce(func.sum(Bill.amount), 0.0)).filter(
+            Bill.ledger_id == ledger_id,
+            Bill.type == BillType.EXPENSE,
+            Bill.date >= datetime(2024, 3, 1),
+            Bill.date <= datetime(2024, 3, 31, 23, 59, 59)
+        ).scalar()
+        assert db.get(Budget, budget_id).spent == pytest.approx(expected)
+        return expected
+    finally:
+        db.close()
+
+def test_parallel_creates_do_not_lose_updates(session_factory, shared_ledger):
+    """测试多名成员同时记账时预算支出不丢失"""
+    ledger_id, user_ids, budget_id = shared_ledger
+
+    def work(db, user_id, index):
+        for i in range(BILLS_PER_WRITER):
+            create_bill(db, BillCreate(
+                amount=1 + index, category="餐饮",
+                date=datetime(2024, 3, 1) + timedelta(hours=index * BILLS_PER_WRITER + i),
+                ledger_id=ledger_id
+            ), user_id)
+
+    run_writers(session_factory, work, user_ids)
+    total = assert_budget_matches_bills(session_factory, ledger_id, budget_id)
+    assert total == sum((1 + index) * BILLS_PER_WRITER for index in range(WRITERS))
+
+def test_parallel_mixed_mutations(session_factory, shared_ledger):
+    """测试并发新增、改金额、改日期移出预算区间、改类型与删除后预算支出仍与账单一致"""
+    ledger_id, user_ids, budget_id = shared_ledger
+
+    def work(db, user_id, index):
+        rng = random.Random(index)
+        bills = [
+            create_bill(db, BillCreate(
+                amount=rng.randint(1, 100), date=datetime(2024, 3, rng.randint(1, 31), 12), ledger_id=ledger_id
+            ), user_id)
+            for _ in range(BILLS_PER_WRITER)
+        ]
+        for bill in bills:
+            choice = rng.choice(["amount", "date", "type", "delete", "keep"])
+            if choice == "amount":
+                update_bill(db, bill.id, user_id, amount=rng.randint(1, 100))
+            elif choice == "date":
+                update_bill(db, bill.id, user_id, date=datetime(2024, 4, 2, 12))
+            elif choice == "type":
+                update_bill(db, bill.id, user_id, type=BillType.INCOME)
+            elif choice == "delete":
+                delete_bill(db, bill.id, user_id)
+
+    run_writers(session_factory, work, user_ids)
+    assert_budget_matches_bills(session_factory, ledger_id, budget_id)
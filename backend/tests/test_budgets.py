@@ -0,0 +1,571 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+from app.core.config.settings import settings
+from app.crud.bill import create_bill, update_bill, delete_bill, apply_bill_batch
+from app.crud.budget import (
+    create_budget, update_budget, delete_budget, get_active_budgets_by_category, check_and_create_alerts,
+    get_budget_stats, rollover_budgets, reconcile_budgets, get_budget_spend_curve
+)
+from app.crud.budget_index import BudgetIntervalIndex
+from app.crud.ledger import bump_budget_version
+from app.crud.user import get_user_by_email
+from app.models import AlertType, BillType, Budget, BudgetAlert, BudgetPeriodType, BudgetStatus
+from app.schemas.bill import BillCreate, BillBatchOperation
+from app.schemas.budget import BudgetCreate, BudgetUpdate
+from app.services.budget import forecast_budget, project_daily_spend
+from tests.conftest import TestingSessionLocal
+
+MARCH_START = datetime(2024, 3, 1)
+MARCH_END = datetime(2024, 3, 31, 23, 59, 59)
+
+def make_budget(db, user_id, ledger_id, category=None, amount=1000):
+    return create_budget(db, BudgetCreate(
+        name=f"{category or '全部'}预算", amount=amount, category=category,
+        period_type=BudgetPeriodType.MONTHLY, start_date=MARCH_START, end_date=MARCH_END,
+        ledger_id=ledger_id
+    ), user_id)
+
+def make_bill(db, user_id, ledger_id, amount, category, day=10, bill_type=BillType.EXPENSE):
+    return create_bill(db, BillCreate(
+        amount=amount, type=bill_type, category=category,
+        date=datetime(2024, 3, day, 12), ledger_id=ledger_id
+    ), user_id)
+
+@contextmanager
+def captured_statements(db):
+    """捕获执行期间发出的 SQL 语句"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip())
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def spent(db, budget_id):
+    db.expire_all()
+    return db.get(Budget, budget_id).spent
+
+class TestBudgetCategory:
+    """预算按分类匹配账单"""
+
+    def test_category_budget_only_tracks_matching_bills(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试分类预算只累计同分类支出，分类为空的预算累计全部支出"""
+        user = get_user_by_email(db, test_user_data["email"])
+        food = make_budget(db, user.id, ledger_id, category="餐饮")
+        overall = make_budget(db, user.id, ledger_id)
+
+        make_bill(db, user.id, ledger_id, 30, "餐饮")
+        taxi = make_bill(db, user.id, ledger_id, 20, "交通")
+        make_bill(db, user.id, ledger_id, 500, "餐饮", bill_type=BillType.INCOME)
+        assert spent(db, food.id) == 30
+        assert spent(db, overall.id) == 50
+
+        # 账单改到预算分类后计入分类预算，删除后移出
+        update_bill(db, taxi.id, user.id, category="餐饮")
+        assert spent(db, food.id) == 50
+        assert spent(db, overall.id) == 50
+        delete_bill(db, taxi.id, user.id)
+        assert spent(db, food.id) == 30
+        assert spent(db, overall.id) == 30
+
+    def test_batch_respects_category(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试批量操作按分类更新预算"""
+        user = get_user_by_email(db, test_user_data["email"])
+        food = make_budget(db, user.id, ledger_id, category="餐饮")
+        overall = make_budget(db, user.id, ledger_id)
+
+        apply_bill_batch(db, [
+            BillBatchOperation(action="create", bill=BillCreate(
+                amount=amount, category=category, date=datetime(2024, 3, 5, 12), ledger_id=ledger_id
+            ))
+            for amount, category in [(10, "餐饮"), (15, "购物"), (25, "餐饮")]
+        ], user.id)
+        assert spent(db, food.id) == 35
+        assert spent(db, overall.id) == 50
+
+    def test_create_budget_counts_existing_bills_by_category(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试新建预算时按分类统计已有支出"""
+        user = get_user_by_email(db, test_user_data["email"])
+        make_bill(db, user.id, ledger_id, 40, "餐饮")
+        make_bill(db, user.id, ledger_id, 60, "交通")
+
+        assert make_budget(db, user.id, ledger_id, category="交通").spent == 60
+        assert make_budget(db, user.id, ledger_id).spent == 100
+
+    def test_changing_budget_category_recalculates_spent(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试修改预算分类后重新计算支出"""
+        user = get_user_by_email(db, test_user_data["email"])
+        make_bill(db, user.id, ledger_id, 40, "餐饮")
+        make_bill(db, user.id, ledger_id, 60, "交通")
+        budget = make_budget(db, user.id, ledger_id, category="餐饮")
+        assert budget.spent == 40
+
+        budget = update_budget(db, budget.id, BudgetUpdate(category="交通"))
+        assert budget.spent == 60
+        budget = update_budget(db, budget.id, BudgetUpdate(name="改名不重算"))
+        assert budget.spent == 60
+
+    def test_create_budget_api_accepts_category(self, client, auth_headers, ledger_id):
+        """测试预算接口可以设置分类"""
+        resp = client.post("/api/v1/budgets/", headers=auth_headers, json={
+            "name": "餐饮预算", "amount": 800, "category": "餐饮", "period_type": "monthly",
+            "start_date": MARCH_START.isoformat(), "end_date": MARCH_END.isoformat(),
+            "ledger_id": ledger_id
+        })
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["data"]["category"] == "餐饮"
+
+class TestBudgetIntervalIndex:
+    """进程内活跃预算区间索引"""
+
+    def test_covering_and_overlapping(self):
+        """测试按时间点与区间查询预算，区间端点闭合"""
+        index = BudgetIntervalIndex([
+            (1, None, datetime(2024, 3, 1), datetime(2024, 3, 31)),
+            (2, "餐饮", datetime(2024, 3, 10), datetime(2024, 3, 20)),
+            (3, "交通", datetime(2024, 3, 20), datetime(2024, 4, 30)),
+        ])
+        assert index.covering(datetime(2024, 2, 28), "餐饮") == []
+        assert index.covering(datetime(2024, 3, 1)) == [1]
+        assert sorted(index.covering(datetime(2024, 3, 15), "餐饮")) == [1, 2]
+        assert sorted(index.covering(datetime(2024, 3, 20), "交通")) == [1, 3]
+        assert index.covering(datetime(2024, 4, 1), "交通") == [3]
+        assert index.covering(datetime(2024, 5, 1), "交通") == []
+        assert [row[0] for row in index.overlapping(datetime(2024, 3, 21), datetime(2024, 4, 2), ["餐饮", None])] == [1]
+        assert [row[0] for row in index.overlapping(datetime(2024, 2, 1), datetime(2024, 3, 10), ["餐饮"])] == [1, 2]
+
+    def test_cached_index_skips_budget_query(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试索引命中后记账不再查询预算表"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budget = make_budget(db, user.id, ledger_id)
+        make_bill(db, user.id, ledger_id, 10, "餐饮")
+
+        with captured_statements(db) as statements:
+            make_bill(db, user.id, ledger_id, 20, "餐饮")
+        assert not [sql for sql in statements if sql.startswith("SELECT") and "FROM budgets" in sql and "budgets.id IN" not in sql]
+        assert spent(db, budget.id) == 30
+
+    def test_budget_writes_invalidate_index(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试新建、修改、删除预算后索引失效"""
+        user = get_user_by_email(db, test_user_data["email"])
+        make_bill(db, user.id, ledger_id, 10, "餐饮")
+        assert get_active_budgets_by_category(db, ledger_id, datetime(2024, 3, 10), "餐饮") == []
+
+        budget = make_budget(db, user.id, ledger_id, category="餐饮")
+        assert [b.id for b in get_active_budgets_by_category(db, ledger_id, datetime(2024, 3, 10), "餐饮")] == [budget.id]
+
+        update_budget(db, budget.id, BudgetUpdate(end_date=datetime(2024, 3, 5)))
+        assert get_active_budgets_by_category(db, ledger_id, datetime(2024, 3, 10), "餐饮") == []
+
+        update_budget(db, budget.id, BudgetUpdate(end_date=MARCH_END))
+        make_bill(db, user.id, ledger_id, 5, "餐饮")
+        assert spent(db, budget.id) == 15
+
+        delete_budget(db, budget.id)
+        assert get_active_budgets_by_category(db, ledger_id, datetime(2024, 3, 10), "餐饮") == []
+
+    def test_change_from_another_worker_invalidates_index(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试其它进程写入预算并递增版本号后，本进程缓存的索引会重建"""
+        user = get_user_by_email(db, test_user_data["email"])
+        make_bill(db, user.id, ledger_id, 10, "餐饮")
+        assert get_active_budgets_by_category(db, ledger_id, datetime(2024, 3, 10)) == []
+
+        # 模拟其它 worker：直接写库，不经过本进程的缓存
+        other = TestingSessionLocal()
+        try:
+            budget = Budget(
+                name="其它进程预算", amount=100, spent=10.0, period_type=BudgetPeriodType.MONTHLY,
+                start_date=MARCH_START, end_date=MARCH_END, ledger_id=ledger_id, created_by=user.id
+            )
+            other.add(budget)
+            bump_budget_version(other, ledger_id)
+            other.commit()
+            budget_id = budget.id
+        finally:
+            other.close()
+
+        make_bill(db, user.id, ledger_id, 20, "餐饮")
+        assert spent(db, budget_id) == 30
+
+class TestBudgetAlerts:
+    """预算提醒阈值阶梯"""
+
+    def alerts(self, db, budget_id):
+        db.expire_all()
+        return [
+            (alert.alert_type, alert.threshold)
+            for alert in db.query(BudgetAlert).filter(BudgetAlert.budget_id == budget_id).order_by(BudgetAlert.threshold)
+        ]
+
+    def test_default_ladder(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试默认阶梯：预警阈值、0.95、1.0 各提醒一次，重复越过不重复提醒"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budget = make_budget(db, user.id, ledger_id, amount=100)
+
+        make_bill(db, user.id, ledger_id, 85, "餐饮")
+        make_bill(db, user.id, ledger_id, 1, "餐饮")
+        assert self.alerts(db, budget.id) == [(AlertType.WARNING, 0.8)]
+        make_bill(db, user.id, ledger_id, 10, "餐饮")
+        make_bill(db, user.id, ledger_id, 10, "餐饮")
+        make_bill(db, user.id, ledger_id, 10, "餐饮")
+        assert self.alerts(db, budget.id) == [
+            (AlertType.WARNING, 0.8), (AlertType.CRITICAL, 0.95), (AlertType.EXCEEDED, 1.0)
+        ]
+
+    def test_custom_ladder(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试自定义阶梯，阈值可以超过 1 表示超支比例"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budget = make_budget(db, user.id, ledger_id, amount=100)
+        budget = update_budget(db, budget.id, BudgetUpdate(alert_thresholds=[1.2, 0.5]))
+        assert budget.alert_ladder == [0.5, 1.2]
+
+        make_bill(db, user.id, ledger_id, 60, "餐饮")
+        assert self.alerts(db, budget.id) == [(AlertType.WARNING, 0.5)]
+        make_bill(db, user.id, ledger_id, 45, "餐饮")
+        assert self.alerts(db, budget.id) == [(AlertType.WARNING, 0.5)]
+        make_bill(db, user.id, ledger_id, 20, "餐饮")
+        assert self.alerts(db, budget.id) == [(AlertType.WARNING, 0.5), (AlertType.EXCEEDED, 1.2)]
+
+    def test_alerts_for_many_budgets_in_one_insert(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试多个预算的提醒一条语句写入，重复检查不产生重复行"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budgets = [make_budget(db, user.id, ledger_id, amount=amount) for amount in (100, 50, 20)]
+        for budget in budgets:
+            budget.spent = 40
+        
+        with captured_statements(db) as statements:
+            check_and_create_alerts(db, *budgets)
+        assert len([sql for sql in statements if sql.startswith("INSERT INTO budget_alerts")]) == 1
+        check_and_create_alerts(db, *budgets)
+        db.commit()
+        assert db.query(BudgetAlert).count() == 2
+        assert self.alerts(db, budgets[1].id) == [(AlertType.WARNING, 0.8)]
+        assert self.alerts(db, budgets[2].id) == [(AlertType.EXCEEDED, 1.0)]
+
+    def test_invalid_ladder_rejected(self, client, auth_headers, ledger_id):
+        """测试非法阈值被拒绝"""
+        resp = client.post("/api/v1/budgets/", headers=auth_headers, json={
+            "name": "预算", "amount": 800, "period_type": "monthly", "alert_thresholds": [0, 1.0],
+            "start_date": MARCH_START.isoformat(), "end_date": MARCH_END.isoformat(),
+            "ledger_id": ledger_id
+        })
+        assert resp.status_code == 422
+
+    def test_alert_above_one_is_readable(self, client, auth_headers, ledger_id):
+        """测试超支比例阈值（> 1）触发的提醒能通过提醒列表与总览接口读回"""
+        now = datetime.utcnow()
+        resp = client.post("/api/v1/budgets/", headers=auth_headers, json={
+            "name": "本月预算", "amount": 100, "period_type": "monthly", "alert_thresholds": [0.5, 1.0, 1.2],
+            "start_date": (now - timedelta(days=1)).isoformat(), "end_date": (now + timedelta(days=1)).isoformat(),
+            "ledger_id": ledger_id
+        })
+        assert resp.status_code == 200, resp.text
+        resp = client.post("/api/v1/bills/batch", headers=auth_headers, json={"operations": [
+            {"action": "create", "bill": {
+                "amount": 130, "type": "expense", "category": "餐饮", "date": now.isoformat(), "ledger_id": ledger_id
+            }}
+        ]})
+        assert resp.json()["data"][0]["success"], resp.text
+
+        resp = client.get(f"/api/v1/budgets/ledger/{ledger_id}/alerts", headers=auth_headers)
+        assert resp.status_code == 200, resp.text
+        # 一次越过多级阈值只提醒最高一级
+        assert [(alert["alert_type"], alert["threshold"]) for alert in resp.json()["data"]] == [("exceeded", 1.2)]
+
+        resp = client.get(f"/api/v1/budgets/ledger/{ledger_id}/summary", headers=auth_headers)
+        assert resp.status_code == 200, resp.text
+        assert [alert["threshold"] for alert in resp.json()["data"]["alerts"]] == [1.2]
+
+class TestBudgetStats:
+    """预算统计与总览"""
+
+    def seed(self, db, user_id, ledger_id):
+        now = datetime.utcnow()
+        specs = [
+            # (金额, 已花费, 状态, 是否在周期内, 周期类型)
+            (100, 50, BudgetStatus.ACTIVE, True, BudgetPeriodType.MONTHLY),
+            (100, 85, BudgetStatus.ACTIVE, True, BudgetPeriodType.MONTHLY),
+            (100, 120, BudgetStatus.ACTIVE, True, BudgetPeriodType.YEARLY),
+            (100, 100, BudgetStatus.ACTIVE, True, BudgetPeriodType.CUSTOM),
+            (200, 300, BudgetStatus.ACTIVE, False, BudgetPeriodType.MONTHLY),
+            (500, 10, BudgetStatus.PAUSED, True, BudgetPeriodType.MONTHLY),
+        ]
+        for amount, spent_amount, status, current, period_type in specs:
+            start = now - timedelta(days=1) if current else now - timedelta(days=60)
+            db.add(Budget(
+                name="预算", amount=amount, spent=spent_amount, status=status, period_type=period_type,
+                start_date=start, end_date=start + timedelta(days=30),
+                ledger_id=ledger_id, created_by=user_id
+            ))
+        db.commit()
+
+    def test_stats_single_query(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试统计结果与逐个预算判断一致，且只发出一条查询"""
+        user = get_user_by_email(db, test_user_data["email"])
+        self.seed(db, user.id, ledger_id)
+
+        with captured_statements(db) as statements:
+            stats = get_budget_stats(db, ledger_id)
+        assert len(statements) == 1
+        assert stats.total_budgets == 6
+        assert stats.active_budgets == 4
+        assert stats.total_amount == 600
+        assert stats.total_spent == 655
+        assert stats.total_remaining == 0
+        assert stats.exceeded_count == 1
+        # 85% 与 100%（达到阈值但未超支）计为预警
+        assert stats.warning_count == 2
+
+    def test_summary_fetches_budgets_once(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试预算总览的活跃预算与统计合并为一条查询，统计口径与 /stats 一致"""
+        user = get_user_by_email(db, test_user_data["email"])
+        self.seed(db, user.id, ledger_id)
+
+        with captured_statements(db) as statements:
+            resp = client.get(f"/api/v1/budgets/ledger/{ledger_id}/summary", headers=auth_headers)
+        assert resp.status_code == 200
+        data = resp.json()["data"]
+        assert len(data["monthly_budgets"]) == 3
+        assert len(data["yearly_budgets"]) == 1
+        assert len(data["custom_budgets"]) == 1
+        assert data["stats"] == get_budget_stats(db, ledger_id).model_dump()
+        assert len([sql for sql in statements if "FROM budgets" in sql or "FROM (SELECT count(budgets.id)" in sql]) == 1
+
+class TestBudgetRollover:
+    """周期预算自动滚动"""
+
+    def add_budget(self, db, user_id, ledger_id, period_type, start, end, category=None, status=BudgetStatus.ACTIVE):
+        budget = Budget(
+            name=f"{period_type.value}预算", amount=100, spent=0.0, category=category, period_type=period_type,
+            start_date=start, end_date=end, status=status, ledger_id=ledger_id, created_by=user_id
+        )
+        db.add(budget)
+        db.commit()
+        return budget.id
+
+    def test_rollover_creates_next_period(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试已结束的周期预算过期并生成下一期，期初支出按分类统计，重复运行不重复创建"""
+        user = get_user_by_email(db, test_user_data["email"])
+        monthly = self.add_budget(db, user.id, ledger_id, BudgetPeriodType.MONTHLY,
+                                  datetime(2024, 1, 1), datetime(2024, 1, 31, 23, 59, 59), category="餐饮")
+        quarterly = self.add_budget(db, user.id, ledger_id, BudgetPeriodType.QUARTERLY,
+                                    datetime(2023, 11, 1), datetime(2024, 1, 31, 23, 59, 59))
+        custom = self.add_budget(db, user.id, ledger_id, BudgetPeriodType.CUSTOM,
+                                 datetime(2024, 1, 1), datetime(2024, 1, 15))
+        current = self.add_budget(db, user.id, ledger_id, BudgetPeriodType.YEARLY,
+                                  datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59))
+        for amount, category, day in [(30, "餐饮", 3), (20, "交通", 5), (500, "餐饮", 10)]:
+            create_bill(db, BillCreate(amount=amount, category=category, date=datetime(2024, 2, day, 12), ledger_id=ledger_id), user.id)
+
+        assert rollover_budgets(db, now=datetime(2024, 2, 5)) == 2
+        db.expire_all()
+        assert db.get(Budget, monthly).status == BudgetStatus.EXPIRED
+        assert db.get(Budget, quarterly).status == BudgetStatus.EXPIRED
+        assert db.get(Budget, custom).status == BudgetStatus.ACTIVE
+        assert db.get(Budget, current).status == BudgetStatus.ACTIVE
+
+        created = {
+            budget.period_type: budget
+            for budget in db.query(Budget).filter(Budget.id.notin_([monthly, quarterly, custom, current]))
+        }
+        assert (created[BudgetPeriodType.MONTHLY].start_date, created[BudgetPeriodType.MONTHLY].end_date) == (
+            datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59, 59)
+        )
+        assert created[BudgetPeriodType.MONTHLY].category == "餐饮"
+        assert created[BudgetPeriodType.MONTHLY].spent == 530
+        assert (created[BudgetPeriodType.QUARTERLY].start_date, created[BudgetPeriodType.QUARTERLY].end_date) == (
+            datetime(2024, 2, 1), datetime(2024, 4, 30, 23, 59, 59)
+        )
+        assert created[BudgetPeriodType.QUARTERLY].spent == 550
+        # 期初即超支的预算生成提醒
+        assert db.query(BudgetAlert).filter(BudgetAlert.budget_id == created[BudgetPeriodType.MONTHLY].id).count() == 1
+
+        assert rollover_budgets(db, now=datetime(2024, 2, 5)) == 0
+        assert db.query(Budget).count() == 6
+
+        # 新预算已进入预算索引
+        create_bill(db, BillCreate(amount=5, category="餐饮", date=datetime(2024, 2, 20), ledger_id=ledger_id), user.id)
+        assert spent(db, created[BudgetPeriodType.MONTHLY].id) == 535
+
+    def test_rollover_skips_missed_periods(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试长时间未运行时直接生成包含当前时间的一期"""
+        user = get_user_by_email(db, test_user_data["email"])
+        self.add_budget(db, user.id, ledger_id, BudgetPeriodType.MONTHLY, datetime(2024, 1, 31), datetime(2024, 2, 29))
+
+        assert rollover_budgets(db, now=datetime(2024, 5, 10)) == 1
+        budget = db.query(Budget).filter(Budget.status == BudgetStatus.ACTIVE).one()
+        assert (budget.start_date, budget.end_date) == (datetime(2024, 4, 30), datetime(2024, 5, 31))
+
+class TestBudgetForecast:
+    """预算消耗速度预测"""
+
+    def test_linear_trend(self):
+        """测试线性增长的日支出按趋势外推"""
+        daily = np.zeros(10)
+        daily[:5] = [10, 12, 14, 16, 18]
+        projected = project_daily_spend(daily, 0, 5)
+        assert np.allclose(projected, [10, 12, 14, 16, 18, 20, 22, 24, 26, 28])
+
+    def test_weekday_seasonality(self):
+        """测试周末支出高的规律延续到未来"""
+        week = [10, 10, 10, 10, 10, 40, 40]
+        daily = np.zeros(35)
+        daily[:21] = week * 3
+        projected = project_daily_spend(daily, 0, 21)
+        assert np.allclose(projected[21:28], week, atol=1e-6)
+
+    def test_future_dated_bills_are_kept(self):
+        """测试已记入未来日期的支出不会被预测值覆盖"""
+        daily = np.zeros(6)
+        daily[:2] = [5, 5]
+        daily[4] = 100
+        projected = project_daily_spend(daily, 0, 2)
+        assert projected[4] == 100
+        assert projected[5] == pytest.approx(5)
+
+    def test_forecast_exceed_date(self):
+        """测试预计超支日期与期末支出"""
+        budget = Budget(id=1, name="三月预算", amount=1000, spent=500,
+                        start_date=MARCH_START, end_date=MARCH_END)
+        daily = {datetime(2024, 3, day).date(): 50 for day in range(1, 11)}
+        forecast = forecast_budget(budget, daily, now=datetime(2024, 3, 10, 18))
+        assert forecast.projected_spent == pytest.approx(1550)
+        assert forecast.daily_rate == pytest.approx(50)
+        assert forecast.will_exceed
+        assert forecast.expected_exceed_date == datetime(2024, 3, 21).date()
+        assert forecast.days_remaining == 21
+
+        calm = forecast_budget(budget, {day: 10 for day in daily}, now=datetime(2024, 3, 10, 18))
+        assert calm.projected_spent == pytest.approx(310)
+        assert not calm.will_exceed and calm.expected_exceed_date is None
+
+    def test_ledger_forecast_endpoint(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试账本批量预测只用一条聚合查询取日支出序列"""
+        user = get_user_by_email(db, test_user_data["email"])
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        budgets = [
+            create_budget(db, BudgetCreate(
+                name=name, amount=100, category=category, period_type=BudgetPeriodType.CUSTOM,
+                start_date=today - timedelta(days=4), end_date=today + timedelta(days=5, hours=23),
+                ledger_id=ledger_id
+            ), user.id)
+            for name, category in [("全部", None), ("餐饮", "餐饮")]
+        ]
+        for offset in range(5):
+            create_bill(db, BillCreate(amount=15, category="交通", date=today - timedelta(days=offset, hours=-12), ledger_id=ledger_id), user.id)
+            create_bill(db, BillCreate(amount=5, category="餐饮", date=today - timedelta(days=offset, hours=-12), ledger_id=ledger_id), user.id)
+
+        with captured_statements(db) as statements:
+            resp = client.get(f"/api/v1/budgets/ledger/{ledger_id}/forecast", headers=auth_headers)
+        assert resp.status_code == 200
+        forecasts = {item["budget_id"]: item for item in resp.json()["data"]}
+        assert forecasts[budgets[0].id]["projected_spent"] == pytest.approx(200)
+        assert forecasts[budgets[0].id]["will_exceed"]
+        assert forecasts[budgets[1].id]["projected_spent"] == pytest.approx(50)
+        assert not forecasts[budgets[1].id]["will_exceed"]
+        assert len([sql for sql in statements if "JOIN bills" in sql and "GROUP BY" in sql]) == 1
+
+        resp = client.get(f"/api/v1/budgets/{budgets[1].id}/forecast", headers=auth_headers)
+        assert resp.status_code == 200
+        assert resp.json()["data"]["projected_spent"] == pytest.approx(50)
+
+    def test_forecast_and_summary_include_all_active_budgets(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试批量预测与总览不受列表接口默认分页上限（100）截断"""
+        user = get_user_by_email(db, test_user_data["email"])
+        today = datetime.utcnow()
+        for i in range(105):
+            create_budget(db, BudgetCreate(
+                name=f"预算{i}", amount=100, period_type=BudgetPeriodType.CUSTOM,
+                start_date=today - timedelta(days=1), end_date=today + timedelta(days=1),
+                ledger_id=ledger_id
+            ), user.id)
+
+        resp = client.get(f"/api/v1/budgets/ledger/{ledger_id}/forecast", headers=auth_headers)
+        assert len(resp.json()["data"]) == 105
+        resp = client.get(f"/api/v1/budgets/ledger/{ledger_id}/summary", headers=auth_headers)
+        assert len(resp.json()["data"]["custom_budgets"]) == 105
+
+class TestBudgetReconcile:
+    """预算支出全局核对"""
+
+    def test_reconcile_reports_and_fixes_drift(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试报告并修正偏差，修正后再次核对无偏差"""
+        user = get_user_by_email(db, test_user_data["email"])
+        food = make_budget(db, user.id, ledger_id, category="餐饮")
+        overall = make_budget(db, user.id, ledger_id)
+        empty = make_budget(db, user.id, ledger_id, category="旅行")
+        make_bill(db, user.id, ledger_id, 30, "餐饮")
+        make_bill(db, user.id, ledger_id, 20, "交通")
+        db.query(Budget).filter(Budget.id == food.id).update({Budget.spent: 5})
+        db.query(Budget).filter(Budget.id == empty.id).update({Budget.spent: 12})
+        db.commit()
+
+        report = reconcile_budgets(db, fix=False)
+        assert report.checked == 3
+        assert [(row.budget_id, row.recorded_spent, row.actual_spent, row.drift) for row in report.drifts] == [
+            (food.id, 5, 30, 25), (empty.id, 12, 0, -12)
+        ]
+        assert spent(db, food.id) == 5
+
+        with captured_statements(db) as statements:
+            report = reconcile_budgets(db)
+        assert report.fixed and report.drifted == 2
+        assert len([sql for sql in statements if "GROUP BY" in sql]) == 1
+        assert (spent(db, food.id), spent(db, overall.id), spent(db, empty.id)) == (30, 50, 0)
+        assert reconcile_budgets(db).drifted == 0
+
+    def test_admin_endpoint_requires_token(self, client, auth_headers, monkeypatch):
+        """测试管理接口需要 X-Admin-Token"""
+        assert client.post("/api/v1/budgets/admin/reconcile", headers=auth_headers).status_code == 403
+
+        monkeypatch.setattr(settings, "admin_token", "secret-token")
+        assert client.post("/api/v1/budgets/admin/reconcile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        resp = client.post("/api/v1/budgets/admin/reconcile", params={"dry_run": True}, headers={"X-Admin-Token": "secret-token"})
+        assert resp.status_code == 200
+        assert resp.json()["data"]["fixed"] is False
+
+class TestBudgetSpendCurve:
+    """预算累计支出曲线"""
+
+    def seed(self, db, user_id, ledger_id):
+        budget = make_budget(db, user_id, ledger_id, category="餐饮")
+        for amount, category, day in [(10, "餐饮", 1), (5, "餐饮", 1), (20, "餐饮", 4), (99, "交通", 4), (7, "餐饮", 12)]:
+            make_bill(db, user_id, ledger_id, amount, category, day=day)
+        return budget
+
+    def test_daily_curve(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试按天累计，空白日期沿用上一天的累计值，截止到今天"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budget = self.seed(db, user.id, ledger_id)
+        db.refresh(budget)
+
+        with captured_statements(db) as statements:
+            curve = get_budget_spend_curve(db, budget, "day", now=datetime(2024, 3, 13, 9))
+        assert len(statements) == 1 and "OVER (ORDER BY" in statements[0]
+        assert curve.labels == [datetime(2024, 3, day).date() for day in range(1, 14)]
+        assert curve.cumulative == [15, 15, 15, 35, 35, 35, 35, 35, 35, 35, 35, 42, 42]
+
+    def test_weekly_curve_endpoint(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试按周累计（周一开始），周期结束后曲线覆盖整个周期"""
+        user = get_user_by_email(db, test_user_data["email"])
+        budget = self.seed(db, user.id, ledger_id)
+
+        resp = client.get(f"/api/v1/budgets/{budget.id}/history", params={"granularity": "week"}, headers=auth_headers)
+        assert resp.status_code == 200
+        data = resp.json()["data"]
+        # 2024-03-01 是周五，所在周从 2 月 26 日开始
+        assert data["labels"] == ["2024-02-26", "2024-03-04", "2024-03-11", "2024-03-18", "2024-03-25"]
+        assert data["cumulative"] == [15, 35, 42, 42, 42]
+
+        resp = client.get(f"/api/v1/budgets/{budget.id}/history", params={"granularity": "month"}, headers=auth_headers)
+        assert resp.status_code == 400
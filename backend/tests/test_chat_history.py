@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app.models import Bill, ChatMessage, MessageBill, User
+from app.models.enums import BillType
+
+@contextmanager
+def captured_statements(db):
+    """捕获执行期间发出的 SQL 语句"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip())
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def seed_messages(db, ledger_id, email, count, bills_per_message=2):
+    """创建 count 条消息（部分时间戳相同），每条关联若干账单，返回按新到旧排列的消息ID"""
+    user = db.query(User).filter(User.email == email).first()
+    messages = []
+    for i in range(count):
+        message = ChatMessage(
+            content=f"消息{i}",
+            message_type="assistant",
+            user_id=user.id,
+            ledger_id=ledger_id,
+            timestamp=datetime(2024, 6, 1, 12, i // 2)  # 每两条共用一个时间戳，验证 id 作为次序
+        )
+        db.add(message)
+        db.flush()
+        for j in range(bills_per_message):
+            bill = Bill(
+                amount=10 * i + j, type=BillType.EXPENSE, category="餐饮", description=f"账单{i}-{j}",
+                date=datetime(2024, 6, 1), owner_id=user.id, ledger_id=ledger_id
+            )
+            db.add(bill)
+            db.flush()
+            db.add(MessageBill(message_id=message.id, bill_id=bill.id))
+        messages.append(message)
+    db.commit()
+    return [message.id for message in sorted(messages, key=lambda m: (m.timestamp, m.id), reverse=True)]
+
+class TestChatHistory:
+    """聊天历史分页"""
+
+    def test_cursor_pagination_walks_all_messages(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试游标分页按 (timestamp, id) 从新到旧不重不漏"""
+        expected = seed_messages(db, ledger_id, test_user_data["email"], 5)
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, "include_total": False}
+            if cursor:
+                params["cursor"] = cursor
+            body = client.get(f"/api/v1/chat/history/{ledger_id}", params=params, headers=auth_headers).json()
+            assert body["total"] is None
+            seen.extend(message["id"] for message in body["data"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+
+        assert seen == expected
+        first = client.get(f"/api/v1/chat/history/{ledger_id}", params={"limit": 1}, headers=auth_headers).json()
+        assert first["total"] == 5
+        assert [bill["description"] for bill in first["data"][0]["bills"]] == ["账单4-0", "账单4-1"]
+
+    def test_history_query_count_does_not_grow_with_messages(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试关联账单预加载，查询次数与消息数无关，且可跳过计数查询"""
+        seed_messages(db, ledger_id, test_user_data["email"], 10)
+
+        with captured_statements(db) as statements:
+            resp = client.get(
+                f"/api/v1/chat/history/{ledger_id}", params={"limit": 10, "include_total": False}, headers=auth_headers
+            )
+        assert resp.status_code == 200
+        assert sum(len(message["bills"]) for message in resp.json()["data"]) == 20
+
+        history_queries = [s for s in statements if "chat_messages" in s or "message_bills" in s]
+        assert len(history_queries) == 2
+        assert not any("count(" in s for s in statements)
+
+    def test_invalid_cursor(self, client, auth_headers, ledger_id):
+        """测试非法游标返回 400"""
+        resp = client.get(f"/api/v1/chat/history/{ledger_id}", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+        assert resp.status_code == 400
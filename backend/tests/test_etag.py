@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app.crud.bill import create_bill
+from app.crud.user import get_user_by_email
+from app.models import Ledger
+from app.schemas.bill import BillCreate
+from tests.conftest import engine
+
+def add_bill(db, email, ledger_id, amount=10):
+    user = get_user_by_email(db, email)
+    return create_bill(db, BillCreate(amount=amount, category="餐饮", date=datetime(2024, 3, 1, 12), ledger_id=ledger_id), user.id)
+
+class TestETag:
+    """ETag / If-None-Match 相关测试"""
+
+    def test_bills_not_modified_skips_bills_table(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试数据未变化时返回304且不查询账单表"""
+        add_bill(db, test_user_data["email"], ledger_id)
+        params = {"ledger_id": ledger_id}
+        first = client.get("/api/v1/bills/", params=params, headers=auth_headers)
+        etag = first.headers["etag"]
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            second = client.get("/api/v1/bills/", params=params, headers={**auth_headers, "If-None-Match": etag})
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert not any("FROM bills" in statement for statement in statements)
+
+    def test_bill_write_changes_etag(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试新增账单后版本号递增，旧ETag失效"""
+        params = {"ledger_id": ledger_id}
+        etag = client.get("/api/v1/bills/", params=params, headers=auth_headers).headers["etag"]
+        version = db.get(Ledger, ledger_id).version
+
+        add_bill(db, test_user_data["email"], ledger_id)
+        db.expire_all()
+        assert db.get(Ledger, ledger_id).version > version
+
+        resp = client.get("/api/v1/bills/", params=params, headers={**auth_headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+        assert len(resp.json()["data"]) == 1
+
+    def test_etag_depends_on_query(self, client, auth_headers, ledger_id):
+        """测试不同查询参数得到不同ETag"""
+        all_bills = client.get("/api/v1/bills/", params={"ledger_id": ledger_id}, headers=auth_headers)
+        month = client.get("/api/v1/bills/", params={"ledger_id": ledger_id, "time_filter": "month"}, headers=auth_headers)
+        assert all_bills.headers["etag"] != month.headers["etag"]
+
+    def test_budget_and_ledger_reads(self, client, auth_headers, ledger_id):
+        """测试预算列表与账本信息在相应变更后ETag变化"""
+        budgets_etag = client.get("/api/v1/budgets/", params={"ledger_id": ledger_id}, headers=auth_headers).headers["etag"]
+        resp = client.get("/api/v1/budgets/", params={"ledger_id": ledger_id}, headers={**auth_headers, "If-None-Match": budgets_etag})
+        assert resp.status_code == 304
+
+        client.post("/api/v1/budgets/", json={
+            "name": "月度预算", "amount": 1000, "period_type": "monthly",
+            "start_date": "2024-03-01T00:00:00", "end_date": "2024-03-31T23:59:59", "ledger_id": ledger_id
+        }, headers=auth_headers)
+        resp = client.get("/api/v1/budgets/", params={"ledger_id": ledger_id}, headers={**auth_headers, "If-None-Match": budgets_etag})
+        assert resp.status_code == 200
+
+        ledger_etag = client.get(f"/api/v1/ledgers/{ledger_id}", headers=auth_headers).headers["etag"]
+        client.put(f"/api/v1/ledgers/{ledger_id}", json={"name": "新名字"}, headers=auth_headers)
+        resp = client.get(f"/api/v1/ledgers/{ledger_id}", headers={**auth_headers, "If-None-Match": ledger_etag})
+        assert resp.status_code == 200
+        assert resp.json()["data"]["name"] == "新名字"
+
+    def test_members_not_cached_across_profile_changes(self, client, db, auth_headers, ledger_id, test_user_data):
+        """测试成员列表不带 ETag，用户资料变化后立即可见"""
+        resp = client.get(f"/api/v1/ledgers/{ledger_id}/members", headers=auth_headers)
+        assert "etag" not in resp.headers
+
+        user = get_user_by_email(db, test_user_data["email"])
+        user.username = "新用户名"
+        db.commit()
+        resp = client.get(f"/api/v1/ledgers/{ledger_id}/members", headers={**auth_headers, "If-None-Match": "*"})
+        assert resp.status_code == 200
+        assert resp.json()["data"]["members"][0]["user"]["username"] == "新用户名"
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from datetime import date
+
+import pytest
+
+from app.services.ai.local_parser import chinese_to_number, parse_bill_text
+from app.services.ai.metrics import ai_metrics
+from app.services.ai.service import AIService
+
+TODAY = date(2026, 10, 17)  # 星期六
+
+@pytest.mark.parametrize("text, expected", [
+    ("十", 10), ("十八", 18), ("二十", 20), ("一百零五", 105), ("一百二", 120),
+    ("两千五", 2500), ("三万五", 35000), ("三点五", 3.5), ("一二", None),
+])
+def test_chinese_to_number(text, expected):
+    """测试中文数字转换，包括口语省略末位单位"""
+    assert chinese_to_number(text) == expected
+
+@pytest.mark.parametrize("text, amount", [
+    ("咖啡三块五", 3.5), ("奶茶3块5", 3.5), ("奶茶3元5角", 3.5), ("五毛买纸巾", 0.5),
+    ("工资1.2万", 12000), ("奖金3k", 3000), ("房租两千五百元", 2500), ("打车 35", 35),
+    ("午餐18块钱", 18), ("买书30", 30),
+])
+def test_amounts(text, amount):
+    """测试各种金额写法"""
+    result = parse_bill_text(text, TODAY)
+    assert result is not None
+    assert [bill["amount"] for bill in result["bills"]] == [amount]
+
+class TestLocalParser:
+    """本地账单解析"""
+
+    def test_multiple_items(self):
+        """测试一句话中的多笔账单"""
+        result = parse_bill_text("午餐18块，咖啡13元", TODAY)
+        assert result == {
+            "has_bill": True,
+            "bills": [
+                {"amount": 18, "type": "expense", "description": "午餐", "category": "餐饮", "date": "2026-10-17"},
+                {"amount": 13, "type": "expense", "description": "咖啡", "category": "餐饮", "date": "2026-10-17"},
+            ],
+            "message": "已识别到支出信息：午餐 ¥18，咖啡 ¥13"
+        }
+
+    @pytest.mark.parametrize("text, expected", [
+        ("昨天打车35", "2026-10-16"),
+        ("前天午饭20", "2026-10-15"),
+        ("上周二加油300", "2026-10-06"),
+        ("周三买衣服200", "2026-10-14"),
+        ("3月5日买衣服200元", "2026-03-05"),
+        ("2025-12-31 聚餐300", "2025-12-31"),
+    ])
+    def test_relative_dates(self, text, expected):
+        """测试相对日期与具体日期"""
+        assert parse_bill_text(text, TODAY)["bills"][0]["date"] == expected
+
+    def test_date_carries_to_following_items(self):
+        """测试日期作用于后续没有写日期的项目"""
+        result = parse_bill_text("昨天，午餐18还有奶茶十五块", TODAY)
+        assert [(bill["description"], bill["date"]) for bill in result["bills"]] == [
+            ("午餐", "2026-10-16"), ("奶茶", "2026-10-16")
+        ]
+
+    def test_income_and_expense(self):
+        """测试收入关键词与混合类型的回复"""
+        result = parse_bill_text("工资8000，发红包200", TODAY)
+        assert [(bill["type"], bill["category"]) for bill in result["bills"]] == [
+            ("income", "工资"), ("expense", "人情")
+        ]
+        assert result["message"].startswith("已识别到财务信息")
+
+    @pytest.mark.parametrize("text", [
+        "你好", "今天好累", "帮我看看这个月花了多少", "三明治15元", "买了3个苹果15元",
+        "午餐18块咖啡13元", "今天好累，午餐18", "2026-02-30 午餐18", "红包200",
+        # 收入/卖出动词会改变收支方向
+        "收到房租3000", "卖了二手书30", "工资到账8000",
+        # 否定、退款与借还
+        "不是午餐18", "退了咖啡13", "借给朋友午饭钱50", "还信用卡2000",
+        # 单字关键词不按子串匹配
+        "面膜50", "书包120",
+        # 本地不支持的日期说法
+        "明天午餐20", "下周一加油300", "上个月房租3000", "15号聚餐200",
+    ])
+    def test_uncertain_text_falls_through(self, text):
+        """测试无法确定的语句返回 None，交给大模型处理"""
+        assert parse_bill_text(text, TODAY) is None
+
+    def test_parse_is_fast(self):
+        """测试本地解析耗时在微秒级"""
+        start = time.perf_counter()
+        for _ in range(1000):
+            parse_bill_text("昨天午餐18块，咖啡三块五", TODAY)
+        assert (time.perf_counter() - start) / 1000 < 0.001
+
+    def test_chat_skips_llm_for_confident_parse(self):
+        """测试能本地解析的聊天消息不调用大模型，并计入命中指标"""
+        ai_metrics.reset()
+        service = AIService(max_concurrency=2, timeout=1)
+
+        def fail(*args):
+            raise AssertionError("不应调用大模型")
+
+        service._analyze_text_sync = fail
+        result = asyncio.run(service.chat("午餐18块，咖啡13元"))
+        assert [bill["amount"] for bill in result["bills"]] == [18, 13]
+
+        metrics = ai_metrics.snapshot()
+        ai_metrics.reset()
+        assert metrics["local_parser_hits"] == 1
+        assert metrics["llm_calls"] == 0
+        assert metrics["local_parser_ratio"] == 1.0
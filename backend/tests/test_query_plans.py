@@ -0,0 +1,138 @@
+"""
+查询计划回归测试
+
+执行各热点 CRUD 查询并捕获实际发出的 SQL，再对每条语句运行 EXPLAIN，
+一旦某条查询退化为全表扫描即失败。
+
+SQLite 始终运行；设置 TEST_POSTGRES_URL 环境变量后同时在 PostgreSQL 上运行。
+"""
+import os
+import re
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+from app.crud import bill as bill_crud
+from app.crud import budget as budget_crud
+from app.crud import chat as chat_crud
+from app.crud import invitation as invitation_crud
+from app.crud import ledger as ledger_crud
+from app.models import Budget
+from app.utils.pagination import encode_cursor
+
+TABLES = set(Base.metadata.tables)
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def plan_db(request):
+    """提供建好表结构的数据库会话"""
+    if request.param == "sqlite":
+        engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("未设置 TEST_POSTGRES_URL，跳过 PostgreSQL 查询计划测试")
+        engine = create_engine(url)
+
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+@contextmanager
+def captured_selects(engine):
+    """捕获执行期间发出的 SELECT 语句及参数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def full_table_scans(session, statement, parameters):
+    """返回该语句查询计划中被全表扫描的表"""
+    connection = session.connection()
+    if connection.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        scans = []
+        for row in rows:
+            detail = row[-1]
+            match = re.match(r"SCAN (\w+)", detail)
+            # "SCAN t USING INDEX ..." 是索引扫描，只有不带 USING 的 SCAN 才是全表扫描
+            if match and match.group(1) in TABLES and "USING" not in detail:
+                scans.append(match.group(1))
+        return scans
+
+    # PostgreSQL：空表上规划器总会选择顺序扫描，禁用后只有无可用索引时才会出现 Seq Scan
+    connection.exec_driver_sql("SET enable_seqscan = off")
+    plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    scans = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in TABLES:
+            scans.append(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return scans
+
+HOT_QUERIES = {
+    "bills_list": lambda db: bill_crud.get_bills_no_pagination(db, 1, 1, datetime(2024, 1, 1), datetime(2024, 12, 31)),
+    "bills_page": lambda db: bill_crud.get_bills_page(db, 1, 1, cursor=encode_cursor(datetime(2024, 6, 1), 100), limit=50),
+    "bills_ledger": lambda db: bill_crud.get_bills(db, 1, 0, 50, datetime(2024, 1, 1), datetime(2024, 12, 31)),
+    "bills_count": lambda db: bill_crud.get_bills_count(db, 1),
+    "bills_export": lambda db: list(bill_crud.iter_bill_export_rows(db, 1, datetime(2024, 1, 1), datetime(2024, 12, 31))),
+    "ledger_stats": lambda db: bill_crud.get_ledger_stats(db, 1, datetime(2024, 1, 1), datetime(2024, 12, 31)),
+    "ledger_stats_rollup": lambda db: bill_crud.get_ledger_stats(db, 1, datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59)),
+    "ledger_calendar": lambda db: bill_crud.get_ledger_calendar(db, 1, "Asia/Shanghai", date(2024, 3, 1), date(2024, 3, 31)),
+    "chat_history": lambda db: chat_crud.get_recent_chat_messages(db, 1, 1, 0, 50),
+    "chat_history_page": lambda db: chat_crud.get_chat_history_page(db, 1, 1, cursor=encode_cursor(datetime(2024, 6, 1), 100), limit=50),
+    "chat_count": lambda db: chat_crud.get_chat_messages_count(db, 1, 1),
+    "message_bills": lambda db: chat_crud.get_message_bills(db, 1),
+    "bill_messages": lambda db: chat_crud.get_bill_messages(db, 1),
+    "ledger_access": lambda db: ledger_crud.check_user_ledger_access(db, 1, 1),
+    "ledger_admin": lambda db: ledger_crud.check_user_ledger_admin(db, 1, 1),
+    "ledger_owner": lambda db: ledger_crud.check_user_ledger_owner(db, 1, 1),
+    "ledger_members": lambda db: ledger_crud.get_ledger_members(db, 1),
+    "active_budgets": lambda db: budget_crud.get_active_budgets_by_category(db, 1, datetime(2024, 6, 1)),
+    "active_budgets_category": lambda db: budget_crud.get_active_budgets_by_category(db, 1, datetime(2024, 6, 1), "餐饮"),
+    "budget_deltas": lambda db: budget_crud.apply_budget_deltas(db, {1: {"餐饮": {datetime(2024, 6, 1): 10.0}, None: {datetime(2024, 6, 2): 5.0}}}),
+    "budget_daily_expenses": lambda db: budget_crud.get_budget_daily_expenses(db, [Budget(id=1), Budget(id=2)]),
+    "budget_spend_curve": lambda db: budget_crud.get_budget_spend_curve(db, Budget(
+        id=1, ledger_id=1, amount=100, category="餐饮", start_date=datetime(2024, 3, 1), end_date=datetime(2024, 3, 31)
+    ), "week"),
+    "budget_stats": lambda db: budget_crud.get_budget_stats(db, 1),
+    "budget_summary_data": lambda db: budget_crud.get_budget_summary_data(db, 1),
+    "ledger_budgets": lambda db: budget_crud.get_budgets_by_ledger(db, 1),
+    "pending_invitations": lambda db: invitation_crud.get_user_pending_invitations(db, "someone@example.com"),
+    "ledger_invitations": lambda db: invitation_crud.get_ledger_invitations(db, 1),
+}
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(plan_db, name):
+    """热点查询不应出现全表扫描"""
+    with captured_selects(plan_db.get_bind()) as statements:
+        HOT_QUERIES[name](plan_db)
+
+    assert statements, f"{name} 未发出任何查询"
+    for statement, parameters in statements:
+        scans = full_table_scans(plan_db, statement, parameters)
+        assert not scans, f"{name} 对 {scans} 执行了全表扫描:\n{statement}"
@@ -0,0 +1,118 @@
+import io
+import pytest
+from datetime import datetime
+
+from app.models import Bill, BillType
+from app.services.statement import parse_statement
+
+ALIPAY_CSV = """支付宝交易记录明细查询
+账号:[someone@example.com]
+起始日期:[2024-03-01 00:00:00]    终止日期:[2024-03-31 23:59:59]
+---------------------------------交易记录明细列表------------------------------------
+交易时间,交易分类,交易对方,对方账号,商品说明,收/支,金额,收/付款方式,交易状态,交易订单号,商家订单号,备注,
+2024-03-01 12:30:00,餐饮美食,食堂,/,午餐,支出,18.00,余额宝,交易成功,2024030100001,,,
+2024-03-02 09:00:00,转账红包,张三,/,红包,收入,200.00,余额,交易成功,2024030200001,,,
+2024-03-03 10:00:00,投资理财,余额宝,/,收益发放,不计收支,0.52,余额宝,交易成功,2024030300001,,,
+2024-03-04 20:00:00,日用百货,超市,/,购物,支出,56.50,花呗,交易关闭,2024030400001,,,
+2024-03-05 08:00:00,交通出行,地铁,/,乘车,支出,abc,余额,交易成功,2024030500001,,,
+"""
+
+WECHAT_CSV = """微信支付账单明细,,,,,,,,,,
+微信昵称：[某人],,,,,,,,,,
+----------------------微信支付账单明细列表--------------------,,,,,,,,,,
+交易时间,交易类型,交易对方,商品,收/支,金额(元),支付方式,当前状态,交易单号,商户单号,备注
+2024-03-06 08:15:00,商户消费,便利店,早餐,支出,¥6.50,零钱,支付成功,4200001,10001,/
+2024-03-07 18:00:00,转账,李四,/,收入,"¥1,000.00",/,已收钱,4200002,/,/
+"""
+
+BANK_CSV = """交易日期,摘要,收入金额,支出金额,余额,对方户名
+20240308,工资,8000.00,,18000.00,某公司
+20240309,房租,,3000.00,15000.00,房东
+"""
+
+class TestStatementParser:
+    """账单文件解析相关测试"""
+
+    def test_alipay_gbk_with_preamble(self):
+        """测试支付宝 GBK 导出：跳过说明行、不计收支和已关闭交易，记录错误行"""
+        parser = parse_statement(io.BytesIO(ALIPAY_CSV.encode("gbk")), ledger_id=1)
+        bills = list(parser)
+
+        assert parser.source == "alipay"
+        assert parser.encoding == "gb18030"
+        assert [(b.amount, b.type, b.category) for b in bills] == [
+            (18.0, BillType.EXPENSE, "餐饮美食"),
+            (200.0, BillType.INCOME, "转账红包"),
+        ]
+        assert bills[0].date == datetime(2024, 3, 1, 12, 30)
+        assert bills[0].description == "食堂 午餐"
+        assert parser.skipped == 3
+        assert len(parser.errors) == 1
+
+    def test_wechat_utf8_bom(self):
+        """测试微信支付 UTF-8 BOM 导出与带货币符号的金额"""
+        parser = parse_statement(io.BytesIO(WECHAT_CSV.encode("utf-8-sig")), ledger_id=1)
+        bills = list(parser)
+
+        assert parser.source == "wechat"
+        assert [(b.amount, b.type) for b in bills] == [(6.5, BillType.EXPENSE), (1000.0, BillType.INCOME)]
+        assert bills[1].description == "李四"
+
+    def test_bank_split_amount_columns(self):
+        """测试银行导出的收入/支出分列格式"""
+        bills = list(parse_statement(io.BytesIO(BANK_CSV.encode("utf-8")), ledger_id=1))
+        assert [(b.amount, b.type, b.date) for b in bills] == [
+            (8000.0, BillType.INCOME, datetime(2024, 3, 8)),
+            (3000.0, BillType.EXPENSE, datetime(2024, 3, 9)),
+        ]
+
+    def test_unknown_format(self):
+        """测试无法识别表头时抛出 ValueError"""
+        with pytest.raises(ValueError):
+            parse_statement(io.BytesIO("a,b,c\n1,2,3\n".encode("utf-8")), ledger_id=1)
+
+class TestStatementImportApi:
+    """账单导入接口相关测试"""
+
+    def test_import_statement(self, client, db, auth_headers, ledger_id):
+        """测试上传支付宝账单后写入账单并更新统计"""
+        resp = client.post(
+            "/api/v1/bills/import",
+            data={"ledger_id": ledger_id},
+            files={"file": ("alipay.csv", ALIPAY_CSV.encode("gbk"), "text/csv")},
+            headers=auth_headers
+        )
+        assert resp.status_code == 200
+        result = resp.json()["data"]
+        assert result["source"] == "alipay"
+        assert result["imported"] == 2
+        assert result["skipped"] == 3
+
+        assert db.query(Bill).filter(Bill.ledger_id == ledger_id).count() == 2
+        stats = client.get("/api/v1/bills/stats", params={"ledger_id": ledger_id}, headers=auth_headers).json()["data"]
+        assert stats["total_income"] == 200
+        assert stats["total_expense"] == 18
+
+    def test_import_rejects_unknown_file(self, client, auth_headers, ledger_id):
+        """测试无法识别的文件返回400"""
+        resp = client.post(
+            "/api/v1/bills/import",
+            data={"ledger_id": ledger_id},
+            files={"file": ("x.csv", b"a,b\n1,2\n", "text/csv")},
+            headers=auth_headers
+        )
+        assert resp.status_code == 400
+
+    def test_manage_db_import_checks_ledger_access(self, client, db, auth_headers, ledger_id, test_user_data, test_user_data2, tmp_path, monkeypatch):
+        """测试命令行导入与接口一致，拒绝导入到用户无权访问的账本"""
+        import manage_db
+        from tests.conftest import TestingSessionLocal
+        monkeypatch.setattr("app.db.database.SessionLocal", TestingSessionLocal)
+        client.post("/api/v1/register", json=test_user_data2)
+        path = tmp_path / "alipay.csv"
+        path.write_bytes(ALIPAY_CSV.encode("gbk"))
+
+        assert manage_db.import_statement(str(path), ledger_id, test_user_data2["email"]) is False
+        assert db.query(Bill).filter(Bill.ledger_id == ledger_id).count() == 0
+        assert manage_db.import_statement(str(path), ledger_id, test_user_data["email"]) is True
+        assert db.query(Bill).filter(Bill.ledger_id == ledger_id).count() == 2
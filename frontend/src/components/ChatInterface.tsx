@@ -15,12 +15,6 @@ interface ChatInterfaceProps {
   selectedLedgerId?: number;
 }
 
-type Pagination = {
-  total: number;
-  skip: number;
-  limit: number;
-}
-
 const INITIAL_PAGE_SIZE = 20; // 每页加载的消息数量
 
 export default function ChatInterface({ onBillsCreated, selectedLedgerId }: ChatInterfaceProps) {
@@ -29,22 +23,17 @@ export default function ChatInterface({ onBillsCreated, selectedLedgerId }: Chat
   const [isLoadingHistory, setIsLoadingHistory] = useState(true);
   const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [hasMoreMessages, setHasMoreMessages] = useState(true);
-  const [currentPage, setCurrentPage] = useState(0);
   const [showScrollToBottom, setShowScrollToBottom] = useState(false);
-  const [pagination, setPagination] = useState<Pagination>({
-    total: 0,
-    skip: 0,
-    limit: INITIAL_PAGE_SIZE
-  })
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const messagesContainerRef = useRef<HTMLDivElement>(null);
   const lastSelectedLedgerId = useRef<number | undefined>(undefined);
   const isInitialLoad = useRef(true);
+  const nextCursor = useRef<string | null>(null); // 下一页（更早消息）的游标
 
 
   // 加载历史聊天记录
-  const loadChatHistory = useCallback(async (page: number = 0, append: boolean = false) => {
+  const loadChatHistory = useCallback(async (append: boolean = false) => {
     if (!selectedLedgerId) return;
     
     try {
@@ -54,8 +43,8 @@ export default function ChatInterface({ onBillsCreated, selectedLedgerId }: Chat
         setIsLoadingMore(true);
       }
 
-      const skip = page * pagination.limit;
-      const response = await aiAPI.getChatHistory(selectedLedgerId, skip, pagination.limit);
+      const cursor = append ? nextCursor.current : null;
+      const response = await aiAPI.getChatHistory(selectedLedgerId, INITIAL_PAGE_SIZE, cursor);
       
       if (!response.data?.success) {
         toast.error(response.data?.message || '加载聊天历史失败');
@@ -63,13 +52,10 @@ export default function ChatInterface({ onBillsCreated, selectedLedgerId }: Chat
       }
       
       const dbMessages = response.data.data || [];
-      setPagination(prev => ({
-        ...prev,
-        total: response.data.total,
-      }));
       
-      // 检查是否还有更多消息ı
-      setHasMoreMessages(dbMessages.length === pagination.limit);
+      // 有 next_cursor 说明还有更早的消息
+      nextCursor.current = response.data.next_cursor ?? null;
+      setHasMoreMessages(nextCursor.current !== null);
       
       // 转换数据库消息格式为前端格式
       const convertedMessages: ChatMessage[] = dbMessages.map((dbMsg: any) => ({
@@ -100,12 +86,10 @@ export default function ChatInterface({ onBillsCreated, selectedLedgerId }: Chat
   const loadMoreMessages = useCallback(async () => {
     if (!hasMoreMessages || isLoadingMore || !selectedLedgerId) return;
 
-    if (pagination.skip * pagination.limit >= pagination.total) return;
+    if (!nextCursor.current) return;
 
-    const nextPage = currentPage + 1;
-    setCurrentPage(nextPage);
-    await loadChatHistory(nextPage, true);
-  }, [currentPage, hasMoreMessages, isLoadingMore, selectedLedgerId, loadChatHistory]);
+    await loadChatHistory(true);
+  }, [hasMoreMessages, isLoadingMore, selectedLedgerId, loadChatHistory]);
 
   // 处理滚动事件
   const handleScroll = useCallback(() => {
@@ -141,13 +125,13 @@ export default function ChatInterface({ onBillsCreated, selectedLedgerId }: Chat
   useEffect(() => {
     if (selectedLedgerId !== lastSelectedLedgerId.current) {
       lastSelectedLedgerId.current = selectedLedgerId;
-      setCurrentPage(0);
+      nextCursor.current = null;
       setHasMoreMessages(true);
       isInitialLoad.current = true;
       
       if (selectedLedgerId) {
         setMessages([]);
-        loadChatHistory(0, false);
+        loadChatHistory(false);
       } else {
         setMessages([]);
         setIsLoadingHistory(false);
@@ -13,9 +13,10 @@ interface PaginatedResponse<T = unknown> {
   success: boolean;
   message: string;
   data: T[];
-  total: number;
+  total: number | null;
   skip: number;
   limit: number;
+  next_cursor?: string | null;
 }
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://192.168.10.221:8000/api/v1';
@@ -98,9 +99,11 @@ export const aiAPI = {
   // 统一的聊天接口（支持文本、语音、图片）
   chat: (data: ChatRequest) => api.post<BaseResponse<ChatResponse>>('/chat/', data),
   
-  // 获取聊天历史
-  getChatHistory: (ledgerId: number, skip: number = 0, limit: number = 50) => 
-    api.get<PaginatedResponse<DBChatMessage>>(`/chat/history/${ledgerId}?skip=${skip}&limit=${limit}`),
+  // 获取聊天历史（按游标从新到旧分页，cursor 为上一页返回的 next_cursor）
+  getChatHistory: (ledgerId: number, limit: number = 50, cursor?: string | null) =>
+    api.get<PaginatedResponse<DBChatMessage>>(`/chat/history/${ledgerId}`, {
+      params: { limit, cursor: cursor ?? undefined, include_total: false }
+    }),
 };
 
 // 账本相关API